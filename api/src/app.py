@@ -1,16 +1,76 @@
-from fastapi import FastAPI
+import os
+import threading
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Response
 from .routers.ingest import router as gestion_router
 from .routers.ingest_camas import router as camas_router
 from .routers.resumen import router as resumen_router
 from .routers import estadias, tareas
 from .routers.prediccion import router as prediccion_router
+from .services.metrics import CONTENT_TYPE, METRICS, METRICS_ENABLED, MetricsMiddleware, track_in_progress
+from .services.mongo_monitoring import COMMAND_LISTENER, MONGO_MONITORING, DbRoundTripMiddleware
+from .services.profiling import PROFILES_ROUTE, PROFILING_ENABLED, ProfilingMiddleware, load_profile, token_ok
 
-app = FastAPI(title="API Backend - Scaffold")
+def _warmup_ml():
+    """Importa el stack de ML y carga el modelo sin bloquear el arranque."""
+    try:
+        from .ml import predict_nuevos_pacientes  # noqa: F401  (pandas, numpy, joblib)
+        from .ml.model_registry import preload_models
+        preload_models()
+    except Exception as e:
+        print(f"⚠️ Warm-up del modelo falló; se cargará en la primera predicción: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Importar la app no carga el stack de ML: se carga en la primera predicción,
+    # o en segundo plano al arrancar si ML_WARMUP=1.
+    from .ml.model_registry import check_artifacts
+    check_artifacts()
+    if os.getenv("ML_WARMUP") == "1":
+        threading.Thread(target=_warmup_ml, name="ml-warmup", daemon=True).start()
+    yield
+
+# track_in_progress cuenta la request en curso bajo su ruta apenas se resuelve (ver services/metrics.py)
+app = FastAPI(title="API Backend - Scaffold", lifespan=lifespan,
+              dependencies=[Depends(track_in_progress)] if METRICS_ENABLED else None)
+
+# Con gunicorn --preload, cargar el modelo acá lo deja en el maestro antes del fork
+if os.getenv("ML_PRELOAD") == "1":
+    from .ml.model_registry import preload_models
+    preload_models()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+# Perfil de una request puntual con X-Profile: <PROFILING_TOKEN> (ver services/profiling.py)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get(PROFILES_ROUTE + "/{profile_id}", include_in_schema=False)
+    def perfil(profile_id: str, format: str = "json", x_profile: str = Header("")):
+        if not token_ok(x_profile):
+            raise HTTPException(status_code=403, detail="Token de perfilado inválido")
+        profile = load_profile(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="Perfil no encontrado")
+        if format == "folded":
+            return Response("\n".join(profile["folded"]) + "\n", media_type="text/plain")
+        return profile
+
+# Comandos Mongo por request (X-DB-Round-Trips / X-DB-Time-Ms)
+if MONGO_MONITORING:
+    app.add_middleware(DbRoundTripMiddleware)
+
+# Latencia, status y bytes por plantilla de ruta (formato Prometheus en /metrics)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        body = METRICS.render() + (COMMAND_LISTENER.render() if MONGO_MONITORING else "")
+        return Response(body, media_type=CONTENT_TYPE)
+
 app.include_router(gestion_router)        # /gestion/ingest/csv
 app.include_router(camas_router)          # /camas/ingest/csv
 app.include_router(resumen_router)        # /gestion/episodios/resumen
@@ -0,0 +1,111 @@
+"""
+Predicción por bloques sobre archivos CSV o Parquet.
+
+Lee el archivo de a `chunksize` filas, puntúa cada bloque con `score_dataframe`
+y lo serializa apenas está listo, así que la memoria usada depende del tamaño
+del bloque y no del archivo. Usado por `POST /prediccion/batch`.
+"""
+import io
+from typing import BinaryIO, Iterable, Iterator
+
+import pandas as pd
+
+from .predict_nuevos_pacientes import missing_feature_columns, score_dataframe
+
+BATCH_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+DEFAULT_BATCH_CHUNKSIZE = 5000
+
+
+def detect_format(filename: str) -> str | None:
+    name = (filename or "").lower()
+    for ext, fmt in BATCH_FORMATS.items():
+        if name.endswith(ext):
+            return fmt
+    return None
+
+
+def iter_input_chunks(fileobj: BinaryIO, fmt: str, chunksize: int = DEFAULT_BATCH_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Bloques de `chunksize` filas del archivo, sin cargarlo completo."""
+    if fmt == "csv":
+        yield from pd.read_csv(fileobj, chunksize=chunksize)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(fileobj).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def open_scored_chunks(fileobj: BinaryIO, fmt: str, chunksize: int = DEFAULT_BATCH_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Valida el primer bloque de inmediato (ValueError si faltan columnas) y devuelve
+    un iterador de bloques ya puntuados."""
+    chunks = iter_input_chunks(fileobj, fmt, chunksize)
+    first = next(chunks, None)
+    missing = missing_feature_columns(first.columns) if first is not None else []
+    if first is None or missing:
+        chunks.close()
+        if first is None:
+            raise ValueError("El archivo no contiene pacientes.")
+        raise ValueError(f"Faltan columnas necesarias: {missing}")
+
+    def _scored():
+        yield _score_chunk(first)
+        for chunk in chunks:
+            yield _score_chunk(chunk)
+
+    return _scored()
+
+
+def _score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    scored = score_dataframe(chunk)
+    scored["riesgo_categoria"] = scored["riesgo_categoria"].astype(object)
+    return scored
+
+
+def encode_csv(chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+
+def encode_parquet(chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    """Un row group por bloque; los bytes se emiten a medida que se escriben."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = io.BytesIO()
+
+    def _drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate(0)
+        return data
+
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        else:
+            table = table.cast(writer.schema)
+        writer.write_table(table)
+        yield _drain()
+    if writer is not None:
+        writer.close()
+        yield _drain()
+
+
+def encode_chunks(chunks: Iterable[pd.DataFrame], fmt: str) -> Iterator[bytes]:
+    if fmt == "parquet":
+        return encode_parquet(chunks)
+    return encode_csv(chunks)
@@ -0,0 +1,301 @@
+"""
+Scoring por bloques de exportaciones GRD + Score.
+
+Reemplaza el flujo de los scripts `predict_new_patients.py` y
+`predict_nuevos_pacientes_*.py` (cargar ambos archivos completos, `merge` con
+pandas y puntuar todo de una vez):
+
+1. El Score (una fila por episodio, el archivo chico) se lee una vez con solo
+   las columnas de riesgo y queda en un índice hash por episodio
+   (`ScoreIndex`). Ahí también se fijan los cortes de `total` para
+   `riesgo_social`, así el resultado de un paciente no depende de su bloque.
+2. El GRD se recorre en bloques (`iter_table_chunks`, Excel en read-only) y
+   cada bloque se une al Score con `get_indexer` sobre el índice.
+3. Los bloques unidos se puntúan en un pool de procesos (cada worker carga el
+   modelo una vez); como máximo `max_pending` bloques en vuelo.
+4. Los resultados se escriben en orden apenas están listos (CSV o Parquet).
+
+Al final reporta filas, filas/seg y memoria máxima del proceso principal y de
+los workers.
+
+Uso (desde api/):
+    python -m src.ml.batch_scoring --grd data/GRD.xlsx --score data/Score.xlsx --output predicciones.csv
+    python -m src.ml.batch_scoring --grd GRD.csv --score Score.csv --output pred.parquet --workers 2 --chunk-size 20000
+"""
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+import numpy as np
+import pandas as pd
+
+from .src.data_prep import SCORE_SUBSET_COLUMNS, admin_scale, bucket_thresholds, bucketize_series, salud_subscale
+from .utils import (DEFAULT_CHUNKSIZE, align_columns_to_template, find_first_existing, iter_table_chunks,
+                    read_excel_or_csv, with_underscore_variants)
+
+DEFAULT_CONFIG = Path(__file__).resolve().parent / "config.yaml"
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+# Columnas del GRD que se leen (además del ID de episodio de config.yaml). Como en los
+# scripts que reemplaza, se aceptan con o sin `_` final ("IR GRD Código" → ir_grd_codigo)
+GRD_INPUT_COLUMNS = {
+    "edad": "edad_en_anos",
+    "sexo": "sexo_desc_",
+    "servicio_clinico": "servicio_ingreso_descripcion_",
+    "prevision": "prevision_desc_",
+    "codigo_grd": "ir_grd_codigo_",
+}
+
+
+def normalize_episode_keys(values: pd.Series) -> pd.Series:
+    """IDs de episodio como texto comparable: 123, 123.0 y ' 123 ' son la misma llave."""
+    keys = values.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    return keys.mask(keys == "")
+
+
+class ScoreIndex:
+    """Score indexado por episodio (índice hash de pandas) con los cortes de riesgo social."""
+
+    def __init__(self, score: pd.DataFrame, episode_col: str):
+        keys = normalize_episode_keys(score[episode_col])
+        score = score.loc[keys.notna().to_numpy()].copy()
+        score.index = pd.Index(keys[keys.notna()].to_numpy(), name="episodio")
+        duplicated = score.index.duplicated(keep="last")
+        # Varias encuestas del mismo episodio: se usa la última
+        self.duplicates = int(duplicated.sum())
+        # Columnas ausentes en el Score quedan vacías (mismos valores por defecto que sin encuesta)
+        self.frame = score.loc[~duplicated].reindex(columns=SCORE_SUBSET_COLUMNS)
+        self.total_thresholds = bucket_thresholds(pd.to_numeric(self.frame["total"], errors="coerce"))
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def lookup(self, keys: pd.Series) -> pd.DataFrame:
+        """Filas del Score para cada llave (NaN si el episodio no tiene encuesta), alineadas a `keys`."""
+        positions = self.frame.index.get_indexer(normalize_episode_keys(keys).to_numpy())
+        found = positions >= 0
+        out = pd.DataFrame(index=keys.index, columns=self.frame.columns, dtype=object)
+        if found.any():
+            out.loc[found] = self.frame.iloc[positions[found]].to_numpy()
+        out["score_encontrado"] = found
+        return out
+
+
+def load_config(path: str | os.PathLike = DEFAULT_CONFIG) -> Dict[str, Any]:
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as fh:
+        return yaml.safe_load(fh) or {}
+
+
+def load_score_index(score_path: str, config: Dict[str, Any]) -> ScoreIndex:
+    candidates = config["columns"]["episode_id_score_candidates"]
+    wanted = [*candidates, *SCORE_SUBSET_COLUMNS]
+    score = align_columns_to_template(read_excel_or_csv(score_path, columns=with_underscore_variants(wanted)), wanted)
+    episode_col = find_first_existing(score, candidates)
+    if episode_col is None:
+        raise ValueError(f"No encuentro ninguna de {candidates} en Score.")
+    return ScoreIndex(score, episode_col)
+
+
+def iter_joined_chunks(grd_path: str, index: ScoreIndex, config: Dict[str, Any],
+                       chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Bloques del GRD con las columnas del Score de su episodio."""
+    cols = config["columns"]
+    episode_col = cols["episode_id_grd"]
+    norma_col = cols["estancia_norma"]
+    wanted = [episode_col, *GRD_INPUT_COLUMNS.values(), norma_col]
+    for chunk in iter_table_chunks(grd_path, columns=with_underscore_variants(wanted), chunksize=chunksize):
+        chunk = align_columns_to_template(chunk, wanted)
+        missing = [c for c in [episode_col, *GRD_INPUT_COLUMNS.values()] if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas en GRD: {missing}")
+        if chunk.empty:
+            continue
+        chunk = chunk.reset_index(drop=True)
+        yield pd.concat([chunk, index.lookup(chunk[episode_col])], axis=1)
+
+
+def joined_to_model_input(joined: pd.DataFrame, norma_col: str, total_thresholds) -> pd.DataFrame:
+    """Columnas con los nombres de FEATURE_COLUMNS (mismo mapeo que `build_simplified_features`)."""
+    df = pd.DataFrame({name: joined[source] for name, source in GRD_INPUT_COLUMNS.items()})
+    # Sin norma en el archivo, `build_feature_frame` la completa desde grd_norms.json
+    df["fecha_estimada_de_alta"] = joined[norma_col] if norma_col in joined.columns else np.nan
+    total = pd.to_numeric(joined["total"], errors="coerce")
+    df["riesgo_social"] = bucketize_series(total, default_value=1.0, thresholds=total_thresholds)
+    df["riesgo_clinico"] = salud_subscale(pd.to_numeric(joined["salud_mental"], errors="coerce"))
+    gestion = joined["gestion"].astype(str).str.strip().str.lower()
+    categ = joined["categorizacion_de_gestion"].astype(str).str.strip().str.lower()
+    df["riesgo_administrativo"] = admin_scale(gestion, categ)
+    return df
+
+
+def score_joined_chunk(joined: pd.DataFrame, episode_col: str, norma_col: str, total_thresholds) -> pd.DataFrame:
+    """Puntúa un bloque ya unido. Corre dentro de los workers."""
+    from .predict_nuevos_pacientes import build_feature_frame, score_feature_frame
+    from .utils import categorize_probabilities
+
+    meta: Dict[str, Any] = {}
+    features = build_feature_frame(joined_to_model_input(joined, norma_col, total_thresholds))
+    probabilities = score_feature_frame(features, meta=meta)
+    out = features.copy()
+    out.insert(0, episode_col, joined[episode_col].to_numpy())
+    out["probabilidad_sobre_estadia"] = probabilities
+    out["riesgo_categoria"] = categorize_probabilities(probabilities).astype(str)
+    out["score_encontrado"] = joined["score_encontrado"].to_numpy(dtype=bool)
+    out["model_version"] = meta.get("model_version")
+    return out
+
+
+def _init_worker() -> None:
+    from .model_registry import get_model
+
+    get_model()
+
+
+class ChunkWriter:
+    """Escribe bloques a medida que llegan: CSV (append) o Parquet (un row group por bloque)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self._parquet = path.lower().endswith((".parquet", ".pq"))
+        self._writer = None
+        self._schema = None
+        self._fh = None
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        else:
+            if self._fh is None:
+                self._fh = open(self.path, "w", encoding="utf-8", newline="")
+                chunk.to_csv(self._fh, index=False)
+            else:
+                chunk.to_csv(self._fh, index=False, header=False)
+        self.rows += len(chunk)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._fh is not None:
+            self._fh.close()
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Memoria residente máxima en MB (ru_maxrss viene en kB en Linux y en bytes en macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def score_grd_score(grd_path: str, score_path: str, output_path: str, config: Dict[str, Any] | None = None,
+                    chunksize: int = DEFAULT_CHUNKSIZE, workers: int = DEFAULT_WORKERS,
+                    max_pending: int | None = None, verbose: bool = False) -> Dict[str, Any]:
+    """Puntúa GRD + Score por bloques y escribe en `output_path`. Devuelve un reporte.
+
+    `workers=0` puntúa en el mismo proceso (sin pool).
+    """
+    config = config or load_config()
+    episode_col = config["columns"]["episode_id_grd"]
+    norma_col = config["columns"]["estancia_norma"]
+    max_pending = max_pending or max(2, 2 * workers)
+
+    started = time.perf_counter()
+    index = load_score_index(score_path, config)
+    index_seconds = time.perf_counter() - started
+    args = (episode_col, norma_col, index.total_thresholds)
+
+    writer = ChunkWriter(output_path)
+    executor = None
+    if workers > 0:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                       initializer=_init_worker)
+    chunks = matched = 0
+    model_version = None
+    in_flight: "deque[Future]" = deque()
+
+    def _drain(block: bool) -> None:
+        nonlocal matched, model_version
+        while in_flight and (block or in_flight[0].done()):
+            scored = in_flight.popleft().result()
+            matched += int(scored["score_encontrado"].sum())
+            model_version = scored["model_version"].iat[0] if len(scored) else model_version
+            writer.write(scored)
+            if verbose:
+                elapsed = time.perf_counter() - started
+                print(f"   {writer.rows} filas escritas ({writer.rows / elapsed:.0f} filas/seg)")
+
+    try:
+        for joined in iter_joined_chunks(grd_path, index, config, chunksize=chunksize):
+            chunks += 1
+            if executor is None:
+                future: Future = Future()
+                future.set_result(score_joined_chunk(joined, *args))
+            else:
+                future = executor.submit(score_joined_chunk, joined, *args)
+            in_flight.append(future)
+            _drain(block=False)
+            while len(in_flight) >= max_pending:
+                in_flight[0].result()
+                _drain(block=False)
+        _drain(block=True)
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": writer.rows,
+        "chunks": chunks,
+        "chunk_size": chunksize,
+        "workers": workers,
+        "score_episodes": len(index),
+        "score_duplicates": index.duplicates,
+        "matched_score": matched,
+        "model_version": model_version,
+        "output": output_path,
+        "index_seconds": round(index_seconds, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(writer.rows / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_mb_workers": peak_rss_mb(resource.RUSAGE_CHILDREN) if workers > 0 else None,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Scoring por bloques de exportaciones GRD + Score.")
+    parser.add_argument("--grd", required=True, help="Exportación GRD (.xlsx o .csv).")
+    parser.add_argument("--score", required=True, help="Exportación Score (.xlsx o .csv).")
+    parser.add_argument("--output", required=True, help="Archivo de salida (.csv o .parquet).")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG), help="config.yaml con los nombres de columnas.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNKSIZE, help="Filas del GRD por bloque.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Procesos de scoring (0 = sin pool).")
+    parser.add_argument("--max-pending", type=int, default=None, help="Bloques en vuelo (default 2 x workers).")
+    parser.add_argument("--json", type=str, default=None, help="Guardar el reporte en este archivo.")
+    args = parser.parse_args()
+
+    report = score_grd_score(args.grd, args.score, args.output, config=load_config(args.config),
+                             chunksize=args.chunk_size, workers=args.workers,
+                             max_pending=args.max_pending, verbose=True)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Reporte guardado en {args.json}")
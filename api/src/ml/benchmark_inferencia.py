@@ -0,0 +1,218 @@
+"""
+Benchmark de inferencia de los modelos de `models/`.
+
+Genera lotes sintéticos con las distribuciones de `crear_datos_prueba`
+(`generar_grd_score`) y mide, para cada tamaño de lote:
+
+- `build_feature_frame`: entrada cruda (riesgos como "bajo"/"medio"/"alto") → FEATURE_COLUMNS;
+- `predict_proba` de `model_baseline`, `model_hgb_calibrated` y
+  `model_logistic_only` (este último usa el esquema antiguo de columnas: recibe
+  las columnas GRD + Score estandarizadas y el resto como NaN);
+- `apply_risk_boost` sobre las probabilidades del modelo activo;
+- `predict_nuevos_pacientes(frame=..., persist=False)` completo.
+
+Cada medición se repite hasta `--repeats` veces o hasta `--max-seconds`
+(mínimo 3) y reporta p50/p95/p99 de latencia por llamada y filas/seg (con p50).
+El resultado es un JSON; con `--compare` se imprime el cambio de p50 contra un
+reporte anterior.
+
+Uso (desde api/):
+    python -m src.ml.benchmark_inferencia --json bench.json
+    python -m src.ml.benchmark_inferencia --sizes 1 100 10000 --stages predict_proba --json bench2.json --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .crear_datos_prueba import generar_grd_score
+from .model_registry import MODELS_DIR
+from .predict_nuevos_pacientes import apply_risk_boost, build_feature_frame, predict_nuevos_pacientes
+from .src.data_prep import bucketize_series, salud_subscale
+from .utils import file_sha256, standardize_col
+
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000, 100000]
+STAGES = ["build_feature_frame", "predict_proba", "apply_risk_boost", "predict_nuevos_pacientes"]
+BENCH_MODELS = ["model_baseline", "model_hgb_calibrated", "model_logistic_only"]
+RISK_LABELS = np.array(["bajo", "medio", "alto"], dtype=object)
+
+
+def generar_lote(n: int, seed: int = 42) -> Dict[str, pd.DataFrame]:
+    """Lote sintético: entrada cruda de la API y columnas GRD + Score estandarizadas (esquema antiguo)."""
+    rng = np.random.RandomState(seed)
+    df_grd, df_score = generar_grd_score(n, rng=rng, verbose=False)
+    # crear_datos_prueba no genera gestión: riesgo_administrativo se sortea uniforme 0/1/2
+    admin = rng.randint(0, 3, n)
+    raw = pd.DataFrame({
+        "edad": df_grd["Edad en años"],
+        "sexo": df_grd["Sexo  (Desc)"],
+        "servicio_clinico": df_grd["Servicio Ingreso (Descripción)"],
+        "prevision": df_grd["Previsión (Desc)"],
+        "fecha_estimada_de_alta": df_grd["Estancia Norma GRD "],
+        "riesgo_social": RISK_LABELS[bucketize_series(df_score["total"].astype(float)).astype(int)],
+        "riesgo_clinico": RISK_LABELS[salud_subscale(df_score["salud_mental"]).astype(int)],
+        "riesgo_administrativo": RISK_LABELS[admin],
+        "codigo_grd": df_grd["IR GRD Código"],
+    })
+    legacy = pd.concat([df_grd, df_score], axis=1)
+    legacy.columns = [standardize_col(col) for col in legacy.columns]
+    return {"raw": raw, "legacy": legacy}
+
+
+def load_models(names: List[str] = BENCH_MODELS) -> Dict[str, Any]:
+    from joblib import load
+
+    return {name: load(MODELS_DIR / f"{name}.joblib") for name in names}
+
+
+def model_input(model, batch: Dict[str, pd.DataFrame], features: pd.DataFrame) -> pd.DataFrame:
+    """FEATURE_COLUMNS o, para modelos con otro esquema, sus columnas desde el lote antiguo."""
+    expected = list(getattr(model, "feature_names_in_", features.columns))
+    if set(expected) <= set(features.columns):
+        return features[expected]
+    return batch["legacy"].reindex(columns=expected)
+
+
+def time_calls(fn: Callable[[], Any], repeats: int, max_seconds: float, min_repeats: int = 3) -> List[float]:
+    """Latencias (segundos) de llamadas sucesivas a `fn`, después de una llamada de calentamiento."""
+    fn()
+    latencies: List[float] = []
+    started = time.perf_counter()
+    while len(latencies) < repeats:
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+        if len(latencies) >= min_repeats and time.perf_counter() - started > max_seconds:
+            break
+    return latencies
+
+
+def summarize(latencies: List[float], batch_size: int) -> Dict[str, Any]:
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": len(latencies),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "rows_per_second": round(batch_size / (p50 / 1000), 1) if p50 > 0 else None,
+    }
+
+
+def run_benchmark(sizes: List[int] = DEFAULT_SIZES, stages: List[str] = STAGES, repeats: int = 30,
+                  max_seconds: float = 5.0, seed: int = 42, verbose: bool = True) -> Dict[str, Any]:
+    models = load_models()
+    results: List[Dict[str, Any]] = []
+
+    def _record(stage: str, model: str | None, size: int, latencies: List[float] | None, error: str | None = None):
+        row = {"stage": stage, "model": model, "batch_size": size}
+        row.update(summarize(latencies, size) if latencies else {"error": error})
+        results.append(row)
+        if verbose:
+            label = f"{stage}{f'[{model}]' if model else ''}"
+            if latencies:
+                print(f"   {label:45s} {size:>7d} filas  p50 {row['p50_ms']:>10.3f} ms  p95 {row['p95_ms']:>10.3f} ms  "
+                      f"p99 {row['p99_ms']:>10.3f} ms  {row['rows_per_second']:>12,.0f} filas/seg")
+            else:
+                print(f"   {label:45s} {size:>7d} filas  ⚠️ {error}")
+
+    for size in sizes:
+        batch = generar_lote(size, seed=seed)
+        raw = batch["raw"]
+        features = build_feature_frame(raw)
+        if "build_feature_frame" in stages:
+            _record("build_feature_frame", None, size, time_calls(lambda: build_feature_frame(raw), repeats, max_seconds))
+        if "predict_proba" in stages:
+            for name, model in models.items():
+                X = model_input(model, batch, features)
+                try:
+                    latencies = time_calls(lambda: model.predict_proba(X), repeats, max_seconds)
+                except Exception as exc:  # un modelo incompatible no debe cortar el benchmark
+                    _record("predict_proba", name, size, None, error=f"{type(exc).__name__}: {exc}")
+                else:
+                    _record("predict_proba", name, size, latencies)
+        if "apply_risk_boost" in stages:
+            probabilities = models["model_hgb_calibrated"].predict_proba(features)[:, 1]
+            _record("apply_risk_boost", None, size,
+                    time_calls(lambda: apply_risk_boost(probabilities, features), repeats, max_seconds))
+        if "predict_nuevos_pacientes" in stages:
+            def _full():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return predict_nuevos_pacientes(frame=raw, persist=False)
+            _record("predict_nuevos_pacientes", None, size, time_calls(_full, repeats, max_seconds))
+
+    import sklearn
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "seed": seed,
+            "repeats": repeats,
+            "max_seconds": max_seconds,
+            "models": {name: file_sha256(MODELS_DIR / f"{name}.joblib")[:16] for name in models},
+        },
+        "results": results,
+    }
+
+
+def _key(row: Dict[str, Any]) -> tuple:
+    return row["stage"], row["model"], row["batch_size"]
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Cambio de p50 (%) por etapa/modelo/tamaño contra un reporte anterior."""
+    before = {_key(row): row for row in previous.get("results", []) if "p50_ms" in row}
+    rows = []
+    for row in current["results"]:
+        old = before.get(_key(row))
+        if old is None or "p50_ms" not in row or not old["p50_ms"]:
+            continue
+        rows.append({
+            "stage": row["stage"], "model": row["model"], "batch_size": row["batch_size"],
+            "p50_ms_before": old["p50_ms"], "p50_ms_after": row["p50_ms"],
+            "p50_change_pct": round((row["p50_ms"] / old["p50_ms"] - 1) * 100, 1),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de latencia y throughput de inferencia.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Tamaños de lote.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeats", type=int, default=30, help="Repeticiones máximas por medición.")
+    parser.add_argument("--max-seconds", type=float, default=5.0,
+                        help="Tiempo máximo por medición (siempre al menos 3 repeticiones).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=str, default=None, help="Guardar el reporte en este archivo.")
+    parser.add_argument("--compare", type=str, default=None, help="Reporte JSON anterior para comparar p50.")
+    args = parser.parse_args()
+
+    print(f"⏱️ Benchmark de inferencia: lotes {args.sizes}")
+    report = run_benchmark(args.sizes, args.stages, repeats=args.repeats, max_seconds=args.max_seconds, seed=args.seed)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            report["comparison"] = compare(report, json.load(fh))
+        print(f"\n📊 Cambio de p50 contra {args.compare}:")
+        for row in report["comparison"]:
+            label = row["stage"] + (f"[{row['model']}]" if row["model"] else "")
+            print(f"   {label:45s} {row['batch_size']:>7d} filas  {row['p50_ms_before']:>10.3f} → "
+                  f"{row['p50_ms_after']:>10.3f} ms  ({row['p50_change_pct']:+.1f}%)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Reporte guardado en {args.json}")
@@ -12,6 +12,36 @@ import numpy as np
 import pandas as pd
 
 
+# Distribuciones de los datos de prueba (también las usa generar_datos_sinteticos.py)
+SEXOS = ['Hombre', 'Mujer']
+TIPOS_INGRESO = ['Programado', 'Urgente', 'Emergencia']
+TIPOS_INGRESO_P = [0.6, 0.3, 0.1]
+SERVICIOS = [
+    'Medicina', 'Cirugía', 'Cardiología', 'Neurología', 'Pediatría',
+    'Ginecología', 'Traumatología', 'Urología', 'Oftalmología', 'Dermatología'
+]
+PREVISIONES = ['FONASA', 'ISAPRE', 'Particular']
+PREVISIONES_P = [0.7, 0.25, 0.05]
+DIAGNOSTICOS = ['I25.1', 'K80.2', 'J44.1', 'A09', 'I21.9', 'G93.1', 'M79.3', 'N18.6', 'H25.9', 'L70.9']
+# Catálogo IR GRD (código + descripción) basado en casos reales
+IR_GRD_CATALOG = [
+    (51401, "051401 - PROCEDIMIENTO CARDIACO"),
+    (61203, "061203 - PROCEDIMIENTO DIGESTIVO"),
+    (174121, "174121 - RADIOTERAPIA"),
+    (81601, "081601 - PROCEDIMIENTO MUSCULOESQUELETICO"),
+    (104132, "104132 - TRASTORNOS ENDOCRINOS"),
+    (41023, "041023 - PH VENTILACIÓN MECÁNICA PROLONGADA SIN CC"),
+    (61201, "061201 - PROCEDIMIENTOS GASTROINTESTINALES"),
+    (91501, "091501 - PROCEDIMIENTOS SOBRE MAMA"),
+    (121142, "121142 - PROSTATECTOMÍA TRANSURETRAL W/CC"),
+    (194163, "194163 - TRASTORNOS ORGÁNICOS W/MCC"),
+]
+TIPOS_GRD = ['M', 'Q']
+TIPOS_GRD_P = [0.7, 0.3]
+PROCEDIMIENTOS = [0, 4651, 9228, 8363, 9223]
+PROCEDIMIENTOS_P = [0.4, 0.2, 0.2, 0.1, 0.1]
+
+
 def guardar_archivos_excel(df_grd, df_score, carpeta, nombre_grd, nombre_score):
     """Guarda dataframes GRD/Score como Excel en la carpeta indicada."""
     os.makedirs(carpeta, exist_ok=True)
@@ -22,82 +52,49 @@ def guardar_archivos_excel(df_grd, df_score, carpeta, nombre_grd, nombre_score):
     return grd_path, score_path
 
 
-def crear_datos_prueba(n_pacientes=10, seed=None):
-    """Crea archivos GRD.xlsx y Score.xlsx con datos aleatorios."""
-    
-    print(f"📝 CREANDO ARCHIVOS DE PRUEBA CON {n_pacientes} FILAS ALEATORIAS")
-    print("=" * 60)
-    
-    if seed is None:
-        seed = int(datetime.now().timestamp()) % 1_000_000
-    np.random.seed(seed)
-    
+def generar_grd_score(n_pacientes, rng=np.random, verbose=True):
+    """DataFrames GRD y Score aleatorios (sin guardar).
+
+    `rng` puede ser `np.random` (estado global, como `crear_datos_prueba`) o un
+    `np.random.RandomState` propio; todo se genera vectorizado.
+    """
     # Generar 10 IDs únicos
     ids = [f"TEST{1000+i}" for i in range(1, n_pacientes + 1)]
     
     # Datos GRD de prueba
-    print("🔧 Generando datos GRD...")
+    if verbose:
+        print("🔧 Generando datos GRD...")
     
     # Edades aleatorias (18-85 años)
-    edades = np.random.randint(18, 86, n_pacientes)
+    edades = rng.randint(18, 86, n_pacientes)
     
     # Sexos aleatorios
-    sexos = np.random.choice(['Hombre', 'Mujer'], n_pacientes)
+    sexos = rng.choice(SEXOS, n_pacientes)
     
     # Tipos de ingreso
-    tipos_ingreso = np.random.choice(
-        ['Programado', 'Urgente', 'Emergencia'],
-        n_pacientes,
-        p=[0.6, 0.3, 0.1]
-    )
+    tipos_ingreso = rng.choice(TIPOS_INGRESO, n_pacientes, p=TIPOS_INGRESO_P)
     
     # Servicios aleatorios
-    servicios = np.random.choice([
-        'Medicina', 'Cirugía', 'Cardiología', 'Neurología', 'Pediatría',
-        'Ginecología', 'Traumatología', 'Urología', 'Oftalmología', 'Dermatología'
-    ], n_pacientes)
+    servicios = rng.choice(SERVICIOS, n_pacientes)
     
     # Previsiones
-    previsiones = np.random.choice(
-        ['FONASA', 'ISAPRE', 'Particular'],
-        n_pacientes,
-        p=[0.7, 0.25, 0.05]
-    )
+    previsiones = rng.choice(PREVISIONES, n_pacientes, p=PREVISIONES_P)
     
     # Diagnósticos aleatorios
-    diagnosticos = np.random.choice([
-        'I25.1', 'K80.2', 'J44.1', 'A09', 'I21.9', 'G93.1', 'M79.3', 'N18.6', 'H25.9', 'L70.9'
-    ], n_pacientes)
+    diagnosticos = rng.choice(DIAGNOSTICOS, n_pacientes)
     
     # Estancias normativas (1-10 días)
-    estancias_norma = np.random.uniform(1, 10, n_pacientes).round(2)
-    
-    # Catálogo IR GRD (código + descripción) basado en casos reales
-    ir_grd_catalog = [
-        (51401, "051401 - PROCEDIMIENTO CARDIACO"),
-        (61203, "061203 - PROCEDIMIENTO DIGESTIVO"),
-        (174121, "174121 - RADIOTERAPIA"),
-        (81601, "081601 - PROCEDIMIENTO MUSCULOESQUELETICO"),
-        (104132, "104132 - TRASTORNOS ENDOCRINOS"),
-        (41023, "041023 - PH VENTILACIÓN MECÁNICA PROLONGADA SIN CC"),
-        (61201, "061201 - PROCEDIMIENTOS GASTROINTESTINALES"),
-        (91501, "091501 - PROCEDIMIENTOS SOBRE MAMA"),
-        (121142, "121142 - PROSTATECTOMÍA TRANSURETRAL W/CC"),
-        (194163, "194163 - TRASTORNOS ORGÁNICOS W/MCC"),
-    ]
-    ir_choices = np.random.choice(len(ir_grd_catalog), n_pacientes)
-    ir_grd_codigo = [ir_grd_catalog[i][0] for i in ir_choices]
-    ir_grd = [ir_grd_catalog[i][1] for i in ir_choices]
+    estancias_norma = rng.uniform(1, 10, n_pacientes).round(2)
+    
+    ir_choices = rng.choice(len(IR_GRD_CATALOG), n_pacientes)
+    ir_grd_codigo = [IR_GRD_CATALOG[i][0] for i in ir_choices]
+    ir_grd = [IR_GRD_CATALOG[i][1] for i in ir_choices]
     
     # Tipos GRD
-    tipos_grd = np.random.choice(['M', 'Q'], n_pacientes, p=[0.7, 0.3])
+    tipos_grd = rng.choice(TIPOS_GRD, n_pacientes, p=TIPOS_GRD_P)
     
     # Procedimientos
-    procedimientos = np.random.choice(
-        [0, 4651, 9228, 8363, 9223],
-        n_pacientes,
-        p=[0.4, 0.2, 0.2, 0.1, 0.1]
-    )
+    procedimientos = rng.choice(PROCEDIMIENTOS, n_pacientes, p=PROCEDIMIENTOS_P)
     
     # Crear DataFrame GRD
     grd_data = {
@@ -119,23 +116,24 @@ def crear_datos_prueba(n_pacientes=10, seed=None):
     df_grd = pd.DataFrame(grd_data)
     
     # Datos Score de prueba
-    print("🔧 Generando datos Score...")
+    if verbose:
+        print("🔧 Generando datos Score...")
     
     # Puntuaciones totales (30-100)
-    puntuaciones_totales = np.random.randint(30, 101, n_pacientes)
+    puntuaciones_totales = rng.randint(30, 101, n_pacientes)
     
     # Evaluaciones sociales (0 o 1)
-    habitacional = np.random.choice([0, 1], n_pacientes, p=[0.3, 0.7])
-    socioeconomica = np.random.choice([0, 1], n_pacientes, p=[0.2, 0.8])
-    salud_mental = np.random.choice([0, 1], n_pacientes, p=[0.25, 0.75])
-    redes = np.random.choice([0, 1], n_pacientes, p=[0.2, 0.8])
-    cuidador = np.random.choice([0, 1], n_pacientes, p=[0.3, 0.7])
+    habitacional = rng.choice([0, 1], n_pacientes, p=[0.3, 0.7])
+    socioeconomica = rng.choice([0, 1], n_pacientes, p=[0.2, 0.8])
+    salud_mental = rng.choice([0, 1], n_pacientes, p=[0.25, 0.75])
+    redes = rng.choice([0, 1], n_pacientes, p=[0.2, 0.8])
+    cuidador = rng.choice([0, 1], n_pacientes, p=[0.3, 0.7])
     
     # Preguntas individuales (basadas en puntuación total)
-    pregunta = np.random.randint(30, 101, n_pacientes)
-    pregunta2 = np.random.randint(30, 101, n_pacientes)
-    pregunta3 = np.random.randint(30, 101, n_pacientes)
-    pregunta4 = np.random.randint(30, 101, n_pacientes)
+    pregunta = rng.randint(30, 101, n_pacientes)
+    pregunta2 = rng.randint(30, 101, n_pacientes)
+    pregunta3 = rng.randint(30, 101, n_pacientes)
+    pregunta4 = rng.randint(30, 101, n_pacientes)
     
     # Crear DataFrame Score
     score_data = {
@@ -153,6 +151,20 @@ def crear_datos_prueba(n_pacientes=10, seed=None):
     }
     
     df_score = pd.DataFrame(score_data)
+    return df_grd, df_score
+
+
+def crear_datos_prueba(n_pacientes=10, seed=None):
+    """Crea archivos GRD.xlsx y Score.xlsx con datos aleatorios."""
+    
+    print(f"📝 CREANDO ARCHIVOS DE PRUEBA CON {n_pacientes} FILAS ALEATORIAS")
+    print("=" * 60)
+    
+    if seed is None:
+        seed = int(datetime.now().timestamp()) % 1_000_000
+    np.random.seed(seed)
+    
+    df_grd, df_score = generar_grd_score(n_pacientes)
     
     # Guardar archivos en la raíz del proyecto
     grd_file, score_file = guardar_archivos_excel(df_grd, df_score, ".", "GRD_prueba", "Score_prueba")
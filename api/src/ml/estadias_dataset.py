@@ -0,0 +1,243 @@
+"""
+Dataset de entrenamiento desde la colección `estadias` de Mongo.
+
+Las estadías egresadas (con `fecha_alta`) ya tienen el resultado real: la
+estancia (`dias_hospitalizacion`, o `fecha_alta - fecha_admision`) se compara
+con la norma GRD para etiquetar `excede_norma`, igual que en `make_dataset`.
+
+1. Se recorre `estadias` con un cursor, con proyección y en bloques de
+   `chunk_size`, ordenado por (episodio, marca_temporal) (índice `ux_epi_ts`).
+   De cada episodio queda el registro más reciente; el último episodio de un
+   bloque se arrastra al siguiente por si continúa ahí.
+2. Cada bloque se convierte a FEATURE_COLUMNS con el mismo mapeo de
+   `estadias_features` que usa el re-scoring (sin completar la norma: eso lo
+   hace `dataset_from_snapshot` con la tabla del propio snapshot) y se agrega a
+   un Parquet. Nunca hay más de un bloque de documentos en memoria.
+3. Mientras se escribe se calcula el sha256 del contenido; el snapshot queda
+   como `estadias.<sha16>.parquet`. Si coincide con el del último
+   entrenamiento (`models/training_source.json`), no se reentrena.
+
+Uso (desde api/):
+    python -m src.ml.estadias_dataset --config src/ml/config.yaml
+    python -m src.ml.estadias_dataset --config src/ml/config.yaml --snapshot-only --chunk-size 20000
+    python -m src.ml.estadias_dataset --config src/ml/config.yaml --force --search random
+
+Los argumentos que no reconoce se pasan a `src.train` (p. ej. `--search`).
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import pandas as pd
+
+from .estadias_features import ESTADIA_FEATURE_FIELDS, raw_estadias_to_features
+from .src.utils import file_sha256
+from .src.data_prep import FEATURE_COLUMNS, SNAPSHOT_LABEL_COLUMNS
+
+DISCHARGED_FILTER = {
+    "episodio": {"$ne": None},
+    "fecha_alta": {"$nin": [None, ""]},
+}
+TRAINING_FIELDS = list(dict.fromkeys([*ESTADIA_FEATURE_FIELDS, "fecha_alta", "dias_hospitalizacion"]))
+TRAINING_PROJECTION = {"_id": 0, **{field: 1 for field in TRAINING_FIELDS}}
+EPISODE_SORT = [("episodio", 1), ("marca_temporal", 1)]
+DEFAULT_CHUNK_SIZE = 10000
+
+SNAPSHOT_COLUMNS = [*FEATURE_COLUMNS, *SNAPSHOT_LABEL_COLUMNS]
+SNAPSHOT_DIRNAME = "estadias_snapshots"
+TRAINING_SOURCE_FILE = "training_source.json"
+_SNAPSHOT_RE = re.compile(r"^estadias\.([0-9a-f]{16})\.parquet$")
+
+DEFAULT_CONFIG = Path(__file__).resolve().parent / "config.yaml"
+
+
+def iter_episode_chunks(cursor, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Bloques de documentos (ordenados por episodio) sin partir un episodio entre dos bloques."""
+    chunk: List[Dict[str, Any]] = []
+    for doc in cursor:
+        if len(chunk) >= chunk_size and doc.get("episodio") != chunk[-1].get("episodio"):
+            yield chunk
+            chunk = []
+        chunk.append(doc)
+    if chunk:
+        yield chunk
+
+
+def _estancia_dias(raw: pd.DataFrame) -> pd.Series:
+    dias = pd.to_numeric(raw["dias_hospitalizacion"], errors="coerce")
+    alta = pd.to_datetime(raw["fecha_alta"], errors="coerce")
+    ingreso = pd.to_datetime(raw["fecha_admision"], errors="coerce")
+    calculado = (alta - ingreso).dt.days
+    return dias.fillna(calculado.where(calculado >= 0)).astype(float)
+
+
+def docs_to_training_frame(docs: List[Dict[str, Any]]) -> pd.DataFrame:
+    """SNAPSHOT_COLUMNS (FEATURE_COLUMNS + episodio, fecha_ingreso, estancia_dias), un episodio por fila."""
+    raw = pd.DataFrame(docs, columns=TRAINING_FIELDS)
+    raw = raw.drop_duplicates("episodio", keep="last").reset_index(drop=True)
+    frame = raw_estadias_to_features(raw, fill_norms=False)
+    frame["episodio"] = raw["episodio"].astype(str)
+    ingreso = pd.to_datetime(raw["fecha_admision"], errors="coerce")
+    frame["fecha_ingreso"] = ingreso.fillna(pd.to_datetime(raw["marca_temporal"], errors="coerce"))
+    frame["estancia_dias"] = _estancia_dias(raw)
+    for col in ("sexo", "servicio_clinico", "prevision"):
+        frame[col] = frame[col].astype(str)
+    frame["fecha_ingreso"] = frame["fecha_ingreso"].astype("datetime64[ns]")
+    return frame[SNAPSHOT_COLUMNS]
+
+
+def snapshot_dir(config: Dict[str, Any]) -> str:
+    return os.path.join(config["paths"]["artifacts_dir"], SNAPSHOT_DIRNAME)
+
+
+def write_snapshot(db, config: Dict[str, Any], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   verbose: bool = False) -> Dict[str, Any]:
+    """Escribe el snapshot Parquet de estadías egresadas. Devuelve ruta, sha256 y conteos."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    out_dir = snapshot_dir(config)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = os.path.join(out_dir, f".estadias.{os.getpid()}.tmp")
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    writer = None
+    docs_read = rows = chunks = 0
+    cursor = db.estadias.find(DISCHARGED_FILTER, TRAINING_PROJECTION, batch_size=chunk_size).sort(EPISODE_SORT)
+    try:
+        for chunk in iter_episode_chunks(cursor, chunk_size):
+            frame = docs_to_training_frame(chunk)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+            docs_read += len(chunk)
+            rows += len(frame)
+            chunks += 1
+            if verbose:
+                print(f"   bloque {chunks}: {rows} episodios ({docs_read} documentos)")
+    finally:
+        cursor.close()
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("No hay estadías egresadas (con fecha_alta) para entrenar.")
+
+    digest.update(",".join(SNAPSHOT_COLUMNS).encode("utf-8"))
+    sha256 = digest.hexdigest()
+    path = os.path.join(out_dir, f"estadias.{sha256[:16]}.parquet")
+    os.replace(tmp_path, path)
+    for name in os.listdir(out_dir):
+        match = _SNAPSHOT_RE.match(name)
+        if match and match.group(1) != sha256[:16]:
+            os.remove(os.path.join(out_dir, name))
+    return {
+        "path": path,
+        "sha256": sha256,
+        "documents": docs_read,
+        "rows": rows,
+        "chunks": chunks,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def last_training_source(config: Dict[str, Any]) -> Dict[str, Any] | None:
+    path = os.path.join(config["paths"]["model_dir"], TRAINING_SOURCE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _model_path(config: Dict[str, Any]) -> Path:
+    return Path(config["paths"]["model_dir"]) / "model_hgb_calibrated.joblib"
+
+
+def is_up_to_date(config: Dict[str, Any], snapshot: Dict[str, Any]) -> bool:
+    """True si el modelo guardado es el que se entrenó con un snapshot de igual contenido.
+
+    Si el modelo se reemplazó después (p. ej. con `src.train` desde GRD/Score), su
+    sha256 ya no coincide con el registrado y se vuelve a entrenar.
+    """
+    previous = last_training_source(config)
+    model_path = _model_path(config)
+    if not previous or previous.get("sha256") != snapshot["sha256"] or not model_path.exists():
+        return False
+    return previous.get("model_sha256") == file_sha256(model_path)
+
+
+def save_training_source(config: Dict[str, Any], snapshot: Dict[str, Any]) -> None:
+    record = {
+        "source": "mongo.estadias",
+        "sha256": snapshot["sha256"],
+        "rows": snapshot["rows"],
+        "snapshot": os.path.basename(snapshot["path"]),
+        "model_sha256": file_sha256(_model_path(config)),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(config["paths"]["model_dir"], TRAINING_SOURCE_FILE), "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+
+
+def load_config(path: str | os.PathLike = DEFAULT_CONFIG) -> Dict[str, Any]:
+    """config.yaml con `paths` resueltos respecto de la carpeta del archivo (no del cwd)."""
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    base = Path(path).resolve().parent
+    config["paths"] = {key: str(base / value) for key, value in config["paths"].items()}
+    return config
+
+
+def train_from_estadias(db, config_path: str | os.PathLike = DEFAULT_CONFIG, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        force: bool = False, snapshot_only: bool = False,
+                        train_argv: List[str] | None = None) -> Dict[str, Any]:
+    """Snapshot de `estadias` y, si el contenido cambió (o `force`), entrenamiento con `src.train`."""
+    from .src import train
+
+    config = load_config(config_path)
+    for key in ("model_dir", "reports_dir", "artifacts_dir"):
+        train.ensure_dirs(config["paths"][key])
+    snapshot = write_snapshot(db, config, chunk_size=chunk_size, verbose=True)
+    report = {"snapshot": snapshot, "trained": False}
+    if snapshot_only:
+        return report
+    if is_up_to_date(config, snapshot) and not force:
+        print(f"✅ Sin cambios desde el último entrenamiento (sha256 {snapshot['sha256'][:16]}); no se reentrena.")
+        return report
+
+    train_args = train.build_parser().parse_args(
+        ["--config", str(config_path), "--snapshot", snapshot["path"], *(train_argv or [])])
+    if train_args.update:
+        train.update_hgb(train_args, config)
+    else:
+        train.main(train_args, config=config)
+    save_training_source(config, snapshot)
+    report["trained"] = True
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ..deps import DB_NAME, _client
+
+    parser = argparse.ArgumentParser(description="Entrena el modelo con las estadías egresadas de Mongo.")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG), help="config.yaml del modelo.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Documentos por bloque.")
+    parser.add_argument("--snapshot-only", action="store_true", help="Solo escribe el snapshot, sin entrenar.")
+    parser.add_argument("--force", action="store_true", help="Reentrena aunque el snapshot no haya cambiado.")
+    args, train_argv = parser.parse_known_args()
+
+    report = train_from_estadias(_client()[DB_NAME], args.config, chunk_size=args.chunk_size, force=args.force,
+                                 snapshot_only=args.snapshot_only, train_argv=train_argv)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,75 @@
+"""
+Construcción de FEATURE_COLUMNS a partir de documentos de la colección `estadias`.
+
+Los registros de gestión no traen exactamente las columnas del modelo: la edad
+se deriva de `fecha_de_nacimiento`, la previsión del convenio/aseguradora y el
+GRD puede venir como `grd_code` o `codigo_grd`. Si un cliente ya guardó la
+columna con el nombre del modelo, esa tiene prioridad.
+"""
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from .predict_nuevos_pacientes import build_feature_frame
+
+# Campos de `estadias` que se leen para armar las features (proyección de Mongo).
+ESTADIA_FEATURE_FIELDS = [
+    "episodio",
+    "edad",
+    "fecha_de_nacimiento",
+    "fecha_admision",
+    "marca_temporal",
+    "sexo",
+    "servicio_clinico",
+    "servicio_especialidad",
+    "prevision",
+    "nombre_de_la_aseguradora",
+    "convenio",
+    "fecha_estimada_de_alta",
+    "estancia_norma_grd",
+    "riesgo_social",
+    "riesgo_clinico",
+    "riesgo_administrativo",
+    "grd_code",
+    "codigo_grd",
+]
+
+ESTADIA_PROJECTION = {field: 1 for field in ESTADIA_FEATURE_FIELDS}
+
+
+def _first_present(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    out = pd.Series(np.nan, index=df.index, dtype=object)
+    for col in reversed(columns):
+        values = df[col].replace("", np.nan)
+        out = values.where(values.notna(), out)
+    return out
+
+
+def _edad_desde_nacimiento(df: pd.DataFrame) -> pd.Series:
+    nacimiento = pd.to_datetime(df["fecha_de_nacimiento"], errors="coerce")
+    referencia = pd.to_datetime(df["fecha_admision"], errors="coerce")
+    referencia = referencia.fillna(pd.to_datetime(df["marca_temporal"], errors="coerce"))
+    dias = (referencia - nacimiento).dt.days
+    return (dias // 365.25).where(dias >= 0)
+
+
+def estadias_to_frame(docs: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """Arma un DataFrame con FEATURE_COLUMNS (listo para el modelo) desde documentos de estadías."""
+    return raw_estadias_to_features(pd.DataFrame(list(docs), columns=ESTADIA_FEATURE_FIELDS))
+
+
+def raw_estadias_to_features(raw: pd.DataFrame, fill_norms: bool = True) -> pd.DataFrame:
+    """FEATURE_COLUMNS desde un DataFrame con (al menos) ESTADIA_FEATURE_FIELDS."""
+    df = pd.DataFrame(index=raw.index)
+    edad = pd.to_numeric(raw["edad"], errors="coerce")
+    df["edad"] = edad.fillna(_edad_desde_nacimiento(raw))
+    df["sexo"] = raw["sexo"]
+    df["servicio_clinico"] = _first_present(raw, ["servicio_clinico", "servicio_especialidad"])
+    df["prevision"] = _first_present(raw, ["prevision", "nombre_de_la_aseguradora", "convenio"])
+    df["fecha_estimada_de_alta"] = _first_present(raw, ["fecha_estimada_de_alta", "estancia_norma_grd"])
+    df["riesgo_social"] = raw["riesgo_social"]
+    df["riesgo_clinico"] = raw["riesgo_clinico"]
+    df["riesgo_administrativo"] = raw["riesgo_administrativo"]
+    df["codigo_grd"] = _first_present(raw, ["grd_code", "codigo_grd"])
+    return build_feature_frame(df, fill_norms=fill_norms)
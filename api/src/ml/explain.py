@@ -0,0 +1,259 @@
+"""
+Contribuciones por feature de cada predicción (`explain=true`).
+
+Todo se expresa en log-odds del modelo, de modo que para cada fila
+
+    logit(probabilidad_modelo) = base_value + sum(contribuciones)
+
+y luego `apply_risk_boost` suma sus ajustes (en probabilidad) antes del recorte
+a [0, 1]:
+
+    probabilidad = clip(probabilidad_modelo + sum(ajustes), 0, 1)
+
+- model_baseline (ColumnTransformer + LogisticRegression): términos lineales
+  exactos coef * x, agregados por feature original (las columnas one-hot de
+  una categoría se suman). La referencia es el "paciente típico" que usan los
+  imputadores: mediana para numéricas y categoría más frecuente para las
+  categóricas, así una contribución 0 significa "igual que la referencia".
+- model_hgb_calibrated (ColumnTransformer + HistGradientBoosting, calibrado
+  con sigmoide): contribuciones por camino (Saabas). Para cada árbol se sigue
+  el camino de la fila y cada split suma E[hijo] - E[nodo] a la feature que
+  lo decide. Los `value` que guarda sklearn en nodos internos no sirven como
+  E[nodo] (son el paso de Newton sin shrinkage y la raíz vale 0), así que las
+  esperanzas se recalculan de abajo hacia arriba promediando los valores de
+  las hojas con `count`. La calibración sigmoide es lineal en el logit
+  (logit = -(a * f + b)), así que contribuciones y base se escalan por -a.
+
+El recorrido de los árboles es vectorizado sobre el lote: todos los árboles
+se apilan en un solo arreglo de nodos y se avanza un nivel por iteración.
+"""
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .model_registry import get_model
+from .predict_nuevos_pacientes import FEATURE_COLUMNS, prepare_features, risk_boost_components
+
+_tree_cache: Dict[int, Dict[str, np.ndarray]] = {}
+
+
+def _transformer_columns(prep) -> Tuple[List[str], List[str], Any, Any]:
+    """(num_cols, cat_cols, imputador numérico, pipeline categórico) de un ColumnTransformer."""
+    by_name = {name: (trans, cols) for name, trans, cols in prep.transformers_}
+    if set(by_name) - {"remainder"} != {"num", "cat"}:
+        raise ValueError("Preprocesamiento no soportado para explicaciones")
+    num_imp, num_cols = by_name["num"]
+    cat_pipe, cat_cols = by_name["cat"]
+    return list(num_cols), list(cat_cols), num_imp, cat_pipe
+
+
+def _unwrap(model) -> Tuple[Any, float, float]:
+    """Pipeline sin calibrar y la transformación lineal del logit (escala, desplazamiento)."""
+    if hasattr(model, "calibrated_classifiers_"):
+        calibrated = model.calibrated_classifiers_
+        calibrators = calibrated[0].calibrators if len(calibrated) == 1 else []
+        if len(calibrators) != 1 or not hasattr(calibrators[0], "a_"):
+            raise ValueError("Solo se explican modelos con una calibración sigmoide (ensemble=False)")
+        # _SigmoidCalibration: p = expit(-(a * f + b))
+        return calibrated[0].estimator, -calibrators[0].a_, -calibrators[0].b_
+    return model, 1.0, 0.0
+
+
+# ---------- modelo lineal ----------
+def _onehot_widths(ohe, cat_cols: List[str]) -> List[int]:
+    """Cuántas columnas one-hot genera cada categórica (incluye la de infrecuentes)."""
+    names = list(ohe.get_feature_names_out(cat_cols))
+    prefixes = [f"{col}_" for col in cat_cols]
+    widths, pos = [], 0
+    for j, prefix in enumerate(prefixes):
+        nxt = prefixes[j + 1] if j + 1 < len(prefixes) else None
+        start = pos
+        while pos < len(names) and names[pos].startswith(prefix) and not (
+            nxt and len(nxt) > len(prefix) and names[pos].startswith(nxt)
+        ):
+            pos += 1
+        widths.append(pos - start)
+    if pos != len(names):
+        raise ValueError("No fue posible mapear las columnas one-hot a sus features")
+    return widths
+
+
+def _linear_contributions(pipe, features: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    prep = pipe.named_steps["prep"]
+    clf = pipe.named_steps["clf"]
+    num_cols, cat_cols, num_imp, cat_pipe = _transformer_columns(prep)
+
+    X = prep.transform(features)
+    coef = clf.coef_[0]
+    n_num = len(num_cols)
+
+    # Referencia: fila "típica" según los imputadores
+    reference = pd.DataFrame(
+        [list(num_imp.statistics_) + list(cat_pipe.named_steps["imp"].statistics_)],
+        columns=num_cols + cat_cols,
+    )
+    x_ref = prep.transform(reference)[0]
+    terms = (X - x_ref) * coef
+
+    contributions = np.zeros((len(features), len(num_cols) + len(cat_cols)))
+    contributions[:, :n_num] = terms[:, :n_num]
+    offset = n_num
+    for j, width in enumerate(_onehot_widths(cat_pipe.named_steps["ohe"], cat_cols)):
+        contributions[:, n_num + j] = terms[:, offset:offset + width].sum(axis=1)
+        offset += width
+    base = float(clf.intercept_[0] + x_ref @ coef)
+    return np.full(len(features), base), contributions
+
+
+# ---------- árboles (HistGradientBoosting) ----------
+def _stacked_trees(hgb) -> Dict[str, np.ndarray]:
+    """Nodos de todos los árboles en arreglos planos, con E[nodo] recalculado."""
+    key = id(hgb)
+    cached = _tree_cache.get(key)
+    if cached is not None and cached["owner"] is hgb:
+        return cached
+
+    if hgb.n_trees_per_iteration_ != 1:
+        raise ValueError("Solo se explican clasificadores binarios")
+    roots, parts = [], []
+    offset = 0
+    for (predictor,) in hgb._predictors:
+        nodes = predictor.nodes
+        if nodes["is_categorical"].any():
+            raise ValueError("Árboles con splits categóricos no soportados")
+        expected = nodes["value"].astype(float)
+        count = nodes["count"].astype(float)
+        is_leaf = nodes["is_leaf"].astype(bool)
+        # Los hijos siempre tienen índice mayor que el padre: basta un recorrido inverso
+        for i in range(len(nodes) - 1, -1, -1):
+            if not is_leaf[i]:
+                left, right = nodes["left"][i], nodes["right"][i]
+                expected[i] = (count[left] * expected[left] + count[right] * expected[right]) / count[i]
+        parts.append((nodes, expected, is_leaf, offset))
+        roots.append(offset)
+        offset += len(nodes)
+
+    total = offset
+    stacked = {
+        "feature": np.zeros(total, dtype=np.intp),
+        "threshold": np.zeros(total),
+        "missing_left": np.zeros(total, dtype=bool),
+        "left": np.zeros(total, dtype=np.intp),
+        "right": np.zeros(total, dtype=np.intp),
+        "is_leaf": np.zeros(total, dtype=bool),
+        "expected": np.zeros(total),
+    }
+    for nodes, expected, is_leaf, start in parts:
+        sl = slice(start, start + len(nodes))
+        stacked["feature"][sl] = nodes["feature_idx"]
+        stacked["threshold"][sl] = nodes["num_threshold"]
+        stacked["missing_left"][sl] = nodes["missing_go_to_left"].astype(bool)
+        stacked["left"][sl] = np.where(is_leaf, 0, nodes["left"] + start)
+        stacked["right"][sl] = np.where(is_leaf, 0, nodes["right"] + start)
+        stacked["is_leaf"][sl] = is_leaf
+        stacked["expected"][sl] = expected
+    stacked["roots"] = np.asarray(roots, dtype=np.intp)
+    stacked["max_depth"] = max(int(p.nodes["depth"].max()) for (p,) in hgb._predictors)
+    stacked["owner"] = hgb
+    _tree_cache.clear()
+    _tree_cache[key] = stacked
+    return stacked
+
+
+def _tree_contributions(pipe, features: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    prep = pipe.named_steps["prep"]
+    hgb = pipe.named_steps["clf"]
+    X = np.asarray(prep.transform(features), dtype=float)
+    trees = _stacked_trees(hgb)
+    n_rows, n_features = X.shape
+    n_trees = len(trees["roots"])
+
+    node = np.broadcast_to(trees["roots"], (n_rows, n_trees)).copy()
+    rows = np.broadcast_to(np.arange(n_rows)[:, None], (n_rows, n_trees))
+    contributions = np.zeros(n_rows * n_features)
+    for _ in range(trees["max_depth"]):
+        active = ~trees["is_leaf"][node]
+        if not active.any():
+            break
+        current = node[active]
+        feat = trees["feature"][current]
+        values = X[rows[active], feat]
+        go_left = np.where(np.isnan(values), trees["missing_left"][current], values <= trees["threshold"][current])
+        child = np.where(go_left, trees["left"][current], trees["right"][current])
+        delta = trees["expected"][child] - trees["expected"][current]
+        contributions += np.bincount(rows[active] * n_features + feat, weights=delta,
+                                     minlength=n_rows * n_features)
+        node[active] = child
+
+    base = float(np.ravel(hgb._baseline_prediction)[0] + trees["expected"][trees["roots"]].sum())
+    return np.full(n_rows, base), contributions.reshape(n_rows, n_features)
+
+
+def _model_contributions(pipe, features: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    num_cols, cat_cols, _, _ = _transformer_columns(pipe.named_steps["prep"])
+    clf = pipe.named_steps["clf"]
+    if hasattr(clf, "coef_"):
+        base, contributions = _linear_contributions(pipe, features)
+    elif hasattr(clf, "_predictors"):
+        base, contributions = _tree_contributions(pipe, features)
+    else:
+        raise ValueError(f"Modelo no soportado para explicaciones: {type(clf).__name__}")
+    return base, contributions, num_cols + cat_cols
+
+
+def explain_feature_frame(features: pd.DataFrame, model=None) -> Dict[str, Any]:
+    """Contribuciones vectorizadas para un DataFrame de FEATURE_COLUMNS.
+
+    Devuelve arreglos por fila: base_value, contributions (n x features, en
+    log-odds), model_probability, adjustments (dict de arreglos) y probability.
+    """
+    info: Dict[str, Any] = {}
+    if model is None:
+        model, info = get_model()
+    pipe, scale, shift = _unwrap(model)
+    base, contributions, names = _model_contributions(pipe, features[FEATURE_COLUMNS])
+    base = scale * base + shift
+    contributions = scale * contributions
+    model_probability = 1.0 / (1.0 + np.exp(-(base + contributions.sum(axis=1))))
+
+    adjustments = risk_boost_components(features)
+    probability = np.clip(model_probability + sum(adjustments.values()), 0.0, 1.0)
+    return {
+        "model_version": info.get("version"),
+        "feature_names": names,
+        "base_value": base,
+        "contributions": contributions,
+        "model_probability": model_probability,
+        "adjustments": adjustments,
+        "probability": probability,
+    }
+
+
+def explanations_to_records(explained: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Una explicación JSON-safe por fila, con las contribuciones ordenadas por magnitud."""
+    names = explained["feature_names"]
+    contributions = np.round(explained["contributions"], 6).tolist()
+    adjustment_names = list(explained["adjustments"])
+    adjustments = np.round(np.column_stack([explained["adjustments"][k] for k in adjustment_names]), 6).tolist()
+    base = np.round(explained["base_value"], 6).tolist()
+    model_probability = np.round(explained["model_probability"], 6).tolist()
+    # Lo que el recorte a [0, 1] quitó o agregó, para que la suma cuadre
+    unclipped = explained["model_probability"] + sum(explained["adjustments"].values())
+    clipping = np.round(explained["probability"] - unclipped, 6).tolist()
+    order = np.argsort(-np.abs(explained["contributions"]), axis=1).tolist()
+    return [
+        {
+            "base_value": base[i],
+            "contribuciones": {names[j]: contributions[i][j] for j in order[i]},
+            "probabilidad_modelo": model_probability[i],
+            "ajustes": dict(zip(adjustment_names, adjustments[i])),
+            "recorte": clipping[i],
+        }
+        for i in range(len(base))
+    ]
+
+
+def explain_dataframe(original_df: pd.DataFrame, model=None) -> List[Dict[str, Any]]:
+    """Explicaciones por fila para un DataFrame de entrada (mismas columnas que la predicción)."""
+    return explanations_to_records(explain_feature_frame(prepare_features(original_df), model=model))
@@ -0,0 +1,428 @@
+"""
+Generador vectorizado de datos sintéticos para pruebas de carga.
+
+`crear_datos_prueba.py` arma una decena de pacientes y escribe xlsx; acá se
+generan millones de filas con NumPy, por bloques, escribiendo cada bloque
+apenas está listo (CSV y/o Parquet). Nunca hay más de un bloque en memoria.
+
+Archivos (en `--out`):
+- `GRD`: columnas de `crear_datos_prueba` + `Fecha Ingreso completa` y
+  `Estancia del Episodio` (entrenamiento con `src.train` / `batch_scoring`).
+- `Score`: una fila por episodio encuestado (~85%), con `gestion` y
+  `categorizacion_de_gestion`.
+- `Gestion`: formulario de gestión con todas las columnas de `CANON_MAP`
+  (`POST /gestion/ingest/csv`) + riesgos, norma y código GRD; ~50% de los
+  episodios, ~80% de ellos ya egresados.
+- `camas`: censo de camas (`POST /camas/ingest/csv`), `--camas-beds` camas por
+  corte, un corte cada `--camas-interval-hours`.
+
+Los tres primeros comparten episodios (`EP000000001`, ...), así que se pueden
+unir. Los valores salen de las distribuciones de `crear_datos_prueba` y la
+estancia depende de la norma GRD, la edad, el puntaje social, el tipo de ingreso
+y la gestión, para que el modelo tenga algo que aprender. Cada bloque usa la
+semilla (`--seed`, tipo de archivo, n° de bloque): misma semilla y mismo
+`--chunk-size` dan los mismos archivos.
+
+Uso (desde api/):
+    python -m src.ml.generar_datos_sinteticos --rows 1000000 --out /tmp/sinteticos
+    python -m src.ml.generar_datos_sinteticos --rows 100000 --out /tmp/s --format csv parquet --datasets grd score
+"""
+import argparse
+import os
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .batch_scoring import ChunkWriter, peak_rss_mb
+from .crear_datos_prueba import (
+    DIAGNOSTICOS,
+    IR_GRD_CATALOG,
+    PREVISIONES,
+    PREVISIONES_P,
+    PROCEDIMIENTOS,
+    PROCEDIMIENTOS_P,
+    SERVICIOS,
+    SEXOS,
+    TIPOS_GRD,
+    TIPOS_GRD_P,
+    TIPOS_INGRESO,
+    TIPOS_INGRESO_P,
+)
+
+DATASETS = ["grd", "score", "gestion", "camas"]
+FILE_NAMES = {"grd": "GRD", "score": "Score", "gestion": "Gestion", "camas": "camas"}
+FORMATS = ["csv", "parquet"]
+DEFAULT_CHUNK_SIZE = 100_000
+START_DATE = np.datetime64("2022-01-01T00:00:00", "s")
+SPAN_DAYS = 3 * 365
+
+# Proporción de episodios con encuesta Score / con registro de gestión / egresados
+SCORE_FRACTION = 0.85
+GESTION_FRACTION = 0.5
+EGRESO_FRACTION = 0.8
+
+CATEGORIAS_GESTION = [
+    "sin_gestion", "coordinacion_familiar", "coordinacion_interinstitucional",
+    "soporte_financiero", "intervencion_psicosocial", "derivacion_apoyo_psicosocial",
+]
+RIESGOS = np.array(["bajo", "medio", "alto"], dtype=object)
+NOMBRES = {
+    "Hombre": ["Juan", "Pedro", "Luis", "Carlos", "Jose", "Diego", "Jorge", "Miguel", "Andres", "Felipe"],
+    "Mujer": ["Maria", "Ana", "Carmen", "Patricia", "Daniela", "Catalina", "Fernanda", "Valentina", "Camila", "Sofia"],
+}
+APELLIDOS = ["Gonzalez", "Munoz", "Rojas", "Diaz", "Perez", "Soto", "Contreras", "Silva", "Martinez", "Sepulveda"]
+UNIDADES = ["UCI", "UTI", "Medicina", "Cirugia", "Pediatria", "Maternidad", "Cardiologia", "Neurologia"]
+ESTADOS_CAMA = ["Ocupada", "Disponible", "Bloqueada"]
+ESTADOS_CAMA_P = [0.8, 0.15, 0.05]
+
+
+def _rng(seed: int, dataset: str, chunk: int) -> np.random.Generator:
+    return np.random.default_rng([seed, DATASETS.index(dataset), chunk])
+
+
+def _choice(rng: np.random.Generator, values, n: int, p=None) -> np.ndarray:
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def _iso(ts: np.ndarray) -> np.ndarray:
+    """datetime64[s] → 'YYYY-MM-DD HH:MM:SS' (la 'T' se reemplaza sobre el buffer, sin bucle Python)."""
+    text = np.datetime_as_string(ts, unit="s")
+    text.view("U1").reshape(len(text), -1)[:, 10] = " "
+    return text
+
+
+def _date(ts: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(ts.astype("datetime64[D]"), unit="D")
+
+
+def _hhmm(ts: np.ndarray) -> np.ndarray:
+    chars = np.datetime_as_string(ts, unit="m").view("U1").reshape(len(ts), -1)
+    return np.ascontiguousarray(chars[:, 11:16]).view("U5").ravel()
+
+
+def _join(*parts) -> np.ndarray:
+    """Concatena arreglos/strings como objetos (más rápido que np.char.add)."""
+    out = np.asarray(parts[0], dtype=object)
+    for part in parts[1:]:
+        out = out + (np.asarray(part, dtype=object) if isinstance(part, np.ndarray) else part)
+    return out
+
+
+def _padded(numbers: np.ndarray, width: int) -> np.ndarray:
+    """Enteros con ceros a la izquierda ('000123'), armando los dígitos como códigos Unicode."""
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    digits = (np.asarray(numbers, dtype=np.int64)[:, None] // powers) % 10
+    return (digits + ord("0")).astype(np.uint32).view(f"U{width}").ravel()
+
+
+def ruts(numbers: np.ndarray) -> np.ndarray:
+    """RUN con dígito verificador ('12345678-5'), vectorizado (mismo cálculo que ingest)."""
+    total = np.zeros(len(numbers), dtype=np.int64)
+    rest = numbers.astype(np.int64).copy()
+    position = 0
+    while (rest > 0).any():
+        total += (rest % 10) * (2 + position % 6)
+        rest //= 10
+        position += 1
+    dv = 11 - total % 11
+    dv_text = np.where(dv == 11, "0", np.where(dv == 10, "K", dv.astype(str)))
+    return _join(numbers.astype(str), "-", dv_text)
+
+
+def episode_ids(start: int, n: int) -> np.ndarray:
+    return _join("EP", _padded(np.arange(start + 1, start + n + 1), 9))
+
+
+def normas_por_grd(seed: int) -> np.ndarray:
+    """Norma (días) fija por código del catálogo, como en una tabla GRD real."""
+    return np.random.default_rng([seed, 99]).uniform(2, 12, len(IR_GRD_CATALOG)).round(1)
+
+
+def episode_block(seed: int, chunk: int, start: int, n: int, normas: np.ndarray) -> Dict[str, np.ndarray]:
+    """Variables de `n` episodios (compartidas por GRD, Score y Gestión)."""
+    rng = _rng(seed, "grd", chunk)
+    grd_idx = rng.integers(0, len(IR_GRD_CATALOG), n)
+    ep = {
+        "episodio": episode_ids(start, n),
+        "edad": rng.integers(18, 86, n),
+        "sexo": _choice(rng, SEXOS, n),
+        "tipo_ingreso": _choice(rng, TIPOS_INGRESO, n, TIPOS_INGRESO_P),
+        "servicio": _choice(rng, SERVICIOS, n),
+        "prevision": _choice(rng, PREVISIONES, n, PREVISIONES_P),
+        "diagnostico": _choice(rng, DIAGNOSTICOS, n),
+        "grd_codigo": np.array([code for code, _ in IR_GRD_CATALOG])[grd_idx],
+        "grd_desc": np.array([desc for _, desc in IR_GRD_CATALOG], dtype=object)[grd_idx],
+        "tipo_grd": _choice(rng, TIPOS_GRD, n, TIPOS_GRD_P),
+        "procedimiento": np.asarray(PROCEDIMIENTOS)[rng.choice(len(PROCEDIMIENTOS), n, p=PROCEDIMIENTOS_P)],
+        "norma": normas[grd_idx],
+        "ingreso": START_DATE + rng.integers(0, SPAN_DAYS * 86400, n).astype("timedelta64[s]"),
+        "total": rng.integers(30, 101, n),
+        "salud_mental": rng.choice([0, 1], n, p=[0.25, 0.75]),
+        "categoria": rng.choice(len(CATEGORIAS_GESTION), n, p=[0.5, 0.15, 0.1, 0.1, 0.1, 0.05]),
+        "u": rng.random((4, n)),
+    }
+    gestion = ep["categoria"] > 0
+    log_factor = (
+        -0.15
+        + 0.006 * (ep["edad"] - 50)
+        + 0.3 * (ep["total"] < 50)
+        + 0.2 * (ep["tipo_ingreso"] == "Emergencia")
+        + 0.15 * gestion
+        + 0.15 * (ep["salud_mental"] == 0)
+        + rng.normal(0, 0.45, n)
+    )
+    ep["estancia"] = np.maximum(1, np.rint(ep["norma"] * np.exp(log_factor))).astype(int)
+    ep["gestion"] = gestion
+    return ep
+
+
+def grd_frame(ep: Dict[str, np.ndarray]) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Episodio CMBD": ep["episodio"],
+        "Fecha Ingreso completa": _iso(ep["ingreso"]),
+        "Edad en años": ep["edad"],
+        "Sexo  (Desc)": ep["sexo"],
+        "Tipo Ingreso (Descripción)": ep["tipo_ingreso"],
+        "Servicio Ingreso (Descripción)": ep["servicio"],
+        "Previsión (Desc)": ep["prevision"],
+        "Diagnóstico Principal": ep["diagnostico"],
+        "Estancia Norma GRD ": ep["norma"],
+        "IR GRD": ep["grd_desc"],
+        "IR Tipo GRD": ep["tipo_grd"],
+        "IR GRD (Código)": ep["grd_codigo"],  # nombre de la exportación real (→ ir_grd_codigo_)
+        "Proced 01 Principal (Cod)": ep["procedimiento"],
+        "Estancia del Episodio": ep["estancia"],
+    })
+
+
+def score_frame(ep: Dict[str, np.ndarray], seed: int, chunk: int) -> pd.DataFrame:
+    rng = _rng(seed, "score", chunk)
+    keep = ep["u"][0] < SCORE_FRACTION
+    n = int(keep.sum())
+    total = ep["total"][keep]
+    categoria = ep["categoria"][keep]
+    return pd.DataFrame({
+        "episodio": ep["episodio"][keep],
+        "total": total,
+        "habitacional": rng.choice([0, 1], n, p=[0.3, 0.7]),
+        "socioeconomica": rng.choice([0, 1], n, p=[0.2, 0.8]),
+        "salud_mental": ep["salud_mental"][keep],
+        "redes": rng.choice([0, 1], n, p=[0.2, 0.8]),
+        "cuidador": rng.choice([0, 1], n, p=[0.3, 0.7]),
+        "pregunta": np.clip(total + rng.integers(-10, 11, n), 30, 100),
+        "pregunta2": np.clip(total + rng.integers(-10, 11, n), 30, 100),
+        "pregunta3": np.clip(total + rng.integers(-10, 11, n), 30, 100),
+        "pregunta4": np.clip(total + rng.integers(-10, 11, n), 30, 100),
+        "gestion": np.where(categoria > 0, "si", "no"),
+        "categorizacion_de_gestion": np.asarray(CATEGORIAS_GESTION, dtype=object)[categoria],
+    })
+
+
+def gestion_frame(ep: Dict[str, np.ndarray], seed: int, chunk: int) -> pd.DataFrame:
+    """Filas del formulario de gestión: columnas de CANON_MAP (slug) + riesgos y GRD."""
+    from ..routers.ingest import CANON_MAP
+
+    rng = _rng(seed, "gestion", chunk)
+    keep = ep["u"][1] < GESTION_FRACTION
+    n = int(keep.sum())
+    ingreso = ep["ingreso"][keep]
+    estancia = ep["estancia"][keep]
+    egresado = ep["u"][2][keep] < EGRESO_FRACTION
+    sexo = ep["sexo"][keep]
+    marca = ingreso + rng.integers(3600, 48 * 3600, n).astype("timedelta64[s]")
+    modificacion = marca + rng.integers(600, 72 * 3600, n).astype("timedelta64[s]")
+    alta = ingreso + (estancia * 86400).astype("timedelta64[s]")
+    fin = modificacion + rng.integers(3600, 24 * 3600, n).astype("timedelta64[s]")
+    nacimiento = ingreso - (ep["edad"][keep] * 365.25 * 86400 + rng.integers(0, 365 * 86400, n)).astype(
+        "timedelta64[s]")
+    nombres = np.where(
+        sexo == "Hombre",
+        _choice(rng, NOMBRES["Hombre"], n),
+        _choice(rng, NOMBRES["Mujer"], n),
+    )
+    total = ep["total"][keep]
+    riesgo_social = np.where(total < 50, 2, np.where(total < 75, 1, 0))
+    riesgo_clinico = np.where(ep["salud_mental"][keep] == 0, 2, rng.integers(0, 2, n))
+    riesgo_admin = np.minimum(2, ep["categoria"][keep] // 2 + ep["gestion"][keep])
+    solicitud = _choice(rng, ["Traslado", "Homecare", "Apoyo social", "Coordinación familiar"], n)
+    empty = np.full(n, "", dtype=object)
+
+    def _si_egresado(values, dtype=object):
+        return pd.Series(values, dtype=dtype).where(egresado)
+
+    columns = {
+        "marco_temporal": _iso(marca),
+        "status": _choice(rng, ["Abierta", "En proceso", "Cerrada"], n, [0.2, 0.3, 0.5]),
+        "causa_devolucion_rechazo": empty,
+        "ultima_modificacion": _iso(modificacion),
+        "episodio": ep["episodio"][keep],
+        "que_gestion_se_solicito": solicitud,
+        "fecha_inicio": _date(marca),
+        "hora_inicio": _hhmm(marca),
+        "informe": empty,
+        "tipo_cuenta_1": _choice(rng, ["Hospitalizado", "Ambulatorio"], n, [0.9, 0.1]),
+        "tipo_cuenta_2": empty,
+        "tipo_cuenta_3": empty,
+        "nombre": _join(nombres, " ", _choice(rng, APELLIDOS, n)),
+        "rut": ruts(rng.integers(7_000_000, 27_000_000, n)),
+        "fecha_admision": _date(ingreso),
+        "mes": ingreso.astype("datetime64[M]").astype(int) % 12 + 1,
+        "ano": ingreso.astype("datetime64[Y]").astype(int) + 1970,
+        "fecha_alta": _si_egresado(_date(alta)),
+        "cama": _join("C", _padded(rng.integers(1, 500, n), 4)),
+        "texto_libre_diagnostico_admision": ep["diagnostico"][keep],
+        "diagnostico_transfer": empty,
+        "convenio": ep["prevision"][keep],
+        "nombre_de_la_aseguradora": ep["prevision"][keep],
+        "valor_parcial": empty,
+        "solicitud_de_traslado": _choice(rng, ["si", "no"], n, [0.3, 0.7]),
+        "concretado": _choice(rng, ["si", "no"], n, [0.6, 0.4]),
+        "dias_hospitalizacion": _si_egresado(estancia, "Int64"),
+        "dias_reales": _si_egresado(estancia, "Int64"),
+        "mes2": _si_egresado(alta.astype("datetime64[M]").astype(int) % 12 + 1, "Int64"),
+        "ano2": _si_egresado(alta.astype("datetime64[Y]").astype(int) + 1970, "Int64"),
+        "fecha_de_nacimiento": _date(nacimiento),
+        "sexo": np.where(sexo == "Hombre", "Masculino", "Femenino"),
+        "estado": _choice(rng, ["Pendiente", "Aceptada", "Rechazada", "Cancelada"], n, [0.3, 0.5, 0.1, 0.1]),
+        "motivo_de_cancelacion": empty,
+        "motivo_de_rechazo": empty,
+        "tipo_de_solicitud": solicitud,
+        "tipo_de_traslado": _choice(rng, ["Ambulancia básica", "Ambulancia avanzada", "Particular"], n),
+        "motivo_de_traslado": _choice(rng, ["Cercanía", "Complejidad", "Convenio"], n),
+        "centro_de_destinatario": _choice(rng, ["Hospital Sótero del Río", "Clínica San Carlos", "Domicilio"], n),
+        "nivel_de_atencion": _choice(rng, ["Básico", "Intermedio", "Crítico"], n, [0.6, 0.3, 0.1]),
+        "servicio_especialidad": ep["servicio"][keep],
+        "fecha_de_finalizacion": _iso(fin),
+        "hora_de_finalizacion": _hhmm(fin),
+        "dias_solicitados_homecare": np.where(solicitud == "Homecare", rng.integers(3, 30, n).astype(str), ""),
+        "texto_libre_causa_rechazo": empty,
+    }
+    missing = set(CANON_MAP) - set(columns)
+    if missing:
+        raise RuntimeError(f"Faltan columnas de CANON_MAP en el generador de gestión: {sorted(missing)}")
+    frame = pd.DataFrame({key: columns[key] for key in CANON_MAP})
+    # Campos ML (no están en CANON_MAP; el ingest los guarda tal cual). El código GRD
+    # va con 6 dígitos para que el ingest no lo confunda con una fecha serial de Excel.
+    frame["riesgo_social"] = RIESGOS[riesgo_social]
+    frame["riesgo_clinico"] = RIESGOS[riesgo_clinico]
+    frame["riesgo_administrativo"] = RIESGOS[riesgo_admin]
+    frame["estancia_norma_grd"] = ep["norma"][keep]
+    frame["codigo_grd"] = _padded(ep["grd_codigo"][keep], 6)
+    return frame
+
+
+def camas_frame(seed: int, chunk: int, start: int, n: int, beds: int, interval_hours: int) -> pd.DataFrame:
+    """Filas `start`..`start+n` del censo: corte = fila // beds, cama = fila % beds."""
+    rng = _rng(seed, "camas", chunk)
+    row = np.arange(start, start + n)
+    corte, bed = row // beds, row % beds
+    estado = _choice(rng, ESTADOS_CAMA, n, ESTADOS_CAMA_P)
+    ocupada = estado == "Ocupada"
+    sexo = _choice(rng, SEXOS, n)
+    nombres = np.where(sexo == "Hombre", _choice(rng, NOMBRES["Hombre"], n), _choice(rng, NOMBRES["Mujer"], n))
+    paciente = _join(nombres, " ", _choice(rng, APELLIDOS, n))
+    snapshot = START_DATE + (corte * interval_hours * 3600).astype("timedelta64[s]")
+    return pd.DataFrame({
+        "unidad": np.asarray(UNIDADES, dtype=object)[bed % len(UNIDADES)],
+        "sala": _join("S", _padded(bed // len(UNIDADES) // 4 + 1, 3)),
+        "cama": _join("C", _padded(bed, 4)),
+        "estado": estado,
+        "paciente": np.where(ocupada, paciente, ""),
+        "run": np.where(ocupada, ruts(rng.integers(7_000_000, 27_000_000, n)), ""),
+        "diagnostico": np.where(ocupada, _choice(rng, DIAGNOSTICOS, n).astype(str), ""),
+        "fecha_hora": _iso(snapshot),
+    })
+
+
+def _blocks(total: int, chunk_size: int) -> Iterator[Tuple[int, int, int]]:
+    for chunk, start in enumerate(range(0, total, chunk_size)):
+        yield chunk, start, min(chunk_size, total - start)
+
+
+def generar(out_dir: str, rows: int, datasets: List[str] = DATASETS, formats: List[str] = ("csv",),
+            seed: int = 42, chunk_size: int = DEFAULT_CHUNK_SIZE, camas_rows: int | None = None,
+            camas_beds: int = 400, camas_interval_hours: int = 4, verbose: bool = True) -> Dict[str, Any]:
+    """Escribe los archivos pedidos por bloques. Devuelve filas, bytes y filas/seg por archivo."""
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    writers = {
+        (name, fmt): ChunkWriter(os.path.join(out_dir, f"{FILE_NAMES[name]}.{fmt}"))
+        for name in datasets for fmt in formats
+    }
+    seconds = {name: 0.0 for name in datasets}
+
+    def _write(name: str, frame: pd.DataFrame, t0: float) -> None:
+        for fmt in formats:
+            writers[(name, fmt)].write(frame)
+        seconds[name] += time.perf_counter() - t0
+
+    try:
+        episode_sets = [name for name in datasets if name != "camas"]
+        if episode_sets:
+            normas = normas_por_grd(seed)
+            for chunk, start, n in _blocks(rows, chunk_size):
+                ep = episode_block(seed, chunk, start, n, normas)
+                for name in episode_sets:
+                    t0 = time.perf_counter()
+                    if name == "grd":
+                        frame = grd_frame(ep)
+                    elif name == "score":
+                        frame = score_frame(ep, seed, chunk)
+                    else:
+                        frame = gestion_frame(ep, seed, chunk)
+                    _write(name, frame, t0)
+                if verbose:
+                    print(f"   bloque {chunk + 1}: {start + n} episodios")
+        if "camas" in datasets:
+            for chunk, start, n in _blocks(camas_rows or rows, chunk_size):
+                _write("camas", camas_frame(seed, chunk, start, n, camas_beds, camas_interval_hours),
+                       time.perf_counter())
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    files = []
+    for (name, fmt), writer in writers.items():
+        files.append({
+            "dataset": name,
+            "path": writer.path,
+            "rows": writer.rows,
+            "mb": round(os.path.getsize(writer.path) / 1e6, 1),
+            "seconds": round(seconds[name], 2),
+            "rows_per_second": round(writer.rows / seconds[name], 1) if seconds[name] > 0 else None,
+        })
+    elapsed = time.perf_counter() - started
+    return {
+        "seed": seed,
+        "chunk_size": chunk_size,
+        "episodes": rows if any(name != "camas" for name in datasets) else 0,
+        "files": files,
+        "elapsed_seconds": round(elapsed, 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    parser = argparse.ArgumentParser(description="Genera GRD/Score/Gestión/camas sintéticos para pruebas de carga.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Episodios (filas del GRD).")
+    parser.add_argument("--out", type=str, required=True, help="Carpeta de salida.")
+    parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=DATASETS)
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=["csv"], dest="formats")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Filas por bloque.")
+    parser.add_argument("--camas-rows", type=int, default=None, help="Filas del censo de camas (default: --rows).")
+    parser.add_argument("--camas-beds", type=int, default=400, help="Camas por corte del censo.")
+    parser.add_argument("--camas-interval-hours", type=int, default=4, help="Horas entre cortes del censo.")
+    args = parser.parse_args()
+
+    print(f"🔧 Generando {args.rows} episodios ({', '.join(args.datasets)}) en {args.out}...")
+    report = generar(args.out, args.rows, args.datasets, args.formats, seed=args.seed, chunk_size=args.chunk_size,
+                     camas_rows=args.camas_rows, camas_beds=args.camas_beds,
+                     camas_interval_hours=args.camas_interval_hours)
+    for f in report["files"]:
+        print(f"✅ {f['path']}: {f['rows']} filas, {f['mb']} MB ({f['rows_per_second']} filas/seg)")
+    print(json.dumps(report, indent=2))
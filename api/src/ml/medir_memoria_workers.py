@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Mide la memoria por worker al cargar los modelos de `models/`.
+
+Simula N workers de la API (procesos que importan el stack de ML, cargan los
+tres artefactos y hacen una predicción) en tres modos:
+
+- normal:  cada worker arranca de cero y hace `joblib.load` (uvicorn --workers).
+- mmap:    igual, pero con `joblib.load(mmap_mode="r")`: los arreglos numpy de
+           los artefactos quedan como páginas de solo lectura compartidas.
+- prefork: el proceso padre importa y carga todo antes de hacer fork
+           (gunicorn --preload con ML_PRELOAD=1); los hijos comparten esas
+           páginas copy-on-write.
+
+Para cada worker reporta RSS, PSS (RSS con las páginas compartidas repartidas
+entre procesos) y memoria privada, leídos de /proc/self/smaps_rollup (Linux).
+
+Uso:
+    python medir_memoria_workers.py --workers 4
+    python medir_memoria_workers.py --workers 4 --modos mmap prefork --json reporte.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+from pathlib import Path
+
+MODELS_DIR = Path(__file__).resolve().parent / "models"
+MODEL_FILES = [
+    "model_hgb_calibrated.joblib",
+    "model_baseline.joblib",
+    "model_logistic_only.joblib",
+]
+MODOS = ["normal", "mmap", "prefork"]
+
+
+def _memory_kb() -> dict:
+    """RSS/PSS/privada del proceso actual, en kB."""
+    fields = {"Rss": "rss_kb", "Pss": "pss_kb", "Private_Clean": "private_clean_kb", "Private_Dirty": "private_dirty_kb"}
+    out = {v: None for v in fields.values()}
+    try:
+        with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    out[fields[key]] = int(rest.split()[0])
+    except OSError:
+        import resource
+        out["rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if out["private_clean_kb"] is not None:
+        out["private_kb"] = out.pop("private_clean_kb") + out.pop("private_dirty_kb")
+    return out
+
+
+def _load_models(mmap_mode=None):
+    from joblib import load
+
+    return [load(MODELS_DIR / name, mmap_mode=mmap_mode) for name in MODEL_FILES]
+
+
+def _touch(models) -> None:
+    """Una predicción por modelo, como haría el primer request de un worker."""
+    import pandas as pd
+
+    row = pd.DataFrame([{
+        "edad": 60, "sexo": "Mujer", "servicio_clinico": "Medicina", "prevision": "FONASA",
+        "fecha_estimada_de_alta": 5.0, "riesgo_social": 1.0, "riesgo_clinico": 1.0,
+        "riesgo_administrativo": 0.0, "codigo_grd": 51401.0,
+    }])
+    for model in models[:2]:  # model_logistic_only usa el esquema antiguo de columnas
+        model.predict_proba(row)
+
+
+def _worker(mmap_mode, preloaded, barrier, queue):
+    models = preloaded if preloaded is not None else _load_models(mmap_mode)
+    _touch(models)
+    barrier.wait()  # todos vivos a la vez, para que PSS reparta lo compartido
+    queue.put(_memory_kb())
+    barrier.wait()
+
+
+def medir(modo: str, workers: int) -> dict:
+    if modo == "prefork":
+        ctx = mp.get_context("fork")
+        preloaded = _load_models()
+        _touch(preloaded)
+        mmap_mode = None
+    else:
+        ctx = mp.get_context("spawn")
+        preloaded = None
+        mmap_mode = "r" if modo == "mmap" else None
+
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mmap_mode, preloaded, barrier, queue)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    samples = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    def _avg(key):
+        vals = [s[key] for s in samples if s.get(key) is not None]
+        return round(sum(vals) / len(vals) / 1024, 1) if vals else None
+
+    return {
+        "modo": modo,
+        "workers": workers,
+        "rss_mb_por_worker": _avg("rss_kb"),
+        "pss_mb_por_worker": _avg("pss_kb"),
+        "privada_mb_por_worker": _avg("private_kb"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memoria por worker al cargar los modelos.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=MODOS)
+    parser.add_argument("--json", type=str, default=None, help="Guardar el reporte en este archivo.")
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        print("⚠️ PSS y memoria privada solo están disponibles en Linux; se reporta RSS máximo.")
+
+    resultados = []
+    for modo in args.modos:
+        res = medir(modo, args.workers)
+        resultados.append(res)
+        print(f"{modo:8s} RSS {res['rss_mb_por_worker']} MB | PSS {res['pss_mb_por_worker']} MB | "
+              f"privada {res['privada_mb_por_worker']} MB (promedio de {args.workers} workers)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(resultados, fh, indent=2)
+        print(f"💾 Reporte guardado en {args.json}")
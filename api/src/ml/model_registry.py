@@ -0,0 +1,249 @@
+"""
+Registro del modelo en memoria.
+
+Carga una sola vez el primer artefacto disponible de `models/` y lo mantiene
+en memoria junto a su versión (nombre + hash del archivo). `reload_model()`
+fuerza una nueva lectura desde disco y avisa a quienes se hayan suscrito con
+`on_reload()` (por ejemplo, la caché de predicciones).
+
+Memoria compartida entre workers:
+- ML_PRELOAD=1 hace que `src.app` cargue el modelo al importarse; con
+  `gunicorn --preload` eso ocurre en el proceso maestro antes del fork y los
+  workers comparten (copy-on-write) el stack de ML ya importado.
+- ML_MMAP_MODE=r carga los arreglos numpy del artefacto con
+  `joblib.load(mmap_mode="r")`, como páginas de solo lectura compartidas por
+  todos los procesos. Requiere artefactos sin comprimir (el `dump` por defecto).
+Ver `medir_memoria_workers.py` para medir RSS/PSS por worker.
+
+Varios workers: `reload_model()` solo recarga el proceso que lo llama. Para que
+los demás no sigan con el modelo anterior, `get_model()` revisa cada
+ML_RELOAD_CHECK_SECONDS (5 por defecto; 0 desactiva) la firma de los artefactos
+en disco (ruta, mtime y tamaño del modelo, `fill_stats.json` y
+`grd_norms.json`) y recarga si cambió. Reemplazar los archivos de forma atómica
+(escribir aparte y renombrar), sobre todo con ML_MMAP_MODE=r.
+
+Estadísticas de relleno: `models/fill_stats.json` (lo escribe `src/train.py`)
+guarda las medianas de entrenamiento que usa `apply_risk_boost`;
+`get_fill_stats()` las lee una vez y se recargan junto con el modelo. Lo mismo
+para `models/grd_norms.json` (tabla codigo_grd → norma, ver `get_grd_norms()`).
+
+Champion/challenger: ML_CHALLENGER=<archivo en models/> (p. ej.
+`model_baseline.joblib`) registra un segundo modelo que `get_challenger()`
+carga a pedido; lo usa el scoring en sombra (`services/shadow.py`).
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+MODELS_DIR = Path(__file__).resolve().parent / "models"
+
+MODEL_CANDIDATES = [
+    "model_hgb_calibrated.joblib",
+    "model_baseline.joblib",
+    "model_logistic_only.joblib",
+]
+
+FILL_STATS_FILE = "fill_stats.json"
+GRD_NORMS_FILE = "grd_norms.json"
+
+ML_MMAP_MODE = os.getenv("ML_MMAP_MODE") or None
+ML_CHALLENGER = os.getenv("ML_CHALLENGER") or None
+ML_RELOAD_CHECK_SECONDS = float(os.getenv("ML_RELOAD_CHECK_SECONDS", "5"))
+
+_lock = threading.Lock()
+_model: Any = None
+_model_info: Dict[str, Any] | None = None
+_challenger: Tuple[Any, Dict[str, Any]] | None = None
+_fill_stats: Dict[str, float] | None = None
+_grd_norms: Dict[str, Any] | None = None
+_reload_callbacks: List[Callable[[Dict[str, Any]], None]] = []
+_signature: Tuple | None = None
+_next_check = 0.0
+_check_lock = threading.Lock()
+
+
+def resolve_model_path(models_dir: Path = MODELS_DIR) -> Path:
+    """Devuelve el primer artefacto existente según el orden de preferencia."""
+    for name in MODEL_CANDIDATES:
+        path = models_dir / name
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"No se encontraron modelos en {models_dir}")
+
+
+def resolve_challenger_path(models_dir: Path = MODELS_DIR) -> Path | None:
+    """Ruta del challenger configurado en ML_CHALLENGER, o None si no hay."""
+    if not ML_CHALLENGER:
+        return None
+    path = models_dir / ML_CHALLENGER
+    if not path.suffix:
+        path = path.with_suffix(".joblib")
+    if not path.exists():
+        raise FileNotFoundError(f"No se encontró el modelo challenger {path}")
+    return path
+
+
+def _load_from_disk(path: Path | None = None) -> Tuple[Any, Dict[str, Any]]:
+    # importar el registro (p. ej. en check_artifacts) no carga joblib ni pandas
+    from joblib import load
+    from .src.utils import file_sha256
+
+    path = path or resolve_model_path()
+    sha256 = file_sha256(path)
+
+    print(f"📦 Cargando modelo: {path}")
+    model = load(path, mmap_mode=ML_MMAP_MODE)
+    info = {
+        "name": path.stem,
+        "path": str(path),
+        "sha256": sha256,
+        "version": f"{path.stem}@{sha256[:12]}",
+    }
+    return model, info
+
+
+def _artifacts_signature(models_dir: Path = MODELS_DIR) -> Tuple:
+    """(ruta, mtime, tamaño) del modelo activo y de los JSON que lo acompañan."""
+    signature = []
+    for path in (resolve_model_path(models_dir), models_dir / FILL_STATS_FILE, models_dir / GRD_NORMS_FILE):
+        try:
+            stat = path.stat()
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((str(path), None, None))
+    return tuple(signature)
+
+
+def _reload_if_changed() -> None:
+    """Recarga si los artefactos en disco cambiaron (p. ej. los recargó otro worker)."""
+    global _next_check
+    now = time.monotonic()
+    if ML_RELOAD_CHECK_SECONDS <= 0 or now < _next_check or not _check_lock.acquire(blocking=False):
+        return
+    try:
+        _next_check = now + ML_RELOAD_CHECK_SECONDS
+        try:
+            changed = _artifacts_signature() != _signature
+        except FileNotFoundError:
+            return  # sin artefacto en disco: se sigue con el que está en memoria
+        if changed:
+            print("🔄 Los artefactos del modelo cambiaron en disco; recargando.")
+            reload_model()
+    finally:
+        _check_lock.release()
+
+
+def _load_fill_stats(models_dir: Path = MODELS_DIR) -> Dict[str, float]:
+    path = models_dir / FILL_STATS_FILE
+    if not path.exists():
+        print(f"⚠️ No existe {path}; apply_risk_boost usará medianas del lote.")
+        return {}
+    with open(path, "r", encoding="utf-8") as fh:
+        return {k: float(v) for k, v in json.load(fh).get("medians", {}).items()}
+
+
+def get_fill_stats() -> Dict[str, float]:
+    """Medianas de entrenamiento por columna (vacío si el artefacto no existe)."""
+    global _fill_stats
+    if _fill_stats is None:
+        with _lock:
+            if _fill_stats is None:
+                _fill_stats = _load_fill_stats()
+    return _fill_stats
+
+
+def _load_grd_norms(models_dir: Path = MODELS_DIR) -> Dict[str, Any]:
+    path = models_dir / GRD_NORMS_FILE
+    if not path.exists():
+        print(f"⚠️ No existe {path}; fecha_estimada_de_alta es obligatoria en la predicción "
+              f"y /prediccion/grd responde 503.")
+        return {"columns": [], "table": {}, "norma": {}}
+    with open(path, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    columns = data.get("columns", [])
+    table = {int(code): dict(zip(columns, values)) for code, values in data.get("table", {}).items()}
+    return {
+        "columns": columns,
+        "table": table,
+        # Índice plano para el relleno en la predicción (un lookup de dict por fila)
+        "norma": {code: row["norma"] for code, row in table.items() if row.get("norma") is not None},
+    }
+
+
+def check_artifacts(models_dir: Path = MODELS_DIR) -> None:
+    """Avisa al arrancar si faltan los JSON que acompañan al modelo (sin cargar nada)."""
+    if not (models_dir / GRD_NORMS_FILE).exists():
+        print(f"⚠️ No existe {models_dir / GRD_NORMS_FILE} (se genera con `python -m src.train`): "
+              f"sin tabla de normas GRD, fecha_estimada_de_alta es obligatoria en /prediccion/nuevos-pacientes; "
+              f"en lotes y re-scoring las filas sin norma quedan con la mediana de entrenamiento.")
+    if not (models_dir / FILL_STATS_FILE).exists():
+        print(f"⚠️ No existe {models_dir / FILL_STATS_FILE}; apply_risk_boost usará medianas del lote.")
+
+
+def get_grd_norms() -> Dict[str, Any]:
+    """Tabla de normas GRD: {"columns", "table": {codigo: fila}, "norma": {codigo: días}}."""
+    global _grd_norms
+    if _grd_norms is None:
+        with _lock:
+            if _grd_norms is None:
+                _grd_norms = _load_grd_norms()
+    return _grd_norms
+
+
+def get_model() -> Tuple[Any, Dict[str, Any]]:
+    """Devuelve (modelo, info). Carga desde disco la primera vez o si el artefacto cambió."""
+    global _model, _model_info, _signature
+    if _model is None:
+        with _lock:
+            if _model is None:
+                _signature = _artifacts_signature()
+                _model, _model_info = _load_from_disk()
+    else:
+        _reload_if_changed()
+    return _model, dict(_model_info)
+
+
+def get_challenger() -> Tuple[Any, Dict[str, Any]] | None:
+    """Devuelve (modelo, info) del challenger, o None si ML_CHALLENGER no está definido."""
+    global _challenger
+    if _challenger is None:
+        path = resolve_challenger_path()
+        if path is None:
+            return None
+        with _lock:
+            if _challenger is None:
+                _challenger = _load_from_disk(path)
+    model, info = _challenger
+    return model, dict(info)
+
+
+def reload_model() -> Dict[str, Any]:
+    """Vuelve a leer el artefacto desde disco y notifica a los suscriptores.
+
+    El challenger, las estadísticas de relleno y la tabla GRD se vuelven a leer
+    en su próximo uso.
+    """
+    global _model, _model_info, _challenger, _fill_stats, _grd_norms, _signature
+    with _lock:
+        _signature = _artifacts_signature()
+        _model, _model_info = _load_from_disk()
+        _challenger = None
+        _fill_stats = None
+        _grd_norms = None
+        info = dict(_model_info)
+    for callback in list(_reload_callbacks):
+        callback(info)
+    return info
+
+
+def preload_models() -> Dict[str, Any]:
+    """Carga el modelo por adelantado (antes del fork de workers)."""
+    return get_model()[1]
+
+
+def on_reload(callback: Callable[[Dict[str, Any]], None]) -> None:
+    """Registra una función que se ejecuta tras cada `reload_model()`."""
+    _reload_callbacks.append(callback)
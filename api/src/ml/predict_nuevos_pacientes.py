@@ -3,21 +3,29 @@
 Predicción de exceso de estadía a partir de un CSV simplificado.
 
 Cada fila debe contener las columnas de FEATURE_COLUMNS. El script agrega
-`probabilidad_sobre_estadia` y `riesgo_categoria`, guarda/concatena en `output/`
-y elimina el CSV de entrada tras procesarlo.
+`probabilidad_sobre_estadia` y `riesgo_categoria`, guarda cada lote como un
+archivo nuevo en el almacén particionado `output/predicciones/` y elimina el
+CSV de entrada tras procesarlo.
 """
-from pathlib import Path
-MODELS_DIR = Path(__file__).resolve().parent / "models"
 import os
 import sys
-from typing import Dict
+from typing import Any, Dict, List
 
 import numpy as np
 import pandas as pd
-from joblib import load
 
 sys.path.append('src')
 
+from .model_registry import (  # noqa: E402,F401
+    MODELS_DIR,
+    get_fill_stats,
+    get_grd_norms,
+    get_model,
+    on_reload,
+    reload_model,
+)
+from .prediction_cache import PredictionCache, feature_cache_keys  # noqa: E402
+from .prediction_store import append_predictions, store_dir_for  # noqa: E402
 from .utils import (  # noqa: E402
     categorize_probabilities,
     standardize_col,
@@ -25,7 +33,7 @@ from .utils import (  # noqa: E402
 
 DEFAULT_INPUT = os.path.join("nuevos_pacientes", "pacientes.csv")
 OUTPUT_DIR = "output"
-DEFAULT_OUTPUT = os.path.join(OUTPUT_DIR, "predicciones.csv")
+DEFAULT_OUTPUT = os.path.join(OUTPUT_DIR, "predicciones")
 
 FEATURE_COLUMNS = [
     "edad",
@@ -38,6 +46,12 @@ FEATURE_COLUMNS = [
     "riesgo_administrativo",
     "codigo_grd",
 ]
+# Si falta (o viene vacía), se completa con la norma del codigo_grd (models/grd_norms.json)
+OPTIONAL_FEATURE_COLUMNS = {"fecha_estimada_de_alta"}
+
+# Caché de probabilidades crudas; se vacía cada vez que se recarga el modelo.
+PREDICTION_CACHE = PredictionCache()
+on_reload(lambda _info: PREDICTION_CACHE.clear())
 
 
 def predict_nuevos_pacientes(
@@ -46,20 +60,29 @@ def predict_nuevos_pacientes(
     records: list[dict] | None = None,
     persist: bool = True,
     return_json: bool = False,
+    use_cache: bool = False,
+    meta: Dict[str, Any] | None = None,
+    frame: pd.DataFrame | None = None,
 ):
     """Genera predicciones desde un CSV o desde una lista de dicts (para integración web).
 
     Args:
         input_path: Ruta al CSV (modo batch).
-        output_path: Ruta donde se guarda/apende el CSV de resultados.
+        output_path: Carpeta del almacén particionado de resultados (una ruta `.csv`
+            antigua se traduce a la carpeta homónima).
         records: Lista de dicts (modo API). Si se usa, `input_path` se ignora.
         persist: Si es False, no se escribe en disco y solo se devuelve el DataFrame.
         return_json: Si es True, la función devuelve una lista de dicts lista para JSON.
+        use_cache: Reutiliza probabilidades ya calculadas para features idénticas.
+        meta: Si se entrega un dict, se completa con metadatos de la ejecución
+            (versión del modelo y aciertos/fallos de caché).
+        frame: DataFrame ya armado (p. ej. desde un payload columnar). Tiene
+            prioridad sobre `records` e `input_path`.
     """
-    if persist:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    if records is not None:
+    if frame is not None:
+        original_df = frame
+        source_path = None
+    elif records is not None:
         original_df = pd.DataFrame(records)
         source_path = None
     else:
@@ -78,51 +101,26 @@ def predict_nuevos_pacientes(
         return None
 
     print(f"📥 Pacientes recibidos: {len(original_df)}")
-    standardized_df = original_df.copy()
-    standardized_df.columns = [standardize_col(col) for col in standardized_df.columns]
-    missing = [col for col in FEATURE_COLUMNS if col not in standardized_df.columns]
+    missing = missing_feature_columns(original_df.columns)
     if missing:
         print(f"❌ Faltan columnas necesarias en el CSV: {missing}")
         return None
 
     print("🔧 Preparando columnas para el modelo...")
-    features_df = build_feature_frame(standardized_df)
-
-    candidates = [
-   	MODELS_DIR / "model_hgb_calibrated.joblib",
-   	MODELS_DIR / "model_baseline.joblib",
-    	MODELS_DIR / "model_logistic_only.joblib",
-    ]
-
-    model_path = next((str(p) for p in candidates if p.exists()), None)
-    if not model_path:
-        raise FileNotFoundError(f"No se encontraron modelos en {MODELS_DIR}")
-
-    print(f"📦 Cargando modelo: {model_path}")
-    model = load(model_path)
-
     print("🔮 Calculando probabilidades...")
-    raw_probabilities = model.predict_proba(features_df)[:, 1]
-    probabilities = apply_risk_boost(raw_probabilities, features_df)
-    risk_labels = categorize_probabilities(probabilities)
-
-    result_df = original_df.copy()
-    result_df["probabilidad_sobre_estadia"] = probabilities
-    result_df["riesgo_categoria"] = risk_labels
-    appended_count = 0
+    result_df = score_dataframe(original_df, use_cache=use_cache, meta=meta)
+    probabilities = result_df["probabilidad_sobre_estadia"].to_numpy()
     if persist:
-        appended_count = save_predictions(result_df, output_path)
+        part_path = save_predictions(result_df, output_path)
         print(f"✅ Predicciones generadas ({len(result_df)} pacientes).")
-        if appended_count:
-            print(f"   ➕ Se agregaron {len(result_df)} filas a las {appended_count} ya existentes.")
-        print(f"💾 Archivo guardado en: {output_path}")
+        print(f"💾 Archivo guardado en: {part_path}")
     else:
         print(f"✅ Predicciones generadas ({len(result_df)} pacientes). (Modo sin persistencia)")
 
     print(f"   Probabilidad promedio: {probabilities.mean():.3f}")
     print(f"   Probabilidad máxima:   {probabilities.max():.3f}")
     print(f"   Probabilidad mínima:   {probabilities.min():.3f}")
-    if source_path and records is None:
+    if source_path:
         cleanup_input(source_path)
 
     if return_json:
@@ -130,15 +128,110 @@ def predict_nuevos_pacientes(
     return result_df
 
 
-def build_feature_frame(df: pd.DataFrame) -> pd.DataFrame:
-    """Devuelve un DataFrame solo con las columnas necesarias para el modelo."""
+def missing_feature_columns(columns) -> list[str]:
+    """Columnas de FEATURE_COLUMNS que faltan (comparando nombres estandarizados)."""
+    present = {standardize_col(col) for col in columns}
+    return [col for col in FEATURE_COLUMNS if col not in present and col not in OPTIONAL_FEATURE_COLUMNS]
+
+
+def score_dataframe(
+    original_df: pd.DataFrame,
+    use_cache: bool = False,
+    meta: Dict[str, Any] | None = None,
+) -> pd.DataFrame:
+    """Copia de `original_df` con `probabilidad_sobre_estadia` y `riesgo_categoria` agregadas.
+
+    Sin impresiones ni escritura a disco: pensado para usarse por bloques.
+    Lanza ValueError si faltan columnas de FEATURE_COLUMNS.
+    """
+    features_df = prepare_features(original_df)
+    probabilities = score_feature_frame(features_df, use_cache=use_cache, meta=meta)
+
+    result_df = original_df.copy()
+    result_df["probabilidad_sobre_estadia"] = probabilities
+    result_df["riesgo_categoria"] = categorize_probabilities(probabilities)
+    return result_df
+
+
+def prepare_features(original_df: pd.DataFrame) -> pd.DataFrame:
+    """FEATURE_COLUMNS listas para el modelo a partir de un DataFrame de entrada.
+
+    Lanza ValueError si faltan columnas.
+    """
+    missing = missing_feature_columns(original_df.columns)
+    if missing:
+        raise ValueError(f"Faltan columnas necesarias: {missing}")
+    standardized_df = original_df.copy()
+    standardized_df.columns = [standardize_col(col) for col in standardized_df.columns]
+    return build_feature_frame(standardized_df)
+
+
+def predict_raw_probabilities(
+    features_df: pd.DataFrame,
+    use_cache: bool = False,
+    meta: Dict[str, Any] | None = None,
+) -> np.ndarray:
+    """Probabilidad cruda del modelo (sin `apply_risk_boost`) para cada fila.
+
+    Con `use_cache=True` solo las filas sin acierto en PREDICTION_CACHE pasan por
+    `predict_proba`, en una única llamada.
+    """
+    model, info = get_model()
+    if meta is not None:
+        meta["model_version"] = info["version"]
+        meta["model_sha256"] = info["sha256"]
+
+    if not use_cache:
+        if meta is not None:
+            meta["cache"] = {"hits": 0, "misses": len(features_df), "enabled": False}
+        return model.predict_proba(features_df)[:, 1]
+
+    keys = feature_cache_keys(features_df, info["version"])
+    cached = PREDICTION_CACHE.get_many(keys)
+    miss_idx = [i for i, value in enumerate(cached) if value is None]
+    probabilities = np.array([np.nan if v is None else v for v in cached], dtype=float)
+    if miss_idx:
+        computed = model.predict_proba(features_df.iloc[miss_idx])[:, 1]
+        probabilities[miss_idx] = computed
+        PREDICTION_CACHE.set_many([keys[i] for i in miss_idx], computed)
+
+    if meta is not None:
+        meta["cache"] = {
+            "hits": len(keys) - len(miss_idx),
+            "misses": len(miss_idx),
+            "enabled": True,
+        }
+    return probabilities
+
+
+def score_feature_frame(
+    features_df: pd.DataFrame,
+    use_cache: bool = False,
+    meta: Dict[str, Any] | None = None,
+) -> np.ndarray:
+    """Probabilidad final (modelo + `apply_risk_boost`) para un DataFrame de FEATURE_COLUMNS."""
+    raw_probabilities = predict_raw_probabilities(features_df, use_cache=use_cache, meta=meta)
+    return np.asarray(apply_risk_boost(raw_probabilities, features_df), dtype=float)
+
+
+def build_feature_frame(df: pd.DataFrame, fill_norms: bool = True) -> pd.DataFrame:
+    """Devuelve un DataFrame solo con las columnas necesarias para el modelo.
+
+    Con `fill_norms=False` la `fecha_estimada_de_alta` faltante queda NaN (no se
+    completa con models/grd_norms.json).
+    """
     out = pd.DataFrame(index=df.index)
     out["edad"] = pd.to_numeric(df["edad"], errors="coerce")
     out["sexo"] = df["sexo"].fillna("Desconocido").astype(str).apply(normalize_sex)
     out["servicio_clinico"] = df["servicio_clinico"].fillna("Desconocido").astype(str)
     out["prevision"] = df["prevision"].fillna("Desconocido").astype(str)
-    out["fecha_estimada_de_alta"] = df["fecha_estimada_de_alta"].apply(parse_estancia_norma)
     out["codigo_grd"] = pd.to_numeric(df["codigo_grd"], errors="coerce")
+    if "fecha_estimada_de_alta" in df.columns:
+        out["fecha_estimada_de_alta"] = df["fecha_estimada_de_alta"].apply(parse_estancia_norma)
+    else:
+        out["fecha_estimada_de_alta"] = np.nan
+    if fill_norms:
+        out["fecha_estimada_de_alta"] = fill_estancia_norma(out["fecha_estimada_de_alta"], out["codigo_grd"])
     out["riesgo_social"] = encode_risk_series(df["riesgo_social"]).clip(0, 2)
     out["riesgo_clinico"] = encode_risk_series(df["riesgo_clinico"]).clip(0, 2)
     out["riesgo_administrativo"] = encode_risk_series(df["riesgo_administrativo"]).clip(0, 2)
@@ -158,16 +251,54 @@ def normalize_sex(value) -> str:
 
 
 def parse_estancia_norma(value):
-    """Convierte la 'fecha estimada de alta' en días de estancia normativa."""
+    """Convierte la 'fecha estimada de alta' en días de estancia normativa.
+
+    Solo acepta números; cualquier otro valor queda NaN y se completa con la
+    norma del GRD en `fill_estancia_norma`.
+    """
     if pd.isna(value):
         return np.nan
     number = pd.to_numeric(value, errors="coerce")
     if not pd.isna(number):
         return float(number)
-    try:
-        return pd.to_datetime(value, errors="coerce").day
-    except Exception:
-        return np.nan
+    return np.nan
+
+
+def fill_estancia_norma(dias: pd.Series, codigo_grd: pd.Series) -> pd.Series:
+    """Completa los días faltantes con la norma del codigo_grd (lookup en dict por fila).
+
+    Las filas que siguen sin días (sin tabla, o código fuera de ella) se avisan: el
+    modelo y `apply_risk_boost` las completan con la mediana de entrenamiento.
+    """
+    missing = dias.isna()
+    if not missing.any():
+        return dias
+    norma = get_grd_norms()["norma"]
+    if norma:
+        codes = codigo_grd[missing]
+        looked_up = [norma.get(int(code)) if not pd.isna(code) else None for code in codes]
+        dias = dias.fillna(pd.Series(looked_up, index=codes.index, dtype=float))
+    remaining = int(dias.isna().sum())
+    if remaining:
+        reason = "su codigo_grd no está en la tabla de normas" if norma else "no hay tabla de normas GRD"
+        print(f"⚠️ {remaining} fila(s) sin fecha_estimada_de_alta numérica y {reason}: "
+              f"se usará la mediana de entrenamiento.")
+    return dias
+
+
+def rows_without_estancia_norma(values, codigo_grd) -> List[int]:
+    """Posiciones sin fecha_estimada_de_alta numérica ni norma GRD para su codigo_grd.
+
+    Mismo criterio que `parse_estancia_norma` + `fill_estancia_norma`, vectorizado,
+    para rechazar la request antes de puntuar en vez de caer en la mediana.
+    """
+    dias = pd.to_numeric(pd.Series(list(values), dtype=object), errors="coerce")
+    missing = np.flatnonzero(dias.isna().to_numpy())
+    if not len(missing):
+        return []
+    norma = get_grd_norms()["norma"]
+    codes = pd.to_numeric(pd.Series(list(codigo_grd), dtype=object), errors="coerce").to_numpy()
+    return [int(i) for i in missing if pd.isna(codes[i]) or int(codes[i]) not in norma]
 
 
 def encode_risk_series(series: pd.Series) -> pd.Series:
@@ -206,21 +337,25 @@ def cleanup_input(input_path: str) -> None:
         print(f"⚠️ No se pudo eliminar {input_path}: {exc}")
 
 
-def save_predictions(df: pd.DataFrame, output_path: str) -> int:
-    """Guarda las predicciones, agregando filas si el archivo ya existe. Devuelve filas previas."""
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    if os.path.exists(output_path):
-        existing = pd.read_csv(output_path)
-        prev_rows = len(existing)
-        combined = pd.concat([existing, df], ignore_index=True, sort=False)
-        combined.to_csv(output_path, index=False)
-        return prev_rows
-    df.to_csv(output_path, index=False)
-    return 0
+def save_predictions(df: pd.DataFrame, output_path: str) -> str:
+    """Agrega el lote al almacén particionado sin reescribir el historial. Devuelve el archivo escrito."""
+    return append_predictions(df, store_dir_for(output_path))
 
 
-def apply_risk_boost(probabilities: np.ndarray, features: pd.DataFrame) -> np.ndarray:
-    """Ajusta las probabilidades usando los riesgos y los días permitidos."""
+def _fill_value(fill: Dict[str, float], features: pd.DataFrame, column: str) -> float:
+    if column in fill:
+        return fill[column]
+    return features[column].median()
+
+
+def risk_boost_components(features: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Ajustes aditivos (en probabilidad) que `apply_risk_boost` suma al modelo, por separado.
+
+    Los faltantes de `edad` y `fecha_estimada_de_alta` se rellenan con las medianas
+    de entrenamiento (`get_fill_stats()`), así cada fila se ajusta igual sin importar
+    el resto del lote. Solo si no hay artefacto se usa la mediana del lote.
+    """
+    fill = get_fill_stats()
     risk_sum = (
         features["riesgo_social"].fillna(1.0)
         + features["riesgo_clinico"].fillna(1.0)
@@ -229,9 +364,10 @@ def apply_risk_boost(probabilities: np.ndarray, features: pd.DataFrame) -> np.nd
     risk_norm = risk_sum / 6.0  # 0 = bajo, 1 = alto
 
     dias = features["fecha_estimada_de_alta"].clip(lower=0).fillna(
-        features["fecha_estimada_de_alta"].median()
+        _fill_value(fill, features, "fecha_estimada_de_alta")
     )
-    dias_shift = np.clip((5.0 - dias) / 10.0, -0.5, 0.5)
+    # Sin mediana de entrenamiento y sin días en todo el lote, el ajuste queda neutro
+    dias_shift = np.clip((5.0 - dias) / 10.0, -0.5, 0.5).fillna(0.0)
 
     risk_shift = (risk_norm - 0.5) * 0.2  # -0.1 a +0.1
     dias_shift = dias_shift * 0.2         # -0.1 a +0.1
@@ -240,9 +376,21 @@ def apply_risk_boost(probabilities: np.ndarray, features: pd.DataFrame) -> np.nd
     uci_boost = np.where(servicio.str.contains("uci"), 0.08, 0.0)
     prevision = features["prevision"].fillna("").str.lower()
     fonasa_boost = np.where(prevision.str.contains("fonasa"), 0.03, 0.0)
-    age_boost = np.clip((features["edad"].fillna(features["edad"].median()) - 70) / 50.0, 0, 0.08)
+    age_boost = np.clip((features["edad"].fillna(_fill_value(fill, features, "edad")) - 70) / 50.0, 0, 0.08).fillna(0.0)
+
+    return {
+        "riesgo": np.asarray(risk_shift, dtype=float),
+        "dias": np.asarray(dias_shift, dtype=float),
+        "uci": np.asarray(uci_boost, dtype=float),
+        "fonasa": np.asarray(fonasa_boost, dtype=float),
+        "edad": np.asarray(age_boost, dtype=float),
+    }
 
-    adjusted = probabilities + risk_shift + dias_shift + uci_boost + fonasa_boost + age_boost
+
+def apply_risk_boost(probabilities: np.ndarray, features: pd.DataFrame) -> np.ndarray:
+    """Ajusta las probabilidades usando los riesgos y los días permitidos."""
+    components = risk_boost_components(features)
+    adjusted = np.asarray(probabilities, dtype=float) + sum(components.values())
     return np.clip(adjusted, 0.0, 1.0)
 
 
@@ -276,7 +424,7 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Predicción de exceso de estadía desde un CSV simplificado.")
     parser.add_argument("--input", type=str, default=DEFAULT_INPUT, help="Ruta al CSV de pacientes nuevos.")
-    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Ruta para guardar las predicciones.")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Carpeta del almacén de predicciones.")
     parser.add_argument("--ejemplo", action="store_true", help="Crear un CSV de ejemplo con el nuevo formato.")
 
     args = parser.parse_args()
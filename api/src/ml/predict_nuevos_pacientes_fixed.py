@@ -13,7 +13,8 @@ from utils import (
     coerce_dtypes,
     standardize_col,
     categorize_probabilities,
-    align_columns_to_template
+    align_columns_to_template,
+    input_columns_for
 )
 from joblib import load
 
@@ -61,15 +62,21 @@ def predict_nuevos_pacientes_fixed():
         print(f"\n📦 Cargando modelo: {model_path}")
         model = load(model_path)
         
+        # Solo se leen las columnas que el modelo puede usar y las de unión:
+        # las planillas se recorren en streaming sin cargarlas completas
+        grd_id_candidates = ['episodio_cmbd', 'Episodio CMBD', 'episodio', 'id_episodio', 'ID']
+        score_id_candidates = ['episodio', 'buscar_episodio_con_asignacion_encuesta', 'id_episodio', 'ID']
+        input_columns = input_columns_for(create_complete_template().keys(), grd_id_candidates + score_id_candidates)
+        
         # Cargar datos GRD
         print(f"\n📊 Cargando datos GRD...")
-        df_grd = read_excel_or_csv(grd_file)
+        df_grd = read_excel_or_csv(grd_file, columns=input_columns)
         print(f"   - Registros GRD: {len(df_grd)}")
         print(f"   - Columnas GRD: {len(df_grd.columns)}")
         
         # Cargar datos Score
         print(f"\n📊 Cargando datos Score...")
-        df_score = read_excel_or_csv(score_file)
+        df_score = read_excel_or_csv(score_file, columns=input_columns)
         print(f"   - Registros Score: {len(df_score)}")
         print(f"   - Columnas Score: {len(df_score.columns)}")
         
@@ -77,7 +84,6 @@ def predict_nuevos_pacientes_fixed():
         print(f"\n🔗 BUSCANDO COLUMNAS DE UNIÓN...")
         
         # Buscar ID de episodio en GRD
-        grd_id_candidates = ['episodio_cmbd', 'Episodio CMBD', 'episodio', 'id_episodio', 'ID']
         grd_id_col = None
         for col in grd_id_candidates:
             if col in df_grd.columns:
@@ -92,7 +98,6 @@ def predict_nuevos_pacientes_fixed():
         print(f"   - ID GRD encontrado: '{grd_id_col}'")
         
         # Buscar ID de episodio en Score
-        score_id_candidates = ['episodio', 'buscar_episodio_con_asignacion_encuesta', 'id_episodio', 'ID']
         score_id_col = None
         for col in score_id_candidates:
             if col in df_score.columns:
@@ -0,0 +1,85 @@
+"""
+Caché LRU con expiración (TTL) para probabilidades del modelo.
+
+La llave de cada fila es un hash de los valores normalizados de FEATURE_COLUMNS
+más la versión del modelo, de modo que un cambio de artefacto nunca reutiliza
+resultados antiguos. Se guarda la probabilidad cruda del modelo (antes de
+`apply_risk_boost`), por lo que un acierto evita por completo `predict_proba`.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "50000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "900"))  # segundos
+
+
+class PredictionCache:
+    """LRU acotada por cantidad de entradas, con TTL por entrada. Segura entre hilos."""
+
+    def __init__(self, maxsize: int = PREDICTION_CACHE_SIZE, ttl: float = PREDICTION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[Hashable]) -> List[Optional[float]]:
+        now = time.monotonic()
+        out: List[Optional[float]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    out.append(None)
+                    continue
+                expires_at, value = entry
+                if expires_at < now:
+                    del self._data[key]
+                    out.append(None)
+                    continue
+                self._data.move_to_end(key)
+                out.append(value)
+        return out
+
+    def set_many(self, keys: List[Hashable], values) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._data[key] = (expires_at, float(value))
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+def feature_cache_keys(features: pd.DataFrame, model_version: str) -> List[tuple]:
+    """Llaves por fila: (versión del modelo, hash de las features normalizadas).
+
+    Las columnas numéricas se llevan a float64 y las categóricas a str para que
+    el mismo paciente produzca la misma llave sin importar el dtype del lote.
+    """
+    normalized = pd.DataFrame(index=features.index)
+    for col in features.columns:
+        series = features[col]
+        if pd.api.types.is_numeric_dtype(series):
+            normalized[col] = series.astype(np.float64)
+        else:
+            normalized[col] = series.astype(str)
+    hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+    return [(model_version, int(h)) for h in hashes]
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Almacén de predicciones particionado por día, solo de escritura al final.
+
+Estructura:
+    output/predicciones/
+        fecha=2025-01-31/part-093015123456-1a2b3c4d.csv
+        fecha=2025-01-31/part-101200000000-9f8e7d6c.csv
+        fecha=2025-02-01/compacted-...csv
+
+Cada lote de predicciones se escribe como un archivo `part-*.csv` nuevo, así
+que guardar N filas cuesta O(N) sin importar el historial. El lector recorre
+las particiones de forma perezosa (un DataFrame por archivo) y `compactar`
+junta los archivos de un día en uno solo.
+
+Uso:
+    python prediction_store.py compactar --dir output/predicciones
+    python prediction_store.py leer --dir output/predicciones --desde 2025-01-01
+    python prediction_store.py importar --dir output/predicciones --legacy output/predicciones.csv
+"""
+import os
+import re
+import uuid
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+PARTITION_PREFIX = "fecha="
+PART_SUFFIX = ".csv"
+_PARTITION_RE = re.compile(r"^fecha=(\d{4}-\d{2}-\d{2})$")
+
+
+def store_dir_for(output_path: str) -> str:
+    """Acepta la ruta antigua `output/predicciones.csv` y la traduce a `output/predicciones/`."""
+    if output_path.lower().endswith(".csv"):
+        return output_path[: -len(".csv")]
+    return output_path
+
+
+def _partition_dir(base_dir: str, day: date) -> str:
+    return os.path.join(base_dir, f"{PARTITION_PREFIX}{day.isoformat()}")
+
+
+def _write_atomic(df: pd.DataFrame, path: str) -> None:
+    """Escribe a un temporal y renombra, para que un lector nunca vea un archivo a medias."""
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def append_predictions(df: pd.DataFrame, base_dir: str, when: Optional[datetime] = None) -> str:
+    """Agrega un lote como un archivo nuevo en la partición del día. Devuelve la ruta escrita."""
+    when = when or datetime.now()
+    partition = _partition_dir(base_dir, when.date())
+    os.makedirs(partition, exist_ok=True)
+    name = f"part-{when.strftime('%H%M%S%f')}-{uuid.uuid4().hex[:8]}{PART_SUFFIX}"
+    path = os.path.join(partition, name)
+    _write_atomic(df, path)
+    return path
+
+
+def list_partitions(base_dir: str, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[str]:
+    """Particiones (ordenadas por fecha) dentro del rango [desde, hasta], fechas ISO."""
+    if not os.path.isdir(base_dir):
+        return []
+    out = []
+    for name in sorted(os.listdir(base_dir)):
+        match = _PARTITION_RE.match(name)
+        if not match:
+            continue
+        day = match.group(1)
+        if desde and day < desde:
+            continue
+        if hasta and day > hasta:
+            continue
+        out.append(os.path.join(base_dir, name))
+    return out
+
+
+def list_part_files(partition: str) -> List[str]:
+    return [
+        os.path.join(partition, name)
+        for name in sorted(os.listdir(partition))
+        if name.endswith(PART_SUFFIX)
+    ]
+
+
+def iter_predictions(
+    base_dir: str,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    chunksize: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """Recorre las predicciones archivo por archivo (o por bloques de `chunksize` filas).
+
+    Cada DataFrame trae una columna `fecha` con el día de su partición.
+    """
+    for partition in list_partitions(base_dir, desde, hasta):
+        day = os.path.basename(partition)[len(PARTITION_PREFIX):]
+        for path in list_part_files(partition):
+            usecols = (lambda c: c in columns) if columns else None
+            if chunksize:
+                chunks = pd.read_csv(path, usecols=usecols, chunksize=chunksize)
+            else:
+                chunks = [pd.read_csv(path, usecols=usecols)]
+            for chunk in chunks:
+                chunk["fecha"] = day
+                yield chunk
+
+
+def read_predictions(base_dir: str, desde: Optional[str] = None, hasta: Optional[str] = None,
+                     columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Carga en memoria las predicciones del rango pedido."""
+    frames = list(iter_predictions(base_dir, desde, hasta, columns))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def compact_partition(partition: str) -> int:
+    """Junta los archivos de una partición en uno solo. Devuelve cuántos archivos se reemplazaron."""
+    parts = list_part_files(partition)
+    if len(parts) <= 1:
+        return 0
+    combined = pd.concat((pd.read_csv(p) for p in parts), ignore_index=True, sort=False)
+    target = os.path.join(partition, f"compacted-{uuid.uuid4().hex[:8]}{PART_SUFFIX}")
+    _write_atomic(combined, target)
+    for path in parts:
+        os.remove(path)
+    return len(parts)
+
+
+def compact(base_dir: str, hasta: Optional[str] = None, incluir_hoy: bool = False) -> dict:
+    """Compacta las particiones hasta `hasta` (por defecto, todas menos la de hoy)."""
+    today = date.today().isoformat()
+    summary = {"partitions": 0, "files_replaced": 0}
+    for partition in list_partitions(base_dir, hasta=hasta):
+        if not incluir_hoy and partition.endswith(today):
+            continue
+        replaced = compact_partition(partition)
+        if replaced:
+            summary["partitions"] += 1
+            summary["files_replaced"] += replaced
+    return summary
+
+
+def import_legacy(csv_path: str, base_dir: str) -> Optional[str]:
+    """Mueve un `predicciones.csv` monolítico al almacén (partición según su fecha de modificación)."""
+    if not os.path.exists(csv_path):
+        return None
+    when = datetime.fromtimestamp(os.path.getmtime(csv_path))
+    path = append_predictions(pd.read_csv(csv_path), base_dir, when=when)
+    os.remove(csv_path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Almacén particionado de predicciones.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_compact = sub.add_parser("compactar", help="Junta los archivos de cada partición diaria.")
+    p_compact.add_argument("--dir", default=os.path.join("output", "predicciones"))
+    p_compact.add_argument("--hasta", default=None, help="Última fecha (YYYY-MM-DD) a compactar.")
+    p_compact.add_argument("--incluir-hoy", action="store_true", help="También compacta la partición de hoy.")
+
+    p_read = sub.add_parser("leer", help="Resume las predicciones del rango indicado.")
+    p_read.add_argument("--dir", default=os.path.join("output", "predicciones"))
+    p_read.add_argument("--desde", default=None)
+    p_read.add_argument("--hasta", default=None)
+
+    p_import = sub.add_parser("importar", help="Migra un predicciones.csv antiguo al almacén.")
+    p_import.add_argument("--dir", default=os.path.join("output", "predicciones"))
+    p_import.add_argument("--legacy", default=os.path.join("output", "predicciones.csv"))
+
+    args = parser.parse_args()
+    if args.comando == "compactar":
+        print(compact(args.dir, hasta=args.hasta, incluir_hoy=args.incluir_hoy))
+    elif args.comando == "leer":
+        total = 0
+        for frame in iter_predictions(args.dir, args.desde, args.hasta):
+            total += len(frame)
+        print(f"{total} predicciones en {len(list_partitions(args.dir, args.desde, args.hasta))} particiones")
+    elif args.comando == "importar":
+        path = import_legacy(args.legacy, args.dir)
+        print(f"Importado en {path}" if path else f"No existe {args.legacy}")
@@ -15,12 +15,62 @@ FEATURE_COLUMNS = [
 ]
 
 
-def make_dataset(config: dict):
+NUM_COLUMNS = [
+    "edad",
+    "fecha_estimada_de_alta",
+    "riesgo_social",
+    "riesgo_clinico",
+    "riesgo_administrativo",
+    "codigo_grd",
+]
+CAT_COLUMNS = ["sexo", "servicio_clinico", "prevision"]
+
+# Columnas de un snapshot de estadías (`dataset_from_snapshot`) además de FEATURE_COLUMNS
+SNAPSHOT_LABEL_COLUMNS = ["episodio", "fecha_ingreso", "estancia_dias"]
+
+GRD_NORM_COLUMNS = ["norma", "n_episodios", "estancia_media", "tasa_excede_norma", "descripcion"]
+
+SCORE_SUBSET_COLUMNS = ["total", "salud_mental", "gestion", "categorizacion_de_gestion"]
+
+
+def grd_read_columns(config: dict) -> list:
+    """Columnas del GRD que se leen: whitelist de features + las que usa make_dataset."""
+    cols = config["columns"]
+    required = [
+        cols["episode_id_grd"],
+        cols.get("fecha_ingreso"),
+        cols["estancia_norma"],
+        cols["estancia_dias"],
+        "edad_en_anos",
+        "sexo_desc_",
+        "servicio_ingreso_descripcion_",
+        "prevision_desc_",
+        "ir_grd_codigo_",
+        "ir_grd",  # descripción para grd_norms.json
+    ]
+    whitelist = config.get("feature_whitelist_grd") or []
+    return list(dict.fromkeys(c for c in [*required, *whitelist] if c))
+
+
+def score_read_columns(config: dict) -> list:
+    """Columnas del Score que se leen: candidatos a ID de episodio + subescalas de riesgo."""
+    return list(dict.fromkeys([*config["columns"]["episode_id_score_candidates"], *SCORE_SUBSET_COLUMNS]))
+
+
+def make_dataset(config: dict, grd_norms: dict | None = None, split_dates: dict | None = None):
+    """Arma train/test desde GRD + Score.
+
+    Si se entrega `grd_norms` (un dict), se completa con la tabla
+    codigo_grd → norma de `build_grd_norms`, calculada sobre el mismo GRD leído.
+    Si se entrega `split_dates` (un dict) y hay corte temporal, queda con las
+    fechas de ingreso de `"train"` y `"test"` (mismo índice que X_train/X_test).
+    """
     paths = config["paths"]
     cols = config["columns"]
 
-    grd = read_excel_or_csv(paths["grd_path"])
-    score = read_excel_or_csv(paths["score_path"])
+    # Solo las columnas necesarias: las planillas se leen en streaming y nunca completas
+    grd = read_excel_or_csv(paths["grd_path"], columns=grd_read_columns(config))
+    score = read_excel_or_csv(paths["score_path"], columns=score_read_columns(config))
 
     episode_grd = cols["episode_id_grd"]
     if episode_grd not in grd.columns:
@@ -48,16 +98,14 @@ def make_dataset(config: dict):
         if c and c not in grd.columns:
             raise ValueError(f"No encuentro '{c}' en GRD.")
 
-    score_subset_cols = {
-        "total",
-        "salud_mental",
-        "gestion",
-        "categorizacion_de_gestion",
-    }
+    score_subset_cols = SCORE_SUBSET_COLUMNS
     missing_score = [c for c in score_subset_cols if c not in score.columns]
     if missing_score:
         raise ValueError(f"Faltan columnas en Score: {missing_score}")
 
+    if grd_norms is not None:
+        grd_norms.update(build_grd_norms(grd, estancia_norma, estancia_dias))
+
     merge_cols = [c for c in required_grd if c]
     grd_sub = grd[merge_cols].copy()
     score_sub = score[[episode_score] + list(score_subset_cols)].copy()
@@ -73,21 +121,34 @@ def make_dataset(config: dict):
     df["excede_norma"] = (df[estancia_dias] > df[estancia_norma]).astype(int)
     y = df["excede_norma"].copy()
 
+    sample_weights = excess_sample_weights(df[estancia_dias], df[estancia_norma])
+
+    feat_df = build_simplified_features(df, estancia_norma)
+
+    fechas = None
+    if fecha_ing and fecha_ing in df.columns:
+        fechas = pd.to_datetime(df[fecha_ing], errors="coerce")
+    return split_train_test(feat_df, y, sample_weights, fechas, split_dates)
+
+
+def excess_sample_weights(estancia_dias: pd.Series, estancia_norma: pd.Series) -> pd.Series:
+    """Peso 1 + 0.05 por día de exceso sobre la norma, acotado a [1, 3]."""
     excess_days = (
-        pd.to_numeric(df[estancia_dias], errors="coerce")
-        - pd.to_numeric(df[estancia_norma], errors="coerce")
+        pd.to_numeric(estancia_dias, errors="coerce")
+        - pd.to_numeric(estancia_norma, errors="coerce")
     )
     excess_days = excess_days.clip(lower=0).fillna(0)
     base_weight = 1 + 0.05 * excess_days
     base_weight = base_weight.clip(lower=1.0, upper=3.0)
-    sample_weights = pd.Series(base_weight, index=df.index)
+    return pd.Series(base_weight, index=estancia_dias.index)
 
-    feat_df = build_simplified_features(df, estancia_norma)
 
+def split_train_test(feat_df: pd.DataFrame, y: pd.Series, sample_weights: pd.Series,
+                     fechas: pd.Series | None = None, split_dates: dict | None = None):
+    """Corte temporal (80% más antiguo para entrenar) si hay fechas; si no, aleatorio estratificado."""
     from sklearn.model_selection import train_test_split
 
-    if fecha_ing and fecha_ing in df.columns:
-        fechas = pd.to_datetime(df[fecha_ing], errors="coerce")
+    if fechas is not None:
         cutoff = fechas.quantile(0.8)
         train_idx = fechas <= cutoff
         test_idx = fechas > cutoff
@@ -97,6 +158,9 @@ def make_dataset(config: dict):
         y_test = y.loc[test_idx]
         w_train = sample_weights.loc[train_idx]
         w_test = sample_weights.loc[test_idx]
+        if split_dates is not None:
+            split_dates["train"] = fechas.loc[train_idx]
+            split_dates["test"] = fechas.loc[test_idx]
     else:
         X_train, X_test, y_train, y_test = train_test_split(
             feat_df, y, test_size=0.2, stratify=y, random_state=42
@@ -105,16 +169,105 @@ def make_dataset(config: dict):
             sample_weights, test_size=0.2, stratify=y, random_state=42
         )
 
-    num_cols = [
-        "edad",
-        "fecha_estimada_de_alta",
-        "riesgo_social",
-        "riesgo_clinico",
-        "riesgo_administrativo",
-        "codigo_grd",
-    ]
-    cat_cols = ["sexo", "servicio_clinico", "prevision"]
-    return X_train, X_test, y_train, y_test, num_cols, cat_cols, w_train, w_test
+    return X_train, X_test, y_train, y_test, list(NUM_COLUMNS), list(CAT_COLUMNS), w_train, w_test
+
+
+def dataset_from_snapshot(path: str, grd_norms: dict | None = None, split_dates: dict | None = None):
+    """Mismo resultado que `make_dataset`, pero desde un snapshot Parquet de estadías egresadas.
+
+    El snapshot (ver `ml/estadias_dataset.py`) trae FEATURE_COLUMNS sin completar
+    `fecha_estimada_de_alta` + SNAPSHOT_LABEL_COLUMNS. La norma faltante se
+    completa con la tabla codigo_grd → norma del mismo snapshot (que queda en
+    `grd_norms` si se entrega) y se descartan los episodios sin norma ni estancia.
+    """
+    df = pd.read_parquet(path)
+    norms = build_grd_norms(
+        pd.DataFrame({
+            "ir_grd_codigo_": df["codigo_grd"],
+            "estancia_norma_grd": df["fecha_estimada_de_alta"],
+            "estancia_dias": df["estancia_dias"],
+        }),
+        "estancia_norma_grd", "estancia_dias",
+    )
+    if grd_norms is not None:
+        grd_norms.update(norms)
+    norma_por_codigo = {float(code): row[0] for code, row in norms["table"].items()}
+    df["fecha_estimada_de_alta"] = df["fecha_estimada_de_alta"].fillna(df["codigo_grd"].map(norma_por_codigo))
+
+    df = df.dropna(subset=["fecha_estimada_de_alta", "estancia_dias"]).reset_index(drop=True)
+    if df.empty:
+        raise ValueError(f"El snapshot {path} no tiene episodios con norma y estancia.")
+    y = (df["estancia_dias"] > df["fecha_estimada_de_alta"]).astype(int).rename("excede_norma")
+    sample_weights = excess_sample_weights(df["estancia_dias"], df["fecha_estimada_de_alta"])
+    fechas = pd.to_datetime(df["fecha_ingreso"], errors="coerce")
+    if fechas.isna().all():
+        fechas = None
+    return split_train_test(df[FEATURE_COLUMNS].copy(), y, sample_weights, fechas, split_dates)
+
+
+def fit_preprocessor(prep, X: pd.DataFrame, data_key: str | None = None):
+    """(prep ajustado, X transformada).
+
+    Vive acá y no en train.py para que la caché joblib de `train --search` tenga
+    el mismo nombre en el proceso principal y en los workers. `data_key` es la
+    huella de X (`frame_fingerprint`): la caché usa esa llave en vez de hashear X.
+    """
+    Xt = prep.fit_transform(X)
+    return prep, Xt
+
+
+def frame_fingerprint(X: pd.DataFrame) -> str:
+    """Hash del contenido de un DataFrame (vectorizado, sin pickle)."""
+    import hashlib
+
+    digest = hashlib.sha256(pd.util.hash_pandas_object(X, index=True).to_numpy().tobytes())
+    digest.update(",".join(map(str, X.columns)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_grd_norms(grd: pd.DataFrame, estancia_norma_col: str, estancia_dias_col: str,
+                    descripcion_col: str = "ir_grd") -> dict:
+    """Tabla compacta codigo_grd → [norma, n_episodios, estancia_media, tasa_excede_norma, descripcion].
+
+    `norma` es la mediana de la estancia norma GRD del código (es la misma para
+    todo el código; la mediana solo absorbe errores de digitación).
+    """
+    frame = pd.DataFrame({
+        "codigo_grd": pd.to_numeric(grd["ir_grd_codigo_"], errors="coerce"),
+        "norma": pd.to_numeric(grd[estancia_norma_col], errors="coerce"),
+        "estancia": pd.to_numeric(grd[estancia_dias_col], errors="coerce"),
+    })
+    frame["excede"] = (frame["estancia"] > frame["norma"]).astype(float).where(
+        frame["estancia"].notna() & frame["norma"].notna()
+    )
+    if descripcion_col in grd.columns:
+        frame["descripcion"] = grd[descripcion_col].astype("string").str.strip()
+    else:
+        frame["descripcion"] = pd.NA
+    frame = frame.dropna(subset=["codigo_grd", "norma"])
+
+    stats = frame.groupby("codigo_grd").agg(
+        norma=("norma", "median"),
+        n_episodios=("norma", "size"),
+        estancia_media=("estancia", "mean"),
+        tasa_excede_norma=("excede", "mean"),
+        descripcion=("descripcion", "first"),
+    )
+
+    def _num(value, digits=4):
+        return None if pd.isna(value) else round(float(value), digits)
+
+    table = {
+        str(int(code)): [
+            _num(row.norma),
+            int(row.n_episodios),
+            _num(row.estancia_media, 2),
+            _num(row.tasa_excede_norma, 3),
+            None if pd.isna(row.descripcion) else str(row.descripcion),
+        ]
+        for code, row in stats.iterrows()
+    }
+    return {"columns": GRD_NORM_COLUMNS, "table": table}
 
 
 def build_simplified_features(df: pd.DataFrame, estancia_norma_col: str) -> pd.DataFrame:
@@ -139,14 +292,25 @@ def build_simplified_features(df: pd.DataFrame, estancia_norma_col: str) -> pd.D
     return features[FEATURE_COLUMNS].copy()
 
 
-def bucketize_series(series: pd.Series, default_value: float = 1.0) -> pd.Series:
+def bucket_thresholds(series: pd.Series):
+    """Cortes (q33, q66) de `bucketize_series`, o None si no hay valores."""
     valid = series.dropna()
     if valid.empty:
-        return pd.Series(default_value, index=series.index, dtype=float)
+        return None
     q1 = valid.quantile(0.33)
     q2 = valid.quantile(0.66)
     if q2 <= q1:
         q2 = q1 + 1e-6
+    return float(q1), float(q2)
+
+
+def bucketize_series(series: pd.Series, default_value: float = 1.0, thresholds=None) -> pd.Series:
+    """0/1/2 según terciles. Con `thresholds` fijos el resultado no depende del lote."""
+    if thresholds is None:
+        thresholds = bucket_thresholds(series)
+    if thresholds is None:
+        return pd.Series(default_value, index=series.index, dtype=float)
+    q1, q2 = thresholds
     out = pd.Series(default_value, index=series.index, dtype=float)
     out = out.where(~series.notna(), default_value)
     out.loc[series <= q1] = 0.0
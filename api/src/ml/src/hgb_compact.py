@@ -0,0 +1,110 @@
+"""
+Entrenamiento de HistGradientBoosting con todo el histórico en poca memoria.
+
+El preprocesamiento compacto deja cada feature como un código chico:
+
+- numéricas: mediana para faltantes + `KBinsDiscretizer` por cuantiles
+  (HGB_MAX_BINS cortes, los mismos que HGB usaría internamente);
+- categóricas: más frecuente para faltantes + `OrdinalEncoder`, con las
+  categorías raras (< HGB_MIN_FREQUENCY) agrupadas y las desconocidas como NaN.
+
+`encode_compact` transforma el DataFrame por bloques a una sola matriz float32
+(códigos < 256 por columna) que se entrega directo a HGB, sin pasar el
+DataFrame completo por el Pipeline. El modelo guardado sigue siendo
+Pipeline([("prep", ...), ("clf", HGB)]), así que la predicción no cambia.
+
+Actualización mensual (`warm_start_hgb`): se agregan árboles entrenados solo
+con los datos nuevos. HGB vuelve a calcular sus bins en cada `fit`; para que
+los árboles existentes se evalúen igual, cada ajuste incluye filas ancla con
+peso 0 que contienen todos los códigos posibles, y después se verifica que los
+cortes no hayan cambiado.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import KBinsDiscretizer, OrdinalEncoder
+
+HGB_MAX_BINS = 254
+HGB_MIN_FREQUENCY = 0.001
+ENCODE_CHUNK_SIZE = 100_000
+
+
+def build_compact_preprocessor(num_cols, cat_cols, random_state=42):
+    return ColumnTransformer([
+        ("num", Pipeline([
+            ("imp", SimpleImputer(strategy="median")),
+            ("bins", KBinsDiscretizer(n_bins=HGB_MAX_BINS, encode="ordinal", strategy="quantile",
+                                      subsample=200_000, random_state=random_state)),
+        ]), num_cols),
+        ("cat", Pipeline([
+            ("imp", SimpleImputer(strategy="most_frequent")),
+            ("ord", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=np.nan,
+                                   min_frequency=HGB_MIN_FREQUENCY, max_categories=HGB_MAX_BINS)),
+        ]), cat_cols),
+    ])
+
+
+def is_compact_preprocessor(prep) -> bool:
+    num = dict((name, trans) for name, trans, _ in prep.transformers_).get("num")
+    return isinstance(num, Pipeline) and "bins" in num.named_steps
+
+
+def code_counts(prep) -> list:
+    """Cantidad de códigos distintos que puede producir cada columna transformada."""
+    by_name = {name: trans for name, trans, _ in prep.transformers_}
+    counts = [int(n) for n in by_name["num"].named_steps["bins"].n_bins_]
+    ord_enc = by_name["cat"].named_steps["ord"]
+    infrequent = getattr(ord_enc, "infrequent_categories_", None) or [None] * len(ord_enc.categories_)
+    for categories, rare in zip(ord_enc.categories_, infrequent):
+        counts.append(len(categories) if rare is None else len(categories) - len(rare) + 1)
+    return counts
+
+
+def anchor_rows(prep) -> np.ndarray:
+    """Filas con todos los códigos de cada columna (se agregan con peso 0)."""
+    counts = code_counts(prep)
+    rows = np.arange(max(counts), dtype=np.float32)[:, None]
+    return np.minimum(rows, np.asarray(counts, dtype=np.float32) - 1)
+
+
+def encode_compact(prep, X: pd.DataFrame, extra_rows: np.ndarray | None = None,
+                   chunk_size: int = ENCODE_CHUNK_SIZE) -> np.ndarray:
+    """Matriz float32 (filas de X + `extra_rows`) con los códigos de `prep`, transformando por bloques."""
+    n_extra = 0 if extra_rows is None else len(extra_rows)
+    out = np.empty((len(X) + n_extra, len(code_counts(prep))), dtype=np.float32)
+    for start in range(0, len(X), chunk_size):
+        stop = min(start + chunk_size, len(X))
+        out[start:stop] = prep.transform(X.iloc[start:stop])
+    if n_extra:
+        out[len(X):] = extra_rows
+    return out
+
+
+def fit_hgb_compact(hgb, prep, X: pd.DataFrame, y, sample_weight) -> np.ndarray:
+    """Ajusta `hgb` sobre los códigos de X (+ anclas con peso 0). Devuelve la matriz usada."""
+    anchors = anchor_rows(prep)
+    codes = encode_compact(prep, X, extra_rows=anchors)
+    zeros = np.zeros(len(anchors))
+    y_all = np.concatenate([np.asarray(y), zeros.astype(np.asarray(y).dtype)])
+    w_all = np.concatenate([np.asarray(sample_weight, dtype=float), zeros])
+    hgb.fit(codes, y_all, sample_weight=w_all)
+    return codes
+
+
+def warm_start_hgb(hgb, prep, X: pd.DataFrame, y, sample_weight, n_new_trees: int):
+    """Agrega `n_new_trees` árboles entrenados con X (datos nuevos) a un HGB ya ajustado.
+
+    Lanza RuntimeError si los cortes de HGB cambiaron (los árboles anteriores se
+    habrían evaluado con otros bins); en ese caso hay que reentrenar completo.
+    """
+    previous = [np.asarray(t).copy() for t in hgb._bin_mapper.bin_thresholds_]
+    hgb.set_params(warm_start=True, early_stopping=False, max_iter=hgb.n_iter_ + n_new_trees)
+    fit_hgb_compact(hgb, prep, X, y, sample_weight)
+    current = hgb._bin_mapper.bin_thresholds_
+    if len(previous) != len(current) or any(
+        a.shape != b.shape or not np.allclose(a, b) for a, b in zip(previous, current)
+    ):
+        raise RuntimeError("Los bins de HGB cambiaron al actualizar; reentrena con `python -m src.train`.")
+    return hgb
@@ -1,4 +1,6 @@
-import argparse, json, yaml, os
+import argparse, json, yaml, os, time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -10,8 +12,10 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import HistGradientBoostingClassifier
 from sklearn.calibration import CalibratedClassifierCV, calibration_curve
 from sklearn.metrics import roc_auc_score, average_precision_score, brier_score_loss, RocCurveDisplay, PrecisionRecallDisplay
-from joblib import dump
-from .data_prep import make_dataset
+from sklearn.model_selection import ParameterGrid, ParameterSampler, TimeSeriesSplit
+from joblib import Memory, dump, load
+from .data_prep import dataset_from_snapshot, fit_preprocessor, frame_fingerprint, make_dataset
+from .hgb_compact import build_compact_preprocessor, fit_hgb_compact, is_compact_preprocessor, warm_start_hgb
 
 def ensure_dirs(d):
     os.makedirs(d, exist_ok=True)
@@ -46,34 +50,267 @@ def decile_lift(y_true, proba):
     out["decile"] = out["decile"].astype(int)
     return out
 
-def main(args):
-    with open(args.config, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
-    paths = config["paths"]
-    ensure_dirs(paths["model_dir"]); ensure_dirs(paths["reports_dir"]); ensure_dirs(paths["artifacts_dir"])
-
-    X_train, X_test, y_train, y_test, num_cols, cat_cols, w_train, w_test = make_dataset(config)
+FILL_STATS_FILE = "fill_stats.json"
+GRD_NORMS_FILE = "grd_norms.json"
+FILL_STATS_COLUMNS = ["edad", "fecha_estimada_de_alta"]
 
+def compute_fill_stats(X_train):
+    """Medianas de entrenamiento que usa apply_risk_boost para rellenar faltantes."""
+    stats = {}
+    for col in FILL_STATS_COLUMNS:
+        median = pd.to_numeric(X_train[col], errors="coerce").median()
+        if pd.notna(median):
+            stats[col] = float(median)
+    return {"medians": stats, "n_train": int(len(X_train))}
 
-    preproc_lr = ColumnTransformer([
+def build_preprocessor(family, num_cols, cat_cols):
+    """ColumnTransformer de cada familia: one-hot para la logística, ordinal para HGB."""
+    if family == "logistic":
+        encoder = ("ohe", OneHotEncoder(handle_unknown="ignore", sparse_output=False, min_frequency=0.01, dtype=np.float32))
+    else:
+        encoder = ("ord", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1))
+    return ColumnTransformer([
         ("num", SimpleImputer(strategy="median"), num_cols),
         ("cat", Pipeline([
             ("imp", SimpleImputer(strategy="most_frequent")),
-            ("ohe", OneHotEncoder(handle_unknown="ignore", sparse_output=False, min_frequency=0.01, dtype=np.float32))
+            encoder
         ]), cat_cols)
     ])
 
-    preproc_hgb = ColumnTransformer([
-        ("num", SimpleImputer(strategy="median"), num_cols),
-        ("cat", Pipeline([
-            ("imp", SimpleImputer(strategy="most_frequent")),
-            ("ord", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1))
-        ]), cat_cols)
-    ])
+def build_classifier(family, params=None):
+    """Clasificador con los parámetros por defecto del entrenamiento, sobrescritos por `params`."""
+    if family == "logistic":
+        base = dict(max_iter=500, class_weight="balanced", solver="saga", C=1.0, n_jobs=1)
+        return LogisticRegression(**{**base, **(params or {})})
+    base = dict(random_state=42, class_weight="balanced")
+    return HistGradientBoostingClassifier(**{**base, **(params or {})})
+
+# ---------- búsqueda de hiperparámetros (--search) ----------
+SEARCH_REPORT_FILE = "search_results.json"
+SEARCH_SPACES = {
+    "logistic": {"C": [0.01, 0.1, 1.0, 10.0]},
+    "hgb": {
+        "learning_rate": [0.05, 0.1],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": [20, 50],
+        "l2_regularization": [0.0, 1.0],
+    },
+}
+SEARCH_METRICS = {
+    "roc_auc": (roc_auc_score, True),
+    "pr_auc": (average_precision_score, True),
+    "brier": (brier_score_loss, False),
+}
+
+def search_candidates(mode, n_iter, random_state):
+    """(familia, params) a evaluar: grilla completa o `n_iter` muestras por familia."""
+    candidates = []
+    for family, space in SEARCH_SPACES.items():
+        if mode == "grid":
+            params_list = list(ParameterGrid(space))
+        else:
+            n_total = len(ParameterGrid(space))
+            params_list = list(ParameterSampler(space, n_iter=min(n_iter, n_total), random_state=random_state))
+        candidates += [(family, params) for params in params_list]
+    return candidates
+
+def time_split_folds(dates, n_rows, n_splits):
+    """Folds (train, validación) en orden temporal: cada fold valida sobre ingresos posteriores a su train.
+
+    Sin fechas (split aleatorio en make_dataset) se usa el orden de las filas.
+    """
+    order = np.arange(n_rows) if dates is None else np.argsort(dates.to_numpy(), kind="stable")
+    return [(order[tr], order[va]) for tr, va in TimeSeriesSplit(n_splits=n_splits).split(order)]
+
+def _cached_fit_preprocessor(cache_dir):
+    # La llave es (preprocesador, huella de X): hashear X con pickle costaría más que ajustarlo
+    return Memory(cache_dir, mmap_mode="r", verbose=0).cache(fit_preprocessor, ignore=["X"])
+
+_search_state = {}
+
+def _init_search_worker(X, y, w, folds, fold_keys, num_cols, cat_cols, cache_dir):
+    # Un hilo por proceso: el paralelismo lo da el pool, no OpenMP
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    _search_state.update(X=X, y=y, w=w, folds=folds, fold_keys=fold_keys, num_cols=num_cols,
+                         cat_cols=cat_cols, fit_prep=_cached_fit_preprocessor(cache_dir))
+
+def _evaluate_candidate(family, params):
+    st = _search_state
+    X, y, w = st["X"], st["y"], st["w"]
+    scores = {name: [] for name in SEARCH_METRICS}
+    prep_seconds = fit_seconds = 0.0
+    for (tr, va), key in zip(st["folds"], st["fold_keys"]):
+        t0 = time.perf_counter()
+        prep, Xt = st["fit_prep"](build_preprocessor(family, st["num_cols"], st["cat_cols"]), X.iloc[tr], key)
+        t1 = time.perf_counter()
+        clf = build_classifier(family, params)
+        clf.fit(Xt, y[tr], sample_weight=w[tr])
+        proba = clf.predict_proba(prep.transform(X.iloc[va]))[:, 1]
+        t2 = time.perf_counter()
+        prep_seconds += t1 - t0
+        fit_seconds += t2 - t1
+        for name, (fn, _) in SEARCH_METRICS.items():
+            scores[name].append(float(fn(y[va], proba)))
+    return {
+        "family": family,
+        "params": params,
+        "scores": {name: round(float(np.mean(v)), 5) for name, v in scores.items()},
+        "scores_std": {name: round(float(np.std(v)), 5) for name, v in scores.items()},
+        "prep_seconds": round(prep_seconds, 3),
+        "fit_seconds": round(fit_seconds, 3),
+    }
+
+def run_search(args, config, X_train, y_train, w_train, num_cols, cat_cols, train_dates):
+    """CV temporal sobre ambas familias en un pool de procesos. Devuelve el reporte con el mejor de cada una."""
+    paths = config["paths"]
+    cache_dir = args.cache_dir or os.path.join(paths["artifacts_dir"], "prep_cache")
+    X = X_train.reset_index(drop=True)
+    y = np.asarray(y_train)
+    w = np.asarray(getattr(w_train, "values", w_train), dtype=float)
+    dates = train_dates.reset_index(drop=True) if train_dates is not None else None
+    folds = time_split_folds(dates, len(X), args.cv_splits)
+    candidates = search_candidates(args.search, args.n_iter, config["training"]["random_state"])
+    metric = args.search_metric
+    higher_is_better = SEARCH_METRICS[metric][1]
+    print(f"Búsqueda {args.search}: {len(candidates)} candidatos x {len(folds)} folds temporales, "
+          f"{args.search_jobs} procesos (caché de preprocesamiento en {cache_dir}).")
+
+    # Preprocesamiento de cada familia y fold una sola vez, antes de repartir candidatos
+    started = time.perf_counter()
+    fold_keys = [frame_fingerprint(X.iloc[tr]) for tr, _ in folds]
+    fit_prep = _cached_fit_preprocessor(cache_dir)
+    for family in SEARCH_SPACES:
+        for (tr, _), key in zip(folds, fold_keys):
+            fit_prep(build_preprocessor(family, num_cols, cat_cols), X.iloc[tr], key)
+    warm_seconds = time.perf_counter() - started
+
+    initargs = (X, y, w, folds, fold_keys, num_cols, cat_cols, cache_dir)
+    if args.search_jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.search_jobs, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_search_worker, initargs=initargs) as pool:
+            results = list(pool.map(_evaluate_candidate, *zip(*candidates)))
+    else:
+        _init_search_worker(*initargs)
+        results = [_evaluate_candidate(family, params) for family, params in candidates]
+    elapsed = time.perf_counter() - started
+
+    sign = 1 if higher_is_better else -1
+    results.sort(key=lambda r: (r["family"], -sign * r["scores"][metric]))
+    best = {}
+    for r in results:
+        best.setdefault(r["family"], {"params": r["params"], "cv_mean": r["scores"][metric]})
 
+    print(f"{'familia':9s} {metric:>8s} {'±':>7s} {'prep s':>7s} {'fit s':>7s}  parámetros")
+    for r in results:
+        print(f"{r['family']:9s} {r['scores'][metric]:8.4f} {r['scores_std'][metric]:7.4f} "
+              f"{r['prep_seconds']:7.2f} {r['fit_seconds']:7.2f}  {r['params']}")
+    for family, b in best.items():
+        print(f"Mejor {family}: {b['params']} ({metric} CV {b['cv_mean']:.4f})")
+    print(f"Búsqueda completada en {elapsed:.1f} s (preprocesamiento inicial {warm_seconds:.1f} s).")
+
+    return {
+        "mode": args.search,
+        "metric": metric,
+        "cv_splits": len(folds),
+        "jobs": args.search_jobs,
+        "elapsed_seconds": round(elapsed, 3),
+        "prep_warmup_seconds": round(warm_seconds, 3),
+        "best": best,
+        "candidates": results,
+    }
+
+HGB_UPDATE_REPORT_FILE = "hgb_update.json"
+
+def load_dataset(args, config, grd_norms=None, split_dates=None):
+    """GRD + Score de config (`make_dataset`) o, con --snapshot, un snapshot Parquet de estadías."""
+    if getattr(args, "snapshot", None):
+        print(f"Datos desde snapshot de estadías: {args.snapshot}")
+        return dataset_from_snapshot(args.snapshot, grd_norms=grd_norms, split_dates=split_dates)
+    return make_dataset(config, grd_norms=grd_norms, split_dates=split_dates)
+
+
+def update_hgb(args, config):
+    """Actualización mensual: agrega árboles entrenados con los datos de `config` (solo el mes nuevo)
+    al modelo compacto guardado y recalibra con el 15% más reciente."""
+    paths = config["paths"]
+    model_path = os.path.join(paths["model_dir"], "model_hgb_calibrated.joblib")
+    hgb_cal = load(model_path)
+    pipe = hgb_cal.calibrated_classifiers_[0].estimator
+    prep, hgb = pipe.named_steps["prep"], pipe.named_steps["clf"]
+    if not is_compact_preprocessor(prep):
+        raise SystemExit("--update requiere un modelo entrenado con todo el histórico (sin --hgb-sample-size).")
+
+    split_dates = {}
+    X_train, X_test, y_train, y_test, _, _, w_train, w_test = load_dataset(args, config, split_dates=split_dates)
+    X = pd.concat([X_train, X_test]).reset_index(drop=True)
+    y = np.concatenate([np.asarray(y_train), np.asarray(y_test)])
+    w = np.concatenate([np.asarray(w_train, dtype=float), np.asarray(w_test, dtype=float)])
+    if split_dates:
+        dates = pd.concat([split_dates["train"], split_dates["test"]]).to_numpy()
+        order = np.argsort(dates, kind="stable")
+    else:
+        order = np.arange(len(X))
+    n_cal = max(1, int(len(X) * 0.15))
+    fit_idx, cal_idx = order[:-n_cal], order[-n_cal:]
+    X_cal, y_cal, w_cal = X.iloc[cal_idx], y[cal_idx], w[cal_idx]
+
+    started = time.perf_counter()
+    auc_before = float(roc_auc_score(y_cal, hgb_cal.predict_proba(X_cal)[:, 1]))
+    trees_before = int(hgb.n_iter_)
+    print(f"Actualizando HGB ({trees_before} árboles) con {len(fit_idx)} episodios nuevos "
+          f"(+{args.update_trees} árboles; recalibración con {len(cal_idx)}).")
+    warm_start_hgb(hgb, prep, X.iloc[fit_idx], y[fit_idx], w[fit_idx], args.update_trees)
+    new_cal = CalibratedClassifierCV(pipe, method="sigmoid", cv="prefit", ensemble=False)
+    new_cal.fit(X_cal, y_cal, sample_weight=w_cal)
+    proba = new_cal.predict_proba(X_cal)[:, 1]
+    report = {
+        "rows": int(len(X)),
+        "trees_before": trees_before,
+        "trees_after": int(hgb.n_iter_),
+        "roc_auc_before": auc_before,
+        "roc_auc_after": float(roc_auc_score(y_cal, proba)),
+        "brier_after": float(brier_score_loss(y_cal, proba)),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    dump(new_cal, model_path)
+    ensure_dirs(paths["reports_dir"])
+    with open(os.path.join(paths["reports_dir"], HGB_UPDATE_REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"ROC-AUC en los episodios más recientes: {report['roc_auc_before']:.4f} -> {report['roc_auc_after']:.4f}")
+    print("Modelo actualizado en", model_path)
+
+def main(args, config=None):
+    if config is None:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+    paths = config["paths"]
+    ensure_dirs(paths["model_dir"]); ensure_dirs(paths["reports_dir"]); ensure_dirs(paths["artifacts_dir"])
+
+    grd_norms = {}
+    split_dates = {}
+    X_train, X_test, y_train, y_test, num_cols, cat_cols, w_train, w_test = load_dataset(
+        args, config, grd_norms=grd_norms, split_dates=split_dates)
+    with open(os.path.join(paths["model_dir"], GRD_NORMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(grd_norms, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"Tabla de normas GRD: {len(grd_norms['table'])} códigos.")
+
+
+    preproc_lr = build_preprocessor("logistic", num_cols, cat_cols)
+    preproc_hgb = build_preprocessor("hgb", num_cols, cat_cols)
+
+    lr_params, hgb_params = {}, {}
+    search_report = None
+    if args.search:
+        search_report = run_search(args, config, X_train, y_train, w_train, num_cols, cat_cols,
+                                   split_dates.get("train"))
+        lr_params = search_report["best"]["logistic"]["params"]
+        hgb_params = search_report["best"]["hgb"]["params"]
+        with open(os.path.join(paths["reports_dir"], SEARCH_REPORT_FILE), "w", encoding="utf-8") as f:
+            json.dump(search_report, f, indent=2)
 
     print("Entrenando modelo base (logistic)...")
-    lr = LogisticRegression(max_iter=500, class_weight="balanced", solver="saga", C=1.0, n_jobs=1)
+    lr = build_classifier("logistic", lr_params)
     lr_pipe = Pipeline([("prep", preproc_lr), ("clf", lr)])
     lr_sample_weight = getattr(w_train, "values", w_train)
     lr_pipe.fit(X_train, y_train, clf__sample_weight=lr_sample_weight)
@@ -85,6 +322,8 @@ def main(args):
         "brier": float(brier_score_loss(y_test, lr_proba))
     }
     dump(lr_pipe, os.path.join(paths["model_dir"], "model_baseline.joblib"))
+    with open(os.path.join(paths["model_dir"], FILL_STATS_FILE), "w", encoding="utf-8") as f:
+        json.dump(compute_fill_stats(X_train), f, indent=2)
 
  
     X_train_reset = X_train.reset_index(drop=True)
@@ -104,21 +343,32 @@ def main(args):
     y_core = y_train_reset.loc[~cal_mask]
     w_core = w_train_reset.loc[~cal_mask]
 
-    hgb_sample_size = min(20000, len(X_core))
-    if hgb_sample_size < len(X_core):
-        core_idx = rng.choice(X_core.index, size=hgb_sample_size, replace=False)
-        X_core_fit = X_core.loc[core_idx]
-        y_core_fit = y_core.loc[core_idx]
-        w_core_fit = w_core.loc[core_idx]
+    if args.hgb_sample_size:
+        hgb_sample_size = min(args.hgb_sample_size, len(X_core))
+        if hgb_sample_size < len(X_core):
+            core_idx = rng.choice(X_core.index, size=hgb_sample_size, replace=False)
+            X_core_fit = X_core.loc[core_idx]
+            y_core_fit = y_core.loc[core_idx]
+            w_core_fit = w_core.loc[core_idx]
+        else:
+            X_core_fit = X_core
+            y_core_fit = y_core
+            w_core_fit = w_core
+
+        print(f"Entrenando HistGradientBoosting con {len(X_core_fit)} muestras (calibración con {len(X_cal)}).")
+        hgb = build_classifier("hgb", hgb_params)
+        hgb_pipe = Pipeline([("prep", preproc_hgb), ("clf", hgb)])
+        hgb_pipe.fit(X_core_fit, y_core_fit, clf__sample_weight=w_core_fit.values)
     else:
-        X_core_fit = X_core
-        y_core_fit = y_core
-        w_core_fit = w_core
-
-    print(f"Entrenando HistGradientBoosting con {len(X_core_fit)} muestras (calibración con {len(X_cal)}).")
-    hgb = HistGradientBoostingClassifier(random_state=42, class_weight="balanced")
-    hgb_pipe = Pipeline([("prep", preproc_hgb), ("clf", hgb)])
-    hgb_pipe.fit(X_core_fit, y_core_fit, clf__sample_weight=w_core_fit.values)
+        # Todo el histórico: se codifica una vez a una matriz float32 de códigos y HGB la recibe directo
+        print(f"Entrenando HistGradientBoosting con todas las muestras ({len(X_core)}; calibración con {len(X_cal)}).")
+        preproc_compact = build_compact_preprocessor(num_cols, cat_cols, config["training"]["random_state"])
+        preproc_compact.fit(X_core)
+        hgb = build_classifier("hgb", {"early_stopping": False, **hgb_params})
+        codes = fit_hgb_compact(hgb, preproc_compact, X_core, y_core, w_core.values)
+        print(f"Matriz compacta: {codes.shape[0]} x {codes.shape[1]} float32 ({codes.nbytes / 1e6:.1f} MB).")
+        del codes
+        hgb_pipe = Pipeline([("prep", preproc_compact), ("clf", hgb)])
     hgb_cal = CalibratedClassifierCV(hgb_pipe, method="sigmoid", cv="prefit", ensemble=False)
     hgb_cal.fit(X_cal, y_cal, sample_weight=w_cal.values)
     print("Calibración completada.")
@@ -138,6 +388,11 @@ def main(args):
     dec.to_csv(os.path.join(paths["reports_dir"], "deciles_lift.csv"), index=False)
 
     metrics = {"baseline_logistic": lr_metrics, "hgb_calibrated": hgb_metrics}
+    if search_report is not None:
+        metrics["search"] = {
+            family: {"params": best["params"], f"cv_{search_report['metric']}": best["cv_mean"]}
+            for family, best in search_report["best"].items()
+        }
     with open(os.path.join(paths["reports_dir"], "metrics.json"), "w", encoding="utf-8") as f:
         json.dump(metrics, f, indent=2)
 
@@ -148,8 +403,31 @@ def main(args):
 
     print("Entrenamiento completado. Revisa la carpeta 'reports' y 'models'.")
 
-if __name__ == "__main__":
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", type=str, default="config.yaml")
-    args = parser.parse_args()
-    main(args)
+    parser.add_argument("--snapshot", type=str, default=None,
+                        help="Entrenar desde un snapshot Parquet de estadías (src.ml.estadias_dataset) en vez de GRD/Score.")
+    parser.add_argument("--search", choices=["grid", "random"], default=None,
+                        help="Búsqueda de hiperparámetros (CV temporal) antes de entrenar.")
+    parser.add_argument("--n-iter", type=int, default=8, help="Candidatos por familia con --search random.")
+    parser.add_argument("--cv-splits", type=int, default=3, help="Folds de la CV temporal.")
+    parser.add_argument("--search-jobs", type=int, default=os.cpu_count() or 1, help="Procesos de la búsqueda.")
+    parser.add_argument("--search-metric", choices=sorted(SEARCH_METRICS), default="roc_auc")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Caché joblib del preprocesamiento (default: <artifacts_dir>/prep_cache).")
+    parser.add_argument("--hgb-sample-size", type=int, default=None,
+                        help="Entrenar HGB con una muestra de este tamaño (camino anterior) en vez de todo el histórico.")
+    parser.add_argument("--update", action="store_true",
+                        help="Actualizar model_hgb_calibrated con los datos de config (mes nuevo) en vez de reentrenar.")
+    parser.add_argument("--update-trees", type=int, default=20, help="Árboles que agrega --update.")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    if args.update:
+        with open(args.config, "r", encoding="utf-8") as f:
+            update_hgb(args, yaml.safe_load(f))
+    else:
+        main(args)
@@ -1,3 +1,5 @@
+import hashlib
+import os
 import re
 import unicodedata
 import pandas as pd
@@ -14,14 +16,229 @@ def standardize_col(name: str) -> str:
     s = re.sub(r"\s+", "_", s)
     return s
 
-def read_excel_or_csv(path: str) -> pd.DataFrame:
+# Única copia de la lectura con caché y por bloques: ml/utils.py la re-exporta.
+# Caché Parquet de planillas Excel: <carpeta del archivo>/.parquet_cache/<nombre>.<sha256[:16]>.parquet
+# (con `columns`, la proyección se guarda aparte: <nombre>.<sha256[:16]>-<firma columnas>.parquet)
+PARQUET_CACHE_DIRNAME = ".parquet_cache"
+PARQUET_CACHE_ENABLED = os.getenv("ML_PARQUET_CACHE", "1") != "0"
+DEFAULT_CHUNKSIZE = int(os.getenv("ML_READ_CHUNKSIZE", "50000"))
+
+def read_excel_or_csv(path: str, use_cache: bool = True, columns=None) -> pd.DataFrame:
+    """Lee un CSV o Excel con columnas estandarizadas.
+
+    Los Excel se convierten una vez a Parquet (clave: hash del contenido) y las
+    lecturas siguientes mapean ese Parquet en memoria en vez de volver a parsear
+    con openpyxl. Si el archivo cambia, cambia el hash y se regenera.
+    ML_PARQUET_CACHE=0 desactiva la caché.
+
+    Con `columns` (nombres ya estandarizados) solo se cargan esas columnas; las
+    que no existan en el archivo se ignoran. El nombre debe calzar exacto: para
+    aceptar también la variante con/sin `_` final, `with_underscore_variants`. El Excel se recorre en streaming
+    (`iter_table_chunks`), así que la memoria depende de las columnas pedidas y
+    no del tamaño de la planilla.
+    """
+    if columns is not None:
+        return _read_columns(path, list(dict.fromkeys(columns)), use_cache)
     if path.lower().endswith(".csv"):
         df = pd.read_csv(path)
+        df.columns = [standardize_col(c) for c in df.columns]
+        return df
+    if not (use_cache and PARQUET_CACHE_ENABLED):
+        return _read_excel_standardized(path)
+
+    cache_path = parquet_cache_path(path)
+    df = _read_parquet_cache(cache_path)
+    if df is not None:
+        return df
+
+    df = _read_excel_standardized(path)
+    _write_parquet_cache(df, cache_path)
+    return df
+
+def _read_columns(path: str, columns, use_cache: bool) -> pd.DataFrame:
+    cached = use_cache and PARQUET_CACHE_ENABLED and not path.lower().endswith(".csv")
+    if cached:
+        # Una caché completa ya existente sirve para cualquier proyección
+        full_path = parquet_cache_path(path)
+        if os.path.exists(full_path):
+            df = _read_parquet_cache(full_path, columns)
+            if df is not None:
+                return df
+        cache_path = parquet_cache_path(path, columns)
+        df = _read_parquet_cache(cache_path)
+        if df is not None:
+            return df
+
+    chunks = list(iter_table_chunks(path, columns=columns))
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    if cached:
+        _write_parquet_cache(df, cache_path)
+    return df
+
+def iter_table_chunks(path: str, columns=None, chunksize: int = DEFAULT_CHUNKSIZE):
+    """Itera un CSV o Excel en DataFrames de hasta `chunksize` filas con columnas estandarizadas.
+
+    `columns` (nombres estandarizados) restringe las columnas leídas; siempre se
+    produce al menos un DataFrame (vacío si el archivo no tiene filas).
+    """
+    if path.lower().endswith(".csv"):
+        wanted = set(columns) if columns is not None else None
+        usecols = (lambda c: standardize_col(c) in wanted) if wanted is not None else None
+        empty = True
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+            chunk.columns = [standardize_col(c) for c in chunk.columns]
+            empty = False
+            yield chunk
+        if empty:
+            header = pd.read_csv(path, usecols=usecols, nrows=0)
+            yield header.rename(columns=standardize_col)
     else:
-        df = pd.read_excel(path)
+        yield from iter_excel_chunks(path, columns=columns, chunksize=chunksize)
+
+def iter_excel_chunks(path: str, columns=None, chunksize: int = DEFAULT_CHUNKSIZE, sheet=None):
+    """Lee la primera hoja (o `sheet`) de un .xlsx en modo read-only, por bloques de filas.
+
+    openpyxl en modo normal arma el libro completo en memoria (varias veces el
+    tamaño del archivo); en read-only las filas se parsean del XML a medida que
+    se recorren, y acá solo se conservan las columnas pedidas.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet is not None else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = [standardize_col(c) if c is not None else f"unnamed_{i}"
+                  for i, c in enumerate(next(rows, ()))]
+        if columns is None:
+            keep = list(range(len(header)))
+        else:
+            wanted = set(columns)
+            seen = set()
+            keep = []
+            for i, name in enumerate(header):
+                if name in wanted and name not in seen:
+                    keep.append(i)
+                    seen.add(name)
+        names = [header[i] for i in keep]
+        width = len(header)
+
+        block = []
+        emitted = False
+        for row in rows:
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            if all(v is None for v in row):
+                continue  # pandas.read_excel también descarta filas vacías
+            block.append([row[i] for i in keep])
+            if len(block) >= chunksize:
+                yield _frame_from_rows(block, names)
+                emitted = True
+                block = []
+        if block or not emitted:
+            yield _frame_from_rows(block, names)
+    finally:
+        wb.close()
+
+def _frame_from_rows(rows, names) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(rows, columns=names)
+    return df.infer_objects()
+
+def _read_excel_standardized(path: str) -> pd.DataFrame:
+    df = pd.read_excel(path)
     df.columns = [standardize_col(c) for c in df.columns]
     return df
 
+def _read_parquet_cache(cache_path: str, columns=None):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+
+        if columns is not None:
+            present = set(pq.read_schema(cache_path).names)
+            columns = [c for c in columns if c in present]
+        return pq.read_table(cache_path, columns=columns, memory_map=True).to_pandas()
+    except Exception as exc:
+        print(f"⚠️ Caché Parquet ilegible ({cache_path}), se regenera: {exc}")
+        return None
+
+def load_column_whitelist(config_path: str = "config.yaml", key: str = "feature_whitelist_grd"):
+    """Lista de columnas de `config.yaml` (None si no hay config o no define la clave)."""
+    if not os.path.exists(config_path):
+        return None
+    import yaml
+
+    with open(config_path, "r", encoding="utf-8") as fh:
+        config = yaml.safe_load(fh) or {}
+    values = config.get(key)
+    return list(values) if values else None
+
+def input_columns_for(template_columns, extra=(), config_path: str = "config.yaml"):
+    """Columnas a leer de las planillas de pacientes nuevos: las del template del
+    modelo, la whitelist de `config.yaml` y `extra` (p. ej. IDs de unión)."""
+    whitelist = load_column_whitelist(config_path) or []
+    return with_underscore_variants(standardize_col(c) for c in [*template_columns, *whitelist, *extra])
+
+def with_underscore_variants(columns):
+    """Cada nombre con y sin `_` final: `align_columns_to_template` los trata como la
+    misma columna ("IR GRD Código" → `ir_grd_codigo` calza con `ir_grd_codigo_`), así
+    que el filtro de lectura también debe aceptar ambos."""
+    out = []
+    for c in columns:
+        out += [c, c[:-1] if c.endswith("_") else f"{c}_"]
+    return list(dict.fromkeys(out))
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def parquet_cache_path(path: str, columns=None) -> str:
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), PARQUET_CACHE_DIRNAME)
+    key = file_sha256(path)[:16]
+    if columns is not None:
+        signature = hashlib.sha256("\x1f".join(sorted(columns)).encode("utf-8")).hexdigest()[:8]
+        key = f"{key}-{signature}"
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{key}.parquet")
+
+def arrow_safe_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas object con tipos mezclados (p. ej. números y texto en una misma columna
+    de Excel) pasan a texto, conservando los nulos; Parquet exige un tipo por columna."""
+    out = df
+    for col in df.columns[df.dtypes == object]:
+        kind = pd.api.types.infer_dtype(df[col], skipna=True)
+        if kind in ("mixed", "mixed-integer"):
+            if out is df:
+                out = df.copy()
+            values = df[col]
+            out[col] = values.where(values.isna(), values.astype(str))
+    return out
+
+def _write_parquet_cache(df: pd.DataFrame, cache_path: str) -> None:
+    """Escribe la caché (archivo temporal + rename) y borra las de versiones anteriores del archivo."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        cache_dir = os.path.dirname(cache_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        table = pa.Table.from_pandas(arrow_safe_frame(df), preserve_index=False)
+        tmp_path = f"{cache_path}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, cache_path)
+        source_name, key = os.path.basename(cache_path).rsplit(".", 2)[:2]
+        pattern = re.compile(re.escape(source_name) + r"\.([0-9a-f]{16})(-[0-9a-f]{8})?\.parquet")
+        for name in os.listdir(cache_dir):
+            match = pattern.fullmatch(name)
+            # Solo se borran cachés de otro contenido; las proyecciones del actual conviven
+            if match and match.group(1) != key[:16]:
+                os.remove(os.path.join(cache_dir, name))
+    except Exception as exc:  # la caché es opcional: nunca debe romper la lectura
+        print(f"⚠️ No se pudo escribir la caché Parquet {cache_path}: {exc}")
+
 def coerce_dtypes(X: pd.DataFrame):
     # Separa num/cat y fuerza tipos consistentes
     num_cols = X.select_dtypes(include=["number","bool"]).columns.tolist()
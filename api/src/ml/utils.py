@@ -14,13 +14,24 @@ def standardize_col(name: str) -> str:
     s = re.sub(r"\s+", "_", s)
     return s
 
-def read_excel_or_csv(path: str) -> pd.DataFrame:
-    if path.lower().endswith(".csv"):
-        df = pd.read_csv(path)
-    else:
-        df = pd.read_excel(path)
-    df.columns = [standardize_col(c) for c in df.columns]
-    return df
+# La lectura con caché Parquet y por bloques vive en una sola copia, src/utils.py; acá se re-exporta
+if __package__:
+    from .src import utils as _shared
+else:  # importado como módulo suelto (`from utils import ...` en los scripts de ml/)
+    from src import utils as _shared
+
+PARQUET_CACHE_DIRNAME = _shared.PARQUET_CACHE_DIRNAME
+PARQUET_CACHE_ENABLED = _shared.PARQUET_CACHE_ENABLED
+read_excel_or_csv = _shared.read_excel_or_csv
+parquet_cache_path = _shared.parquet_cache_path
+file_sha256 = _shared.file_sha256
+arrow_safe_frame = _shared.arrow_safe_frame
+load_column_whitelist = _shared.load_column_whitelist
+input_columns_for = _shared.input_columns_for
+with_underscore_variants = _shared.with_underscore_variants
+DEFAULT_CHUNKSIZE = _shared.DEFAULT_CHUNKSIZE
+iter_table_chunks = _shared.iter_table_chunks
+iter_excel_chunks = _shared.iter_excel_chunks
 
 def coerce_dtypes(X: pd.DataFrame):
     # Separa num/cat y fuerza tipos consistentes
@@ -6,6 +6,7 @@ from pymongo import ReturnDocument
 from bson import ObjectId
 
 from ..deps import get_db
+from ..services.rescoring import RESCORING_QUEUE, is_discharged, needs_rescoring
 
 router = APIRouter(prefix="/gestion", tags=["gestion"])
 
@@ -32,15 +33,7 @@ def _is_active_episode(db, episodio: str) -> bool:
         {"episodio": str(episodio)},
         sort=[("marca_temporal", -1)]
     )
-    if not last:
-        return False
-    alta = (
-        last.get("fecha_alta")
-        or last.get("fecha_de_alta")
-        or last.get("fecha_finalizacion")
-        or last.get("estado_de_alta")
-    )
-    return not bool(alta)
+    return bool(last) and not is_discharged(last)
 
 def _id_filter(episodio: str, registroId: str) -> Dict[str, Any]:
     f = {"episodio": str(episodio)}
@@ -136,13 +129,23 @@ def editar_estadia(episodio: str, registroId: str, payload: Dict[str, Any], db=D
     if not update:
         raise HTTPException(status_code=422, detail="No hay campos válidos para actualizar")
 
-    doc = db.estadias.find_one_and_update(
+    # Se pide el documento previo para comparar valores; la respuesta se arma aplicándole el $set
+    before = db.estadias.find_one_and_update(
         _id_filter(episodio, registroId),
         {"$set": update},
-        return_document=ReturnDocument.AFTER
+        return_document=ReturnDocument.BEFORE
     )
-    if not doc:
+    if not before:
         raise HTTPException(status_code=404, detail="Registro no encontrado")
+    if any("." in k for k in update):
+        # Rutas anidadas ("a.b"): el merge plano no refleja el documento guardado
+        doc = db.estadias.find_one({"_id": before["_id"]})
+    else:
+        doc = {**before, **update}
+
+    # Si cambió el valor de algún campo que usa el modelo, prob_sobre_estadia se recalcula en segundo plano
+    if needs_rescoring(update, before):
+        RESCORING_QUEUE.enqueue(db, doc["_id"])
 
     doc["_id"] = str(doc["_id"])
     ca = doc.get("created_at")
@@ -1,5 +1,4 @@
 import io, re, unicodedata, hashlib, random
-import pandas as pd
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pymongo.errors import BulkWriteError
 from ..services.mongo import get_collection
@@ -14,6 +13,7 @@ def _slug(s: str) -> str:
     return s
 
 def _excel_serial_to_iso(x, with_time=False):
+    import pandas as pd  # perezoso: importar la app no carga pandas
     try:
         val = float(str(x).replace(",", "."))
     except:
@@ -34,6 +34,7 @@ def _to_float(x):
     except: return None
 
 def _to_date(x, keep_time=False):
+    import pandas as pd
     if x is None or x == "": return None
     iso = _excel_serial_to_iso(x, with_time=keep_time)
     if iso: return iso
@@ -62,6 +63,7 @@ def _rut_dv(num: int) -> str:
     return str(dv)
 
 def _gen_birthdate(rng: random.Random, edad: int|None, marca_iso: str|None) -> str:
+    import pandas as pd
     ref_year = 2010
     if marca_iso:
         try: ref_year = pd.to_datetime(marca_iso).year
@@ -143,12 +145,9 @@ CANON_MAP = {
 DATE_KEEP_TIME = {"marca_temporal","ultima_modificacion","fecha_inicio","fecha_de_finalizacion"}
 DATE_ONLY      = {"fecha_admision","fecha_alta","fecha_de_nacimiento"}
 
-@router.post("/csv")
-async def ingest_csv(file: UploadFile = File(...)):
-    if not file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="El archivo debe ser .csv")
-
-    raw = await file.read()
+def parse_gestion_csv(raw: bytes) -> "pd.DataFrame":
+    """CSV (bytes) → DataFrame de texto con encabezados en slug. Exige episodio y marca temporal."""
+    import pandas as pd
 
     # Lee TODO como texto (sin NaN) e intenta separador automático
     df = None
@@ -166,15 +165,18 @@ async def ingest_csv(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="No fue posible leer el CSV (encoding/sep).")
 
     # Slug de encabezados
-    cols_slug = [_slug(c) for c in df.columns]
-    df.columns = cols_slug
+    df.columns = [_slug(c) for c in df.columns]
 
     # Requeridos: episodio + marca_temporal (puede venir como "marco_temporal")
     has_epi = "episodio" in df.columns
     has_marca = ("marca_temporal" in df.columns) or ("marco_temporal" in df.columns)
     if not (has_epi and has_marca):
         raise HTTPException(status_code=400, detail="Se requieren columnas de 'Episodio' y 'Marco/Marca Temporal'.")
+    return df
 
+def normalize_gestion(df: "pd.DataFrame") -> list:
+    """Filas del CSV → documentos de `estadias` (nombres canónicos, fechas ISO, identidad sintética)."""
+    cols_slug = list(df.columns)
     docs = []
     for _, row in df.iterrows():
         doc = {}
@@ -248,12 +250,11 @@ async def ingest_csv(file: UploadFile = File(...)):
                 doc[k] = None
 
         docs.append(doc)
+    return docs
 
-    if not docs:
-        raise HTTPException(status_code=400, detail="El CSV no contenía filas válidas.")
-
-    coll = get_collection()
 
+async def write_gestion(coll, docs: list) -> dict:
+    """Índice único (episodio, marca_temporal) + insert_many sin orden. Devuelve insertados y duplicados."""
     # Índice único (episodio, marca_temporal)
     try:
         for idx in ("ux_episodio","ux_run_fechaing","ux_run_ts","ux_ts","ux_epi_fing","ux_epi_ultmod","ux_rowfp","ux_epi_ts"):
@@ -273,10 +274,25 @@ async def ingest_csv(file: UploadFile = File(...)):
         duplicates = sum(1 for err in bwe.details.get("writeErrors", []) if err.get("code")==11000)
         inserted = bwe.details.get("nInserted", 0)
 
+    return {"inserted": inserted, "duplicates": duplicates}
+
+@router.post("/csv")
+async def ingest_csv(file: UploadFile = File(...)):
+    if not file.filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="El archivo debe ser .csv")
+
+    raw = await file.read()
+    df = parse_gestion_csv(raw)
+    docs = normalize_gestion(df)
+    if not docs:
+        raise HTTPException(status_code=400, detail="El CSV no contenía filas válidas.")
+
+    coll = get_collection()
+    written = await write_gestion(coll, docs)
     return {
         "collection": coll.name,
-        "inserted": inserted,
-        "duplicates": duplicates,
+        "inserted": written["inserted"],
+        "duplicates": written["duplicates"],
         "total": len(docs),
         "unique_key_used": ["episodio","marca_temporal"]
     }
@@ -1,6 +1,5 @@
 # /opt/app/repo/api/src/routers/ingest_camas.py
 import io, re, unicodedata, os
-import pandas as pd
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pymongo.errors import BulkWriteError
 from ..services.mongo import get_named_collection
@@ -27,7 +26,8 @@ SYN = {
     "fecha_hora": ["fecha_hora","fechahora","datetime","fecha_y_hora","marca_temporal"]
 }
 
-def _read_csv_raw(raw: bytes) -> pd.DataFrame:
+def _read_csv_raw(raw: bytes) -> "pd.DataFrame":
+    import pandas as pd  # perezoso: importar la app no carga pandas
     for enc in ("utf-8-sig","latin-1"):
         try:
             return pd.read_csv(
@@ -49,6 +49,7 @@ def _map_cols(cols_slug: set):
     return m
 
 def _excel_serial_to_iso(x, with_time=False):
+    import pandas as pd
     try:
         val = float(str(x).replace(",", "."))
     except:
@@ -73,22 +74,23 @@ def _parse_snapshot_from_name(filename: str):
         return f"{yyyy}-{mm}-{dd}T00:00:00"
     return None
 
-@router.post("/csv")
-async def ingest_camas(file: UploadFile = File(...)):
-    if not file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="El archivo debe ser .csv")
-    raw = await file.read()
+def parse_camas_csv(raw: bytes) -> "pd.DataFrame":
+    """CSV (bytes) → DataFrame de texto con encabezados en slug."""
     df = _read_csv_raw(raw)
+    df.columns = [_slug(c) for c in df.columns]
+    return df
 
-    cols_slug = [_slug(c) for c in df.columns]
-    df.columns = cols_slug
+def normalize_camas(df: "pd.DataFrame", filename: str) -> list:
+    """Filas del censo → documentos de `camas` con `snapshot_at` (de la fila o del nombre del archivo)."""
+    import pandas as pd
+    cols_slug = list(df.columns)
     mapping = _map_cols(set(cols_slug))
 
     if "cama" not in mapping:
         raise HTTPException(status_code=400, detail="No se encontró la columna 'cama' en el CSV.")
 
     # Construir snapshot_at (fecha/hora)
-    snapshot_name = _parse_snapshot_from_name(file.filename)
+    snapshot_name = _parse_snapshot_from_name(filename)
     if "fecha_hora" in mapping:
         col = mapping["fecha_hora"]
         # intenta serial excel primero
@@ -140,12 +142,10 @@ async def ingest_camas(file: UploadFile = File(...)):
 
         doc["_tipo_fuente"] = "censo_camas"
         docs.append(doc)
+    return docs
 
-    if not docs:
-        raise HTTPException(status_code=400, detail="CSV vacío.")
-
-    coll = get_named_collection(COLL_CAMAS)
-
+async def write_camas(coll, docs: list) -> dict:
+    """Índice único según las columnas presentes + insert_many sin orden."""
     # Índices únicos
     unique_used = None
     try:
@@ -169,5 +169,19 @@ async def ingest_camas(file: UploadFile = File(...)):
         duplicates = sum(1 for e in bwe.details.get("writeErrors", []) if e.get("code")==11000)
         inserted = bwe.details.get("nInserted", 0)
 
-    return {"collection": coll.name, "inserted": inserted, "duplicates": duplicates,
-            "total": len(docs), "unique_key_used": unique_used}
+    return {"inserted": inserted, "duplicates": duplicates, "unique_key_used": unique_used}
+
+@router.post("/csv")
+async def ingest_camas(file: UploadFile = File(...)):
+    if not file.filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="El archivo debe ser .csv")
+    raw = await file.read()
+    df = parse_camas_csv(raw)
+    docs = normalize_camas(df, file.filename)
+    if not docs:
+        raise HTTPException(status_code=400, detail="CSV vacío.")
+
+    coll = get_named_collection(COLL_CAMAS)
+    written = await write_camas(coll, docs)
+    return {"collection": coll.name, "inserted": written["inserted"], "duplicates": written["duplicates"],
+            "total": len(docs), "unique_key_used": written["unique_key_used"]}
@@ -1,19 +1,20 @@
-from typing import List, Union, Any, Dict
+import os
+from typing import List, Literal, Optional, Union, Any, Dict
 from datetime import datetime, timezone
 
-import numpy as np
-from fastapi import APIRouter, Depends, HTTPException, Body
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
 from bson import ObjectId
 from pymongo.errors import PyMongoError
 
-from ..deps import get_db
+from ..deps import get_db, require_admin
+from ..services.rescoring import DEFAULT_CHUNK_SIZE, rescore_active_estadias
+from ..services.shadow import SHADOW_SCORER, shadow_enabled, shadow_summary
 
-# Importa la función del modelo
-try:
-    from ..ml.predict_nuevos_pacientes import predict_nuevos_pacientes
-except Exception:
-    raise
+# El stack de ML (pandas, numpy, joblib, sklearn) se importa dentro de cada
+# endpoint: importar la app no lo carga (ver ML_WARMUP en app.py).
+DEFAULT_BATCH_CHUNKSIZE = 5000  # igual que ml.batch_io.DEFAULT_BATCH_CHUNKSIZE
 
 router = APIRouter(prefix="/prediccion", tags=["prediccion"])
 
@@ -24,7 +25,10 @@ class PacienteIn(BaseModel):
     sexo: str
     servicio_clinico: str
     prevision: str
-    fecha_estimada_de_alta: Union[int, str]
+    fecha_estimada_de_alta: Optional[Union[int, float, str]] = Field(
+        None, description="Estancia norma GRD en días; si falta, se toma de la tabla por codigo_grd "
+                          "(422 si no hay tabla o el código no está en ella)"
+    )
     riesgo_social: Union[int, str]
     riesgo_clinico: Union[int, str]
     riesgo_administrativo: Union[int, str]
@@ -33,6 +37,44 @@ class PacienteIn(BaseModel):
     class Config:
         extra = "allow"  # preserva campos adicionales
 
+class PacientesColumnar(BaseModel):
+    """Mismos campos que PacienteIn, pero una lista por columna: {"edad": [...], "sexo": [...], ...}."""
+    rut: List[str]
+    edad: List[int]
+    sexo: List[str]
+    servicio_clinico: List[str]
+    prevision: List[str]
+    fecha_estimada_de_alta: Optional[List[Optional[Union[int, float, str]]]] = None
+    riesgo_social: List[Union[int, str]]
+    riesgo_clinico: List[Union[int, str]]
+    riesgo_administrativo: List[Union[int, str]]
+    codigo_grd: List[int]
+
+    class Config:
+        extra = "allow"  # columnas adicionales (también listas)
+
+    @model_validator(mode="after")
+    def _mismo_largo(self):
+        columns = self.columns()
+        for name, values in columns.items():
+            if not isinstance(values, list):
+                raise ValueError(f"La columna '{name}' debe ser una lista")
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Todas las columnas deben tener el mismo largo")
+        if lengths == {0}:
+            raise ValueError("El payload columnar no contiene pacientes")
+        return self
+
+    def columns(self) -> Dict[str, List[Any]]:
+        # Las columnas opcionales omitidas no se envían al modelo (se rellenan allá)
+        return {k: v for k, v in {**dict(self), **(self.model_extra or {})}.items() if v is not None}
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.columns())
+
 def _ensure_indexes(db):
     coll = db.predicciones
     coll.create_index([("rut", 1), ("created_at", -1)], name="predicciones_rut_created_at")
@@ -43,9 +85,15 @@ def _to_dicts(payload: Union[PacienteIn, List[PacienteIn]]) -> List[Dict[str, An
         return [p.dict() for p in payload]
     return [payload.dict()]
 
+def _is_numpy_scalar(v) -> bool:
+    # Sin importar numpy: sus escalares (np.int64, np.float64, ...) viven en el módulo "numpy"
+    return type(v).__module__ == "numpy" and hasattr(v, "item")
+
 def _to_python_scalar(v):
-    if isinstance(v, np.generic):
-        return v.item()
+    if _is_numpy_scalar(v):
+        v = v.item()
+    if isinstance(v, float) and v != v:  # NaN (p. ej. columna opcional omitida en algunas filas)
+        return None
     return v
 
 def _sanitize_for_json(obj):
@@ -55,62 +103,245 @@ def _sanitize_for_json(obj):
         if obj.tzinfo is None:
             obj = obj.replace(tzinfo=timezone.utc)
         return obj.astimezone(timezone.utc).isoformat()
-    if isinstance(obj, np.generic):
-        return obj.item()
+    if _is_numpy_scalar(obj) or isinstance(obj, float):
+        return _to_python_scalar(obj)
     if isinstance(obj, list):
         return [_sanitize_for_json(x) for x in obj]
     if isinstance(obj, dict):
         return {k: _sanitize_for_json(v) for k, v in obj.items()}
     return obj
 
+def _check_estancia_norma(records: Optional[List[Dict[str, Any]]] = None, frame=None) -> None:
+    """422 si algún paciente no trae fecha_estimada_de_alta numérica ni hay norma GRD para su código."""
+    from ..ml.model_registry import get_grd_norms
+    from ..ml.predict_nuevos_pacientes import rows_without_estancia_norma
+
+    if frame is not None:
+        dias = frame["fecha_estimada_de_alta"] if "fecha_estimada_de_alta" in frame else [None] * len(frame)
+        missing = rows_without_estancia_norma(dias, frame["codigo_grd"])
+    else:
+        missing = rows_without_estancia_norma([r.get("fecha_estimada_de_alta") for r in records],
+                                              [r.get("codigo_grd") for r in records])
+    if missing:
+        reason = ("su codigo_grd no está en la tabla de normas" if get_grd_norms()["table"]
+                  else "no hay tabla de normas GRD cargada (models/grd_norms.json)")
+        raise HTTPException(
+            status_code=422,
+            detail=f"fecha_estimada_de_alta (días) es obligatoria cuando {reason}; "
+                   f"faltan en {len(missing)} paciente(s), posiciones {missing[:20]}",
+        )
+
 @router.post("/nuevos-pacientes")
 def predecir_nuevos_pacientes(
-    payload: Union[PacienteIn, List[PacienteIn]] = Body(...),
+    payload: Union[PacienteIn, List[PacienteIn], PacientesColumnar] = Body(...),
     persist: bool = True,
+    use_cache: bool = True,
+    formato: Literal["filas", "columnar"] = "filas",
+    explain: bool = False,
     db=Depends(get_db),
 ):
     """
     Recibe uno o varios pacientes, ejecuta el modelo y (opcional) guarda en Mongo (predicciones).
     Respuesta JSON-safe con probabilidad_sobre_estadia, riesgo_categoria y created_at.
+    Cada documento guardado lleva model_version y model_sha256 del artefacto usado.
+    Con ML_CHALLENGER definido, un modelo challenger puntúa el mismo lote en segundo
+    plano y guarda la comparación en predicciones_shadow.
+    Con use_cache=true, pacientes con features idénticas a una predicción reciente
+    (mismo modelo) no vuelven a pasar por el modelo; `cache` informa aciertos/fallos.
+    El body también puede ser columnar ({"edad": [...], "sexo": [...], ...}); con
+    formato=columnar los items se devuelven con esa misma forma.
+    Con explain=true, `explicaciones` trae por paciente (mismo orden que items) las
+    contribuciones de cada feature en log-odds del modelo y los ajustes de riesgo.
     """
+    from ..ml.predict_nuevos_pacientes import predict_nuevos_pacientes
+
+    if isinstance(payload, PacientesColumnar):
+        # Va directo al DataFrame, sin objetos ni dicts por paciente
+        kwargs = {"frame": payload.to_frame()}
+    else:
+        kwargs = {"records": _to_dicts(payload)}
+    _check_estancia_norma(**kwargs)
+
     _ensure_indexes(db)
-    records = _to_dicts(payload)
+    meta: Dict[str, Any] = {}
 
     try:
-        resultados = predict_nuevos_pacientes(
-            records=records,
+        result_df = predict_nuevos_pacientes(
+            **kwargs,
             persist=False,      # no escribir CSV desde el endpoint
-            return_json=True,   # devolver dicts
+            use_cache=use_cache,
+            meta=meta,
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error en predicción: {str(e)}")
+    if result_df is None:
+        raise HTTPException(status_code=400, detail="Error en predicción: sin pacientes válidos")
 
     now = datetime.now(timezone.utc)
+    result_df["riesgo_categoria"] = result_df["riesgo_categoria"].astype(object)
     docs: List[Dict[str, Any]] = []
-    for r_in, r_out in zip(records, resultados):
-        doc = {k: _to_python_scalar(v) for k, v in dict(r_in).items()}
-        for k, v in dict(r_out).items():
-            doc[k] = _to_python_scalar(v)
-        doc["created_at"] = now
-        docs.append(doc)
-
-    inserted_ids: List[str] = []
+    if persist or formato == "filas":
+        for row in result_df.to_dict(orient="records"):
+            doc = {k: _to_python_scalar(v) for k, v in row.items()}
+            doc["created_at"] = now
+            docs.append(doc)
+
+    if formato == "columnar":
+        items = _sanitize_for_json(result_df.to_dict(orient="list"))
+    else:
+        items = _sanitize_for_json(docs)
+    body = {
+        "count": len(result_df),
+        "items": items,
+        "inserted_ids": [],
+        "model_version": meta.get("model_version"),
+        "cache": meta.get("cache"),
+    }
+    if formato == "columnar":
+        body["created_at"] = _sanitize_for_json(now)
+
+    inserted_ids: List[Any] = []
+    if explain:
+        from ..ml.explain import explain_dataframe
+
+        try:
+            body["explicaciones"] = explain_dataframe(result_df)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"No fue posible explicar la predicción: {str(e)}")
+
     if persist and docs:
         try:
-            # Copiar antes de insertar para que PyMongo no mutile los objetos que vamos a devolver
-            to_insert = [dict(d) for d in docs]
+            # Copiar antes de insertar para que PyMongo no mutile los objetos que vamos a devolver;
+            # cada documento queda etiquetado con el modelo que lo produjo
+            tags = {"model_version": meta.get("model_version"), "model_sha256": meta.get("model_sha256")}
+            to_insert = [{**d, **tags} for d in docs]
             res = db.predicciones.insert_many(to_insert)
-            inserted_ids = [str(_id) for _id in res.inserted_ids]
+            inserted_ids = list(res.inserted_ids)
+            body["inserted_ids"] = [str(_id) for _id in inserted_ids]
         except PyMongoError as e:
-            return {
-                "count": len(docs),
-                "items": _sanitize_for_json(docs),
-                "inserted_ids": [],
-                "warning": f"No se pudo guardar en Mongo: {str(e)}",
-            }
+            body["warning"] = f"No se pudo guardar en Mongo: {str(e)}"
+
+    if shadow_enabled():
+        # El challenger puntúa el mismo lote en otro hilo, fuera del camino de respuesta
+        body["shadow"] = {"queued": SHADOW_SCORER.submit(db, result_df, meta, inserted_ids)}
+
+    return body
+
+@router.post("/batch")
+def predecir_batch(
+    file: UploadFile = File(...),
+    chunk_size: int = Query(DEFAULT_BATCH_CHUNKSIZE, ge=100, le=100000),
+):
+    """
+    Recibe un CSV o Parquet con las columnas del modelo y devuelve el mismo archivo
+    (mismo formato) con probabilidad_sobre_estadia y riesgo_categoria agregadas.
+    Se procesa y se transmite por bloques de chunk_size filas; no se guarda en Mongo.
+    """
+    from ..ml.batch_io import MEDIA_TYPES, detect_format, encode_chunks, open_scored_chunks
+
+    fmt = detect_format(file.filename)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="El archivo debe ser .csv o .parquet")
+    try:
+        chunks = open_scored_chunks(file.file, fmt, chunk_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"No fue posible leer el archivo: {str(e)}")
+
+    base, ext = os.path.splitext(os.path.basename(file.filename))
+    return StreamingResponse(
+        encode_chunks(chunks, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{base}_predicciones{ext}"'},
+    )
+
+@router.post("/modelo/recargar", dependencies=[Depends(require_admin)])
+def recargar_modelo():
+    """
+    Vuelve a leer el artefacto del modelo desde disco e invalida la caché de predicciones.
+    Requiere X-Admin-Token. Recarga solo el worker que atiende la request; los demás
+    recargan solos si el artefacto cambió en disco (ML_RELOAD_CHECK_SECONDS).
+    """
+    from ..ml.model_registry import ML_RELOAD_CHECK_SECONDS
+    from ..ml.predict_nuevos_pacientes import PREDICTION_CACHE, reload_model
 
+    try:
+        info = reload_model()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {
+        "model": info,
+        "cache": PREDICTION_CACHE.stats(),
+        "scope": "process",
+        "pid": os.getpid(),
+        "other_workers_check_seconds": ML_RELOAD_CHECK_SECONDS,
+    }
+
+def _grd_norms_or_503() -> Dict[str, Any]:
+    from ..ml.model_registry import get_grd_norms
+
+    norms = get_grd_norms()
+    if not norms["table"]:
+        raise HTTPException(
+            status_code=503,
+            detail="Tabla de normas GRD no disponible: falta models/grd_norms.json (se genera con python -m src.train)",
+        )
+    return norms
+
+@router.get("/grd")
+def listar_normas_grd(
+    limit: int = Query(100, ge=1, le=5000),
+    skip: int = Query(0, ge=0),
+):
+    """
+    Tabla codigo_grd → norma (días) y estadísticas de entrenamiento (n_episodios,
+    estancia_media, tasa_excede_norma, descripcion). Es la que se usa para completar
+    fecha_estimada_de_alta cuando no viene en la predicción. 503 si la tabla no existe.
+    """
+    norms = _grd_norms_or_503()
+    codes = sorted(norms["table"])
     return {
-        "count": len(docs),
-        "items": _sanitize_for_json(docs),
-        "inserted_ids": inserted_ids,
+        "total": len(codes),
+        "results": [{"codigo_grd": code, **norms["table"][code]} for code in codes[skip:skip + limit]],
     }
+
+@router.get("/grd/{codigo_grd}")
+def obtener_norma_grd(codigo_grd: int):
+    """
+    Norma y estadísticas de un codigo_grd. 404 si el código no está en la tabla,
+    503 si la tabla no existe.
+    """
+    row = _grd_norms_or_503()["table"].get(codigo_grd)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"codigo_grd {codigo_grd} no está en la tabla de normas")
+    return {"codigo_grd": codigo_grd, **row}
+
+@router.get("/shadow/resumen")
+def resumen_shadow(db=Depends(get_db)):
+    """
+    Compara champion vs challenger con lo acumulado en predicciones_shadow: por par
+    de versiones, cantidad, probabilidades medias, diferencia absoluta media/máxima
+    y proporción de pacientes con la misma categoría de riesgo.
+    """
+    return {
+        "enabled": shadow_enabled(),
+        "scorer": SHADOW_SCORER.stats(),
+        "results": _sanitize_for_json(shadow_summary(db)),
+    }
+
+@router.post("/estadias/recalcular", dependencies=[Depends(require_admin)])
+def recalcular_estadias_activas(
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=100, le=50000),
+    dry_run: bool = False,
+    db=Depends(get_db),
+):
+    """
+    Re-puntúa prob_sobre_estadia del último registro de cada episodio activo,
+    por bloques de ~chunk_size documentos. Devuelve documentos leídos, episodios
+    puntuados y documentos/seg. Requiere X-Admin-Token.
+    """
+    try:
+        return rescore_active_estadias(db, chunk_size=chunk_size, dry_run=dry_run)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
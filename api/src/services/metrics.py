@@ -0,0 +1,198 @@
+"""
+Métricas HTTP por ruta en formato de texto Prometheus (GET /metrics).
+
+`MetricsMiddleware` es un middleware ASGI puro (sin BaseHTTPMiddleware, que
+agrega una tarea y colas por request). Por cada request HTTP registra, con la
+plantilla de la ruta (`/gestion/estadias/{episodio}/{registroId}`, no la URL
+con los valores) que FastAPI deja en `scope["route"]` al resolverla:
+
+- `http_requests_total{method,route,status}`
+- `http_request_duration_seconds{method,route}` (histograma, LATENCY_BUCKETS)
+- `http_response_bytes_total{method,route}`
+- `http_requests_in_progress{method,route}`
+
+La ruta se conoce recién al resolverla, dentro de la app. La request entra al
+gauge de en curso en cuanto hay ruta: con la dependencia global
+`track_in_progress` (antes de correr el endpoint), con la primera lectura del
+cuerpo (FastAPI lo lee antes de las dependencias; cubre las subidas de
+/gestion/ingest/csv) o al empezar la respuesta, lo que pase primero. Sale al
+terminar la respuesta. Las que no calzan con ninguna ruta no se cuentan en curso.
+
+Las requests que no calzan con ninguna ruta van a `route="<unmatched>"`, para
+que URLs arbitrarias no creen series nuevas. Todo se actualiza en el hilo del
+event loop (los endpoints síncronos corren en el threadpool, el middleware no),
+así que no hace falta lock. Con varios workers cada proceso tiene sus propios
+contadores: Prometheus debe juntar las series de cada worker.
+
+METRICS_ENABLED=0 desactiva el middleware y /metrics.
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UNMATCHED_ROUTE = "<unmatched>"
+# Clave del scope donde el middleware deja el `_InFlight` de la request
+IN_FLIGHT_SCOPE_KEY = "metrics.in_flight"
+
+
+class _RouteStats:
+    __slots__ = ("buckets", "duration_sum", "response_bytes")
+
+    def __init__(self):
+        # Un contador por bucket (no acumulado) + el de +Inf; se acumula al renderizar
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.response_bytes = 0
+
+
+class HttpMetrics:
+    """Contadores por (método, ruta) y por (método, ruta, status)."""
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.routes: Dict[Tuple[str, str], _RouteStats] = {}
+        self.in_progress: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, response_bytes: int) -> None:
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = _RouteStats()
+        stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        stats.duration_sum += seconds
+        stats.response_bytes += response_bytes
+
+    def reset(self) -> None:
+        self.requests.clear()
+        self.routes.clear()
+        self.in_progress.clear()
+
+    def render(self) -> str:
+        """Exposición en formato de texto de Prometheus (0.0.4)."""
+        lines: List[str] = [
+            "# HELP http_requests_total Requests HTTP terminadas, por ruta y status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{escape_label(route)}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP http_requests_in_progress Requests HTTP en curso, por ruta.",
+            "# TYPE http_requests_in_progress gauge",
+        ]
+        for (method, route), count in sorted(self.in_progress.items()):
+            lines.append(f'http_requests_in_progress{{method="{method}",route="{escape_label(route)}"}} {count}')
+
+        lines += [
+            "# HELP http_request_duration_seconds Latencia de la request hasta el último byte de la respuesta.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), stats in sorted(self.routes.items()):
+            labels = f'method="{method}",route="{escape_label(route)}"'
+            lines += histogram_lines("http_request_duration_seconds", labels, stats.buckets, stats.duration_sum)
+
+        lines += [
+            "# HELP http_response_bytes_total Bytes de cuerpo de respuesta enviados.",
+            "# TYPE http_response_bytes_total counter",
+        ]
+        for (method, route), stats in sorted(self.routes.items()):
+            lines.append(f'http_response_bytes_total{{method="{method}",route="{escape_label(route)}"}} {stats.response_bytes}')
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def histogram_lines(name: str, labels: str, buckets: List[int], total: float) -> List[str]:
+    """Líneas `_bucket`/`_sum`/`_count` de un histograma con contadores por bucket (no acumulados)."""
+    lines, cumulative = [], 0
+    for bound, count in zip(LATENCY_BUCKETS, buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    cumulative += buckets[-1]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {total}")
+    lines.append(f"{name}_count{{{labels}}} {cumulative}")
+    return lines
+
+
+METRICS = HttpMetrics()
+
+
+def _route_template(scope) -> str:
+    return getattr(scope.get("route"), "path_format", None) or UNMATCHED_ROUTE
+
+
+class _InFlight:
+    """Entrada de una request en `in_progress`, bajo su ruta en cuanto se resuelve."""
+
+    __slots__ = ("in_progress", "scope", "key")
+
+    def __init__(self, in_progress: Dict[Tuple[str, str], int], scope):
+        self.in_progress = in_progress
+        self.scope = scope
+        self.key: Optional[Tuple[str, str]] = None
+
+    def enter(self) -> None:
+        if self.key is not None or self.scope.get("route") is None:
+            return
+        key = self.key = (self.scope["method"], _route_template(self.scope))
+        self.in_progress[key] = self.in_progress.get(key, 0) + 1
+
+    def exit(self) -> None:
+        if self.key is not None:
+            self.in_progress[self.key] -= 1
+
+
+async def track_in_progress(request: Request) -> None:
+    """Dependencia global (`FastAPI(dependencies=...)`): la ruta ya está resuelta, la request entra al gauge."""
+    in_flight = request.scope.get(IN_FLIGHT_SCOPE_KEY)
+    if in_flight is not None:
+        in_flight.enter()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que alimenta `metrics` (por defecto el registro global METRICS)."""
+
+    def __init__(self, app, metrics: HttpMetrics = METRICS):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        in_flight = scope[IN_FLIGHT_SCOPE_KEY] = _InFlight(metrics.in_progress, scope)
+        status = 500  # si la app falla antes de empezar la respuesta
+        sent = 0
+
+        async def receive_wrapper():
+            in_flight.enter()
+            return await receive()
+
+        async def send_wrapper(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            elif message["type"] == "http.response.start":
+                status = message["status"]
+                in_flight.enter()
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.exit()
+            metrics.observe(scope["method"], _route_template(scope), status, elapsed, sent)
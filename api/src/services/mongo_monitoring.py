@@ -0,0 +1,234 @@
+"""
+Monitoreo de comandos Mongo (PyMongo/Motor) y log de consultas lentas.
+
+`COMMAND_LISTENER` se registra en los dos clientes (`deps._client` y
+`services.mongo.get_client`) y, por cada comando, registra duración, colección,
+nombre del comando y documentos devueltos (primer lote / getMore, o `n` de
+count). Los totales por (colección, comando) salen en /metrics:
+`mongo_commands_total`, `mongo_command_duration_seconds` (histograma) y
+`mongo_documents_returned_total`.
+
+Los comandos que superan MONGO_SLOW_MS (100 ms por defecto) se imprimen con la
+forma de la consulta (`query_shape`): filtro, sort o pipeline con los valores
+reemplazados por "?" y las rutas `$campo` intactas. Así se distingue qué
+aggregation de `resumen.py` o qué `find` de `tareas.py` es el lento, sin
+volcar datos de pacientes al log.
+
+Por request, `DbRoundTripMiddleware` deja en un ContextVar un contador que el
+listener incrementa, y responde con `X-DB-Round-Trips` y `X-DB-Time-Ms`. Sirve
+para detectar patrones N+1 (p. ej. las validaciones de `crear_tarea`). El
+contador llega al listener porque ambos caminos copian el contexto: los
+endpoints síncronos corren en el threadpool de Starlette (anyio copia el
+contexto) y Motor ejecuta cada operación con `contextvars.copy_context()` en su
+executor. Solo cuenta lo que pasa antes de enviar los encabezados: background
+tasks y respuestas en streaming quedan fuera.
+
+MONGO_MONITORING=0 no registra el listener ni el middleware.
+"""
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from .metrics import LATENCY_BUCKETS, escape_label, histogram_lines
+
+MONGO_MONITORING = os.getenv("MONGO_MONITORING", "1") != "0"
+SLOW_MS = float(os.getenv("MONGO_SLOW_MS", "100"))
+# Campos del comando que agrega el driver (sesión, cluster time, ...), no la consulta
+_DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "signature",
+                  "autocommit", "startTransaction", "$audit", "apiVersion"}
+_SHAPE_MAX_DEPTH = 6
+_SHAPE_MAX_ITEMS = 3
+
+
+class RequestDbUsage:
+    __slots__ = ("round_trips", "seconds")
+
+    def __init__(self):
+        self.round_trips = 0
+        self.seconds = 0.0
+
+
+_REQUEST_DB: ContextVar[Optional[RequestDbUsage]] = ContextVar("request_db_usage", default=None)
+
+
+def query_shape(value: Any, depth: int = 0) -> Any:
+    """Estructura de una consulta sin sus valores: "?" en vez de literales, `$campo` se conserva."""
+    if isinstance(value, dict):
+        if depth >= _SHAPE_MAX_DEPTH:
+            return "{…}"
+        return {key: query_shape(val, depth + 1) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [query_shape(val, depth + 1) for val in value[:_SHAPE_MAX_ITEMS]]
+        if len(value) > _SHAPE_MAX_ITEMS:
+            items.append(f"…+{len(value) - _SHAPE_MAX_ITEMS}")
+        return items
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+
+def _collection(command_name: str, command: Dict[str, Any]) -> str:
+    target = command.get(command_name)
+    if isinstance(target, str):
+        return target
+    if command_name == "getMore":
+        return command.get("collection", "")
+    return ""
+
+
+def _documents_returned(command_name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):  # find, aggregate, getMore, listIndexes...
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    if command_name == "count":
+        return int(reply.get("n", 0))
+    if command_name == "distinct":
+        return len(reply.get("values", ()))
+    return 0
+
+
+class _CommandStats:
+    __slots__ = ("count", "failed", "buckets", "seconds", "documents")
+
+    def __init__(self):
+        self.count = 0
+        self.failed = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.seconds = 0.0
+        self.documents = 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Duración, colección y documentos devueltos por comando; log de los que superan `slow_ms`."""
+
+    def __init__(self, slow_ms: float = SLOW_MS):
+        self.slow_ms = slow_ms
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]] = {}
+        self._stats: Dict[Tuple[str, str], _CommandStats] = {}
+        # PyMongo llama al listener desde el hilo que ejecuta el comando (threadpool / executor de Motor)
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        usage = _REQUEST_DB.get()
+        if usage is not None:
+            usage.round_trips += 1
+        command = event.command
+        self._pending[(event.connection_id, event.request_id)] = (_collection(event.command_name, command), command)
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event, None)
+
+    def _finish(self, event, reply: Optional[Dict[str, Any]]) -> None:
+        collection, command = self._pending.pop((event.connection_id, event.request_id), ("", None))
+        seconds = event.duration_micros / 1e6
+        documents = _documents_returned(event.command_name, reply) if reply is not None else 0
+        usage = _REQUEST_DB.get()
+        if usage is not None:
+            usage.seconds += seconds
+        key = (collection, event.command_name)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _CommandStats()
+            stats.count += 1
+            stats.failed += reply is None
+            stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.seconds += seconds
+            stats.documents += documents
+        if seconds * 1000 >= self.slow_ms:
+            self._log_slow(event, collection, command, seconds, documents, reply is None)
+
+    def _log_slow(self, event, collection: str, command: Optional[Dict[str, Any]], seconds: float,
+                  documents: int, failed: bool) -> None:
+        record = {
+            "command": event.command_name,
+            "database": event.database_name,
+            "collection": collection,
+            "duration_ms": round(seconds * 1000, 1),
+            "documents": documents,
+            "failed": failed,
+        }
+        if command is not None:
+            record["shape"] = query_shape(
+                {k: v for k, v in command.items() if k not in _DRIVER_FIELDS and k != event.command_name})
+        print(f"🐢 Mongo lento: {json.dumps(record, ensure_ascii=False, default=str)}", flush=True)
+
+    def snapshot(self) -> Dict[Tuple[str, str], _CommandStats]:
+        with self._lock:
+            return dict(self._stats)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def render(self) -> str:
+        """Totales por (colección, comando) en formato de texto de Prometheus."""
+        stats = sorted(self.snapshot().items())
+        lines: List[str] = [
+            "# HELP mongo_commands_total Comandos Mongo terminados, por colección y comando.",
+            "# TYPE mongo_commands_total counter",
+        ]
+        for (collection, command), s in stats:
+            labels = f'collection="{escape_label(collection)}",command="{command}"'
+            lines.append(f'mongo_commands_total{{{labels},outcome="ok"}} {s.count - s.failed}')
+            if s.failed:
+                lines.append(f'mongo_commands_total{{{labels},outcome="failed"}} {s.failed}')
+        lines += [
+            "# HELP mongo_command_duration_seconds Duración de los comandos Mongo (según el driver).",
+            "# TYPE mongo_command_duration_seconds histogram",
+        ]
+        for (collection, command), s in stats:
+            labels = f'collection="{escape_label(collection)}",command="{command}"'
+            lines += histogram_lines("mongo_command_duration_seconds", labels, s.buckets, s.seconds)
+        lines += [
+            "# HELP mongo_documents_returned_total Documentos devueltos (lotes de cursor, count, distinct).",
+            "# TYPE mongo_documents_returned_total counter",
+        ]
+        for (collection, command), s in stats:
+            lines.append(f'mongo_documents_returned_total{{collection="{escape_label(collection)}",command="{command}"}} '
+                         f"{s.documents}")
+        return "\n".join(lines) + "\n"
+
+
+COMMAND_LISTENER = MongoCommandListener()
+
+
+def event_listeners() -> list:
+    """Para `MongoClient(..., event_listeners=...)` / `AsyncIOMotorClient(...)`."""
+    return [COMMAND_LISTENER] if MONGO_MONITORING else []
+
+
+class DbRoundTripMiddleware:
+    """Middleware ASGI: cuenta los comandos Mongo de cada request y los informa en los encabezados."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage = RequestDbUsage()
+        token = _REQUEST_DB.set(usage)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-db-round-trips", str(usage.round_trips).encode()))
+                headers.append((b"x-db-time-ms", f"{usage.seconds * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _REQUEST_DB.reset(token)
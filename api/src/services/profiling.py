@@ -0,0 +1,260 @@
+"""
+Perfilado bajo demanda de una request puntual.
+
+Con PROFILING_TOKEN definido, una request que trae `X-Profile: <token>` (o
+`?_profile=<token>` en la URL) se ejecuta bajo un profiler por muestreo y con
+tracemalloc. El resultado se guarda como JSON en PROFILING_DIR y la respuesta
+trae `X-Profile-Id`, `X-Profile-Samples` y `X-Profile-Memory-Peak-Kb`; el
+perfil se descarga con `GET /debug/profiles/{id}` (mismo encabezado), como JSON
+o con `?format=folded` (stacks colapsados para speedscope/flamegraph.pl).
+
+Se muestrea en vez de usar cProfile porque cProfile solo ve el hilo donde se
+activa, y el trabajo de una request se reparte: los endpoints síncronos
+(`/prediccion/nuevos-pacientes`) corren en el threadpool, los async
+(`/gestion/personas/resumen`) en el hilo del event loop y Motor en su executor.
+Cada PROFILING_INTERVAL_MS (5 ms) se toman los stacks de todos los hilos con
+`sys._current_frames()` y se descartan los que están esperando trabajo
+(`_IDLE_FRAMES`). El tiempo que un endpoint async pasa esperando a Mongo no
+aparece como muestras (el event loop está en `select`); para eso están
+`X-DB-Time-Ms` y el log de consultas lentas.
+
+Los perfiles se hacen de a uno (tracemalloc es global al proceso) y las
+requests que corran en paralelo se mezclan en las muestras: es una herramienta
+de diagnóstico, no para dejar activa. tracemalloc encarece cada asignación, así
+que la duración de la request perfilada sale inflada.
+
+Sin PROFILING_TOKEN el middleware ni la ruta se registran: cero costo. Con el
+token definido, las requests sin la marca solo pagan la búsqueda del encabezado.
+"""
+import asyncio
+import hmac
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_ENABLED = bool(PROFILING_TOKEN)
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(tempfile.gettempdir(), "api_profiles"))
+INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+HEADER = b"x-profile"
+QUERY_PARAM = "_profile"
+# Nodos con menos de esta fracción de las muestras se juntan en "…otros" en el árbol
+_TREE_MIN_FRACTION = 0.005
+# (archivo, función) del frame más interno de un hilo que espera trabajo
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("periodic_executor.py", "_run"),
+}
+_PROFILE_ID = re.compile(r"^[\w-]+$")
+# Sufijo con número de los workers (ThreadPoolExecutor-0_3, asyncio-portal-7fbe7...)
+_THREAD_SUFFIX = re.compile(r"[-_][0-9a-f_]*\d[0-9a-f_]*$")
+PROFILES_ROUTE = "/debug/profiles"
+
+
+def token_ok(value: Optional[str]) -> bool:
+    return PROFILING_ENABLED and bool(value) and hmac.compare_digest(value, PROFILING_TOKEN)
+
+
+def _requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == HEADER:
+            return token_ok(value.decode("latin-1"))
+    query = scope.get("query_string", b"")
+    if QUERY_PARAM.encode() in query:
+        return token_ok(parse_qs(query.decode("latin-1")).get(QUERY_PARAM, [""])[0])
+    return False
+
+
+class _CodeLabels(dict):
+    """`funcion (ruta/archivo.py:linea)` por code object, con la ruta relativa a site-packages o a la app."""
+
+    _ROOTS = sorted({p for p in sys.path if p} | {os.path.dirname(os.path.dirname(os.path.dirname(__file__)))},
+                    key=len, reverse=True)
+
+    def __missing__(self, code):
+        filename = code.co_filename
+        for root in self._ROOTS:
+            if filename.startswith(root + os.sep):
+                filename = filename[len(root) + 1:]
+                break
+        label = self[code] = f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+        return label
+
+
+class SamplingProfiler:
+    """Toma los stacks de todos los hilos cada `interval_ms` desde un hilo propio."""
+
+    def __init__(self, interval_ms: float = INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks: Dict[Tuple[str, ...], int] = {}
+        self.samples = 0
+        self._labels = _CodeLabels()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        labels = self._labels
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(labels[frame.f_code])
+                    frame = frame.f_back
+                # Los workers de un mismo pool se agrupan bajo un solo nombre
+                stack.append(_THREAD_SUFFIX.sub("", names.get(ident, "?")))
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def folded(self) -> List[str]:
+        """Formato de stacks colapsados: `hilo;raiz;...;hoja N`."""
+        return [f"{';'.join(stack)} {count}" for stack, count in sorted(self.stacks.items())]
+
+    def tree(self) -> Dict[str, Any]:
+        root: Dict[str, Any] = {"name": "total", "samples": 0, "children": {}}
+        for stack, count in self.stacks.items():
+            node = root
+            node["samples"] += count
+            for label in stack:
+                node = node["children"].setdefault(label, {"name": label, "samples": 0, "children": {}})
+                node["samples"] += count
+        return _prune(root, max(1, int(self.samples * _TREE_MIN_FRACTION)))
+
+    def top(self, n: int = 25) -> List[Dict[str, Any]]:
+        """Funciones con más muestras propias (hoja del stack)."""
+        own: Dict[str, int] = {}
+        for stack, count in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+        return [{"name": name, "samples": count}
+                for name, count in sorted(own.items(), key=lambda item: -item[1])[:n]]
+
+
+def _prune(node: Dict[str, Any], min_samples: int) -> Dict[str, Any]:
+    children, dropped = [], 0
+    for child in sorted(node["children"].values(), key=lambda c: -c["samples"]):
+        if child["samples"] >= min_samples:
+            children.append(_prune(child, min_samples))
+        else:
+            dropped += child["samples"]
+    if dropped:
+        children.append({"name": "…otros", "samples": dropped, "children": []})
+    return {**node, "children": children}
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    return os.path.join(PROFILING_DIR, f"{profile_id}.json")
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    path = profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI: perfila las requests que traen la marca con el token."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(PROFILES_ROUTE) or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        async with self._lock:
+            await self._profile(scope, receive, send)
+
+    async def _profile(self, scope, receive, send):
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        profiler = SamplingProfiler()
+        status = 500
+        record: Dict[str, Any] = {}
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                record.update(_finish(profiler, started, tracing))
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                headers.append((b"x-profile-samples", str(profiler.samples).encode()))
+                headers.append((b"x-profile-memory-peak-kb", str(record.get("memory_peak_kb", "")).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not record:  # la app falló antes de responder
+                record.update(_finish(profiler, started, tracing))
+            route = scope.get("route")
+            record = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path_format", None),
+                "status": status,
+                **record,
+                "interval_ms": profiler.interval * 1000,
+                "samples": profiler.samples,
+                "top": profiler.top(),
+                "tree": profiler.tree(),
+                "folded": profiler.folded(),
+            }
+            _save(record)
+            print(f"🔬 Perfil {profile_id}: {record['method']} {record['path']} → {status} en "
+                  f"{record['duration_ms']} ms, {profiler.samples} muestras, pico "
+                  f"{record['memory_peak_kb']} KB ({profile_path(profile_id)})", flush=True)
+
+
+def _finish(profiler: SamplingProfiler, started: float, tracing: bool) -> Dict[str, Any]:
+    """Corta el muestreo y tracemalloc al empezar la respuesta (o al fallar la app)."""
+    duration = time.perf_counter() - started
+    profiler.stop()
+    _, peak = tracemalloc.get_traced_memory()
+    if tracing:
+        tracemalloc.stop()
+    return {"duration_ms": round(duration * 1000, 1), "memory_peak_kb": round(peak / 1024)}
+
+
+def _save(record: Dict[str, Any]) -> None:
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    with open(profile_path(record["id"]), "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
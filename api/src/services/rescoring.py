@@ -0,0 +1,235 @@
+"""
+Re-scoring masivo de estadías activas.
+
+Un episodio tiene varios registros (uno por `marca_temporal`) y está activo si
+su registro más reciente no marca alta (`is_discharged`, la misma regla que
+`/episodios/{episodio}/cama-actual`). Se recorre `estadias` ordenado por
+(episodio, marca_temporal) en bloques que no parten episodios
+(`estadias_dataset.iter_episode_chunks`); de cada episodio activo se puntúa
+solo el último registro, con una sola llamada al modelo por bloque, y se
+escribe `prob_sobre_estadia` con `bulk_write(ordered=False)`. Los registros
+anteriores y los episodios dados de alta no se tocan. Nunca hay más de un
+bloque en memoria.
+
+Además, `RESCORING_QUEUE` re-puntúa en segundo plano, por micro-lotes, los
+registros editados vía PUT cuando cambia el valor de algún campo que usa el
+modelo (reenviar el documento completo sin cambios no encola nada).
+
+Uso como CLI (desde /app):
+    python -m src.services.rescoring --chunk-size 5000
+"""
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+
+EPISODE_FILTER = {"episodio": {"$ne": None}}
+# Cualquiera de estos campos con valor en el último registro marca el episodio como dado de alta
+DISCHARGE_FIELDS = ("fecha_alta", "fecha_de_alta", "fecha_finalizacion", "estado_de_alta")
+DEFAULT_CHUNK_SIZE = 5000
+
+# Campos de `estadias` cuyo cambio deja obsoleta prob_sobre_estadia
+MODEL_RELEVANT_FIELDS = {
+    "riesgo_social",
+    "riesgo_clinico",
+    "riesgo_administrativo",
+    "grd_code",
+    "codigo_grd",
+}
+
+_job_lock = threading.Lock()
+
+
+def is_discharged(doc: Dict[str, Any]) -> bool:
+    """True si el registro (el más reciente de su episodio) marca el alta."""
+    return any(doc.get(field) for field in DISCHARGE_FIELDS)
+
+
+def latest_active(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Último registro de cada episodio activo, de documentos ordenados por (episodio, marca_temporal)."""
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for doc in docs:
+        latest[doc["episodio"]] = doc
+    return [doc for doc in latest.values() if not is_discharged(doc)]
+
+
+def score_estadias(docs: List[Dict[str, Any]]):
+    """Devuelve (probabilidades, versión del modelo) para documentos de `estadias`."""
+    from ..ml.estadias_features import estadias_to_frame
+    from ..ml.predict_nuevos_pacientes import score_feature_frame
+
+    meta: Dict[str, Any] = {}
+    features = estadias_to_frame(docs)
+    probabilities = score_feature_frame(features, meta=meta)
+    return probabilities, meta.get("model_version")
+
+
+def build_updates(docs: List[Dict[str, Any]], probabilities, model_version: str | None) -> List[UpdateOne]:
+    now = datetime.now(timezone.utc)
+    return [
+        UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {
+                "prob_sobre_estadia": float(prob),
+                "prob_model_version": model_version,
+                "prob_updated_at": now,
+            }},
+        )
+        for doc, prob in zip(docs, probabilities)
+    ]
+
+
+def rescore_active_estadias(db, chunk_size: int = DEFAULT_CHUNK_SIZE, dry_run: bool = False,
+                            verbose: bool = False) -> Dict[str, Any]:
+    """Re-puntúa el último registro de cada episodio activo. Devuelve un reporte con filas y filas/seg."""
+    from ..ml.estadias_dataset import EPISODE_SORT, iter_episode_chunks
+    from ..ml.estadias_features import ESTADIA_PROJECTION
+
+    if not _job_lock.acquire(blocking=False):
+        raise RuntimeError("Ya hay un re-scoring de estadías en ejecución")
+    try:
+        started = time.perf_counter()
+        documents = scored = modified = chunks = 0
+        model_version = None
+        projection = {**ESTADIA_PROJECTION, **{field: 1 for field in DISCHARGE_FIELDS}}
+        cursor = db.estadias.find(EPISODE_FILTER, projection, batch_size=chunk_size).sort(EPISODE_SORT)
+        try:
+            for chunk in iter_episode_chunks(cursor, chunk_size):
+                documents += len(chunk)
+                chunks += 1
+                active = latest_active(chunk)
+                if not active:
+                    continue
+                probabilities, model_version = score_estadias(active)
+                if not dry_run:
+                    res = db.estadias.bulk_write(build_updates(active, probabilities, model_version), ordered=False)
+                    modified += res.modified_count
+                scored += len(active)
+                if verbose:
+                    elapsed = time.perf_counter() - started
+                    print(f"   bloque {chunks}: {scored} episodios activos de {documents} documentos "
+                          f"({documents / elapsed:.0f} documentos/seg)")
+        finally:
+            cursor.close()
+        elapsed = time.perf_counter() - started
+        return {
+            "documents": documents,
+            "scored": scored,
+            "modified": modified,
+            "chunks": chunks,
+            "chunk_size": chunk_size,
+            "dry_run": dry_run,
+            "model_version": model_version,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(documents / elapsed, 1) if elapsed > 0 else None,
+        }
+    finally:
+        _job_lock.release()
+
+
+def needs_rescoring(update: Dict[str, Any], previous: Dict[str, Any]) -> bool:
+    """True si la edición cambia el valor de algún feature del modelo respecto de `previous`
+    (el documento antes del update) y no trae ya una probabilidad explícita."""
+    if "prob_sobre_estadia" in update:
+        return False
+    return any(field in update and update[field] != previous.get(field) for field in MODEL_RELEVANT_FIELDS)
+
+
+class RescoringQueue:
+    """Cola de re-scoring incremental con un hilo consumidor.
+
+    `enqueue` solo deja el `_id` en una cola en memoria, así que no agrega
+    latencia a la request. El hilo espera hasta `interval` segundos (o hasta
+    juntar `max_batch` registros), puntúa el micro-lote con una sola llamada
+    al modelo y escribe el resultado con `bulk_write`.
+    """
+
+    def __init__(self, max_batch: int = 500, interval: float = 0.5):
+        self.max_batch = max_batch
+        self.interval = interval
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+
+    def enqueue(self, db, doc_id) -> None:
+        self._ensure_worker()
+        self._queue.put((db, doc_id))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def join(self) -> None:
+        """Bloquea hasta que todo lo encolado haya sido procesado."""
+        self._queue.join()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="estadias-rescoring", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        from ..ml.estadias_features import ESTADIA_PROJECTION
+
+        while True:
+            batch = self._next_batch()
+            try:
+                by_db: Dict[int, tuple] = {}
+                for db, doc_id in batch:
+                    by_db.setdefault(id(db), (db, set()))[1].add(doc_id)
+                for db, ids in by_db.values():
+                    docs = list(db.estadias.find({"_id": {"$in": list(ids)}}, ESTADIA_PROJECTION))
+                    if not docs:
+                        continue
+                    probabilities, model_version = score_estadias(docs)
+                    db.estadias.bulk_write(build_updates(docs, probabilities, model_version), ordered=False)
+                    self.processed += len(docs)
+            except Exception as exc:  # el hilo no debe morir por un lote fallido
+                self.errors += 1
+                print(f"⚠️ Re-scoring incremental falló ({len(batch)} registros): {exc}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+RESCORING_QUEUE = RescoringQueue(
+    max_batch=int(os.getenv("RESCORING_MAX_BATCH", "500")),
+    interval=float(os.getenv("RESCORING_INTERVAL", "0.5")),
+)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from ..deps import DB_NAME, _client
+
+    parser = argparse.ArgumentParser(description="Re-scoring de prob_sobre_estadia para estadías activas.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Documentos por bloque.")
+    parser.add_argument("--dry-run", action="store_true", help="Puntúa sin escribir en Mongo.")
+    args = parser.parse_args()
+
+    report = rescore_active_estadias(_client()[DB_NAME], chunk_size=args.chunk_size,
+                                     dry_run=args.dry_run, verbose=True)
+    print(json.dumps(report, indent=2))
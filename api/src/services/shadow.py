@@ -0,0 +1,205 @@
+"""
+Scoring en sombra (champion/challenger).
+
+Con ML_CHALLENGER definido, cada lote puntuado por POST
+/prediccion/nuevos-pacientes se vuelve a puntuar con el modelo challenger
+fuera del camino de respuesta. El resultado se guarda en `predicciones_shadow`
+(una fila por paciente, con ambas probabilidades y las versiones de cada
+modelo) para compararlos sin afectar lo que ve el usuario.
+
+El challenger corre en un proceso aparte (pool `spawn`, con prioridad baja vía
+`nice`): la request solo serializa el DataFrame ya puntuado, así que ni el GIL
+ni la CPU del worker se comparten con el `predict_proba` del challenger. La
+escritura en Mongo la hace el hilo de callbacks del pool. La cola es acotada
+(SHADOW_MAX_PENDING); si el challenger no da abasto, los lotes nuevos se
+descartan en vez de acumularse.
+"""
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+SHADOW_COLLECTION = "predicciones_shadow"
+SHADOW_NICE = int(os.getenv("SHADOW_NICE", "19"))
+
+
+def shadow_enabled() -> bool:
+    from ..ml.model_registry import ML_CHALLENGER
+
+    return bool(ML_CHALLENGER)
+
+
+def score_challenger(scored_df) -> tuple:
+    """Probabilidades del challenger (con `apply_risk_boost`) y su info."""
+    from ..ml.model_registry import get_challenger
+    from ..ml.predict_nuevos_pacientes import apply_risk_boost, prepare_features
+
+    model, info = get_challenger()
+    features = prepare_features(scored_df)
+    raw = model.predict_proba(features)[:, 1]
+    return apply_risk_boost(raw, features), info
+
+
+def _init_worker(niceness: int) -> None:
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+def _score_in_worker(scored_df):
+    probabilities, info = score_challenger(scored_df)
+    return [float(p) for p in probabilities], info
+
+
+def build_shadow_docs(scored_df, probabilities, champion: Dict[str, Any], challenger: Dict[str, Any],
+                      prediccion_ids: List[Any]) -> List[Dict[str, Any]]:
+    from ..ml.utils import categorize_probabilities
+
+    now = datetime.now(timezone.utc)
+    categories = categorize_probabilities(probabilities)
+    champion_probs = scored_df["probabilidad_sobre_estadia"].tolist()
+    champion_cats = scored_df["riesgo_categoria"].astype(str).tolist()
+    ruts = scored_df["rut"].tolist() if "rut" in scored_df.columns else [None] * len(scored_df)
+    ids = list(prediccion_ids) or [None] * len(scored_df)
+    return [
+        {
+            "prediccion_id": ids[i],
+            "rut": ruts[i],
+            "champion_version": champion.get("model_version"),
+            "champion_sha256": champion.get("model_sha256"),
+            "challenger_version": challenger["version"],
+            "challenger_sha256": challenger["sha256"],
+            "prob_champion": float(champion_probs[i]),
+            "prob_challenger": float(probabilities[i]),
+            "diff": float(probabilities[i]) - float(champion_probs[i]),
+            "riesgo_champion": champion_cats[i],
+            "riesgo_challenger": str(categories[i]),
+            "created_at": now,
+        }
+        for i in range(len(scored_df))
+    ]
+
+
+class ShadowScorer:
+    """Pool de procesos que puntúa con el challenger y guarda la comparación."""
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 8, niceness: int = SHADOW_NICE):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.niceness = niceness
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._reload_hooked = False
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def submit(self, db, scored_df, champion: Dict[str, Any], prediccion_ids: List[Any]) -> bool:
+        """Encola un lote ya puntuado. Devuelve False si la cola está llena (lote descartado)."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+            self.submitted += 1
+            executor = self._ensure_executor()
+        champion = dict(champion)
+        prediccion_ids = list(prediccion_ids)
+        future = executor.submit(_score_in_worker, scored_df)
+        future.add_done_callback(lambda f: self._store(f, db, scored_df, champion, prediccion_ids))
+        return True
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if not self._reload_hooked:
+            from ..ml.model_registry import on_reload
+
+            # El proceso hijo tiene su propia copia del challenger: al recargar, se recicla
+            on_reload(lambda _info: self.restart())
+            self._reload_hooked = True
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.niceness,),
+            )
+        return self._executor
+
+    def _store(self, future: Future, db, scored_df, champion: Dict[str, Any], prediccion_ids: List[Any]) -> None:
+        try:
+            probabilities, challenger = future.result()
+            docs = build_shadow_docs(scored_df, probabilities, champion, challenger, prediccion_ids)
+            if docs:
+                db[SHADOW_COLLECTION].insert_many(docs, ordered=False)
+            with self._lock:
+                self.processed += len(docs)
+        except Exception as exc:  # un lote fallido no debe tumbar el pool
+            with self._lock:
+                self.errors += 1
+            print(f"⚠️ Scoring en sombra falló ({len(scored_df)} registros): {exc}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def pending(self) -> int:
+        return self._pending
+
+    def restart(self) -> None:
+        """Cierra el pool actual (termina lo encolado); el próximo lote abre uno nuevo."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def join(self) -> None:
+        """Espera a que terminen los lotes encolados (para pruebas y CLI)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "pending": self._pending,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+SHADOW_SCORER = ShadowScorer(
+    max_workers=int(os.getenv("SHADOW_WORKERS", "1")),
+    max_pending=int(os.getenv("SHADOW_MAX_PENDING", "8")),
+)
+
+
+def shadow_summary(db) -> List[Dict[str, Any]]:
+    """Comparación agregada champion vs challenger por par de versiones."""
+    pipeline = [
+        {"$group": {
+            "_id": {"champion": "$champion_version", "challenger": "$challenger_version"},
+            "count": {"$sum": 1},
+            "mean_prob_champion": {"$avg": "$prob_champion"},
+            "mean_prob_challenger": {"$avg": "$prob_challenger"},
+            "mean_abs_diff": {"$avg": {"$abs": "$diff"}},
+            "max_abs_diff": {"$max": {"$abs": "$diff"}},
+            "same_riesgo": {"$sum": {"$cond": [{"$eq": ["$riesgo_champion", "$riesgo_challenger"]}, 1, 0]}},
+            "first": {"$min": "$created_at"},
+            "last": {"$max": "$created_at"},
+        }},
+        {"$sort": {"last": -1}},
+    ]
+    out = []
+    for row in db[SHADOW_COLLECTION].aggregate(pipeline):
+        versions = row.pop("_id")
+        row["champion_version"] = versions.get("champion")
+        row["challenger_version"] = versions.get("challenger")
+        row["riesgo_agreement"] = round(row.pop("same_riesgo") / row["count"], 4) if row["count"] else None
+        out.append(row)
+    return out
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ingesta de punta a punta contra un MongoDB local.
+
+Genera CSV de Gestión (`POST /gestion/ingest/csv`) y del censo de camas
+(`POST /camas/ingest/csv`) con `src.ml.generar_datos_sinteticos` (10k, 100k y
+1M filas por defecto; se reutilizan entre corridas) y los pasa por las mismas
+etapas que los endpoints:
+
+- parse:     `parse_gestion_csv` / `parse_camas_csv`   (bytes → DataFrame)
+- normalize: `normalize_gestion` / `normalize_camas`   (DataFrame → documentos)
+- write:     `write_gestion` / `write_camas`           (índice único + insert_many)
+
+Por etapa se reporta segundos, filas/seg y RSS máximo (muestreado durante la
+etapa). Cada caso corre en un proceso nuevo para que el RSS de un caso no se
+arrastre al siguiente. El reporte se compara con la línea base guardada
+(`--baseline`, por defecto tests/ingest_baseline.json): si una etapa es más
+lenta o usa más memoria que la tolerancia, se marca y sale con código 1.
+
+Escribe en la base `--db` (por defecto `ingest_bench`, colecciones
+`bench_gestion` y `bench_camas`, que se borran antes y después de cada caso).
+
+Uso (desde api/):
+    python tests/benchmark_ingest.py --save-baseline
+    python tests/benchmark_ingest.py --sizes 10000 100000 --json ingest.json
+    python tests/benchmark_ingest.py --skip-write --datasets camas
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(TESTS_DIR)
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+DATASETS = ["gestion", "camas"]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+STAGES = ["parse", "normalize", "write"]
+BASELINE_PATH = os.path.join(TESTS_DIR, "ingest_baseline.json")
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "ingest_bench")
+MONGO_URI = os.environ.get("BENCH_MONGODB_URI", "mongodb://127.0.0.1:27017")
+BENCH_DB = "ingest_bench"
+# Una etapa es regresión si supera la línea base en más de la tolerancia y además
+# por más de estos mínimos absolutos (evita falsas alarmas en casos de milisegundos)
+TIME_TOLERANCE = 0.20
+RSS_TOLERANCE = 0.20
+MIN_DELTA_SECONDS = 0.05
+MIN_DELTA_MB = 20.0
+RSS_SAMPLE_SECONDS = 0.01
+
+
+def log_line(name: str, ok: bool, detail: str = ""):
+    mark = "✅" if ok else "❌"
+    print(f"{mark} {name}" + (f" — {detail}" if detail else ""))
+
+
+# ---------- datos ----------
+def input_path(data_dir: str, dataset: str, rows: int) -> str:
+    return os.path.join(data_dir, f"{dataset}_{rows}.csv")
+
+
+def ensure_input(data_dir: str, dataset: str, rows: int, seed: int = 42) -> str:
+    """CSV sintético con exactamente `rows` filas; si ya existe, se reutiliza."""
+    from src.ml import generar_datos_sinteticos as gen
+    from src.ml.batch_scoring import ChunkWriter
+
+    path = input_path(data_dir, dataset, rows)
+    if os.path.exists(path):
+        return path
+    os.makedirs(data_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.csv"
+    writer = ChunkWriter(tmp_path)
+    chunk, written = 0, 0
+    try:
+        if dataset == "gestion":
+            # ~GESTION_FRACTION de los episodios de cada bloque tiene registro de gestión
+            normas = gen.normas_por_grd(seed)
+            while written < rows:
+                ep = gen.episode_block(seed, chunk, chunk * gen.DEFAULT_CHUNK_SIZE, gen.DEFAULT_CHUNK_SIZE, normas)
+                frame = gen.gestion_frame(ep, seed, chunk).head(rows - written)
+                writer.write(frame)
+                written += len(frame)
+                chunk += 1
+        else:
+            while written < rows:
+                n = min(gen.DEFAULT_CHUNK_SIZE, rows - written)
+                writer.write(gen.camas_frame(seed, chunk, written, n, beds=400, interval_hours=4))
+                written += n
+                chunk += 1
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+# ---------- medición ----------
+def current_rss_mb() -> float:
+    """RSS actual (Linux: /proc/self/statm). Sin /proc, el máximo del proceso (ru_maxrss)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class StageTimer:
+    """Mide una etapa: segundos y RSS máximo, muestreado en un hilo cada RSS_SAMPLE_SECONDS."""
+
+    def __init__(self, results: Dict[str, Dict[str, Any]], stage: str, rows: int):
+        self.results, self.stage, self.rows = results, stage, rows
+        self._stop = threading.Event()
+        self._peak = 0.0
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self._peak = max(self._peak, current_rss_mb())
+
+    def __enter__(self):
+        self._start_rss = self._peak = current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._t0
+        self._stop.set()
+        self._thread.join()
+        peak = max(self._peak, current_rss_mb())
+        self.results[self.stage] = {
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(self.rows / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": round(peak, 1),
+            "rss_delta_mb": round(peak - self._start_rss, 1),
+        }
+        return False
+
+
+def _stage_functions(dataset: str):
+    from src.routers import ingest, ingest_camas
+
+    if dataset == "gestion":
+        return ingest.parse_gestion_csv, ingest.normalize_gestion, ingest.write_gestion
+    return ingest_camas.parse_camas_csv, (lambda df: ingest_camas.normalize_camas(df, "camas.csv")), \
+        ingest_camas.write_camas
+
+
+async def _write_stage(write, dataset: str, docs: list, mongo_uri: str, db_name: str,
+                       results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    try:
+        coll = client[db_name][f"bench_{dataset}"]
+        await coll.drop()
+        with StageTimer(results, "write", len(docs)):
+            written = await write(coll, docs)
+        await coll.drop()
+    finally:
+        client.close()
+    return written
+
+
+def run_case(dataset: str, path: str, mongo_uri: str, db_name: str, write: bool = True) -> Dict[str, Any]:
+    """Una pasada de parse → normalize → write sobre `path`. Corre en un proceso propio."""
+    parse, normalize, write_fn = _stage_functions(dataset)
+    with open(path, "rb") as f:
+        raw = f.read()
+    results: Dict[str, Dict[str, Any]] = {}
+    rows = sum(1 for _ in raw.splitlines()) - 1
+    with StageTimer(results, "parse", rows):
+        df = parse(raw)
+    with StageTimer(results, "normalize", len(df)):
+        docs = normalize(df)
+    written = None
+    if write:
+        written = asyncio.run(_write_stage(write_fn, dataset, docs, mongo_uri, db_name, results))
+    return {"rows": len(docs), "bytes": len(raw), "stages": results, "written": written}
+
+
+def _aggregate(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Mediana de segundos entre repeticiones y el mayor RSS; agrega la etapa `total`."""
+    stages: Dict[str, Dict[str, Any]] = {}
+    rows = runs[0]["rows"]
+    for stage in STAGES:
+        values = [run["stages"][stage] for run in runs if stage in run["stages"]]
+        if not values:
+            continue
+        seconds = statistics.median(v["seconds"] for v in values)
+        stages[stage] = {
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": max(v["peak_rss_mb"] for v in values),
+            "rss_delta_mb": max(v["rss_delta_mb"] for v in values),
+        }
+    total = sum(v["seconds"] for v in stages.values())
+    stages["total"] = {
+        "seconds": round(total, 4),
+        "rows_per_second": round(rows / total, 1) if total > 0 else None,
+        "peak_rss_mb": max(v["peak_rss_mb"] for v in stages.values()),
+    }
+    return stages
+
+
+def run_benchmark(sizes: List[int] = DEFAULT_SIZES, datasets: List[str] = DATASETS,
+                  data_dir: str = DEFAULT_DATA_DIR, mongo_uri: str = MONGO_URI, db_name: str = BENCH_DB,
+                  repeats: int = 1, write: bool = True, seed: int = 42) -> Dict[str, Any]:
+    cases = []
+    ctx = get_context("spawn")
+    for dataset in datasets:
+        for rows in sizes:
+            path = ensure_input(data_dir, dataset, rows, seed=seed)
+            runs = []
+            for _ in range(repeats):
+                # Proceso nuevo por repetición: el RSS medido no incluye casos anteriores
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    runs.append(pool.submit(run_case, dataset, path, mongo_uri, db_name, write).result())
+            stages = _aggregate(runs)
+            case = {"dataset": dataset, "rows": runs[0]["rows"], "mb": round(runs[0]["bytes"] / 1e6, 1),
+                    "stages": stages, "written": runs[-1]["written"]}
+            cases.append(case)
+            detail = "  ".join(
+                f"{stage} {v['seconds']:.2f}s ({v['rows_per_second'] or 0:,.0f} filas/s, {v['peak_rss_mb']:.0f} MB)"
+                for stage, v in stages.items())
+            print(f"   {dataset:8s} {case['rows']:>9,d} filas  {detail}")
+
+    import pandas as pd
+    import pymongo
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pandas": pd.__version__,
+            "pymongo": pymongo.__version__,
+            "repeats": repeats,
+            "write": write,
+            "seed": seed,
+        },
+        "cases": cases,
+    }
+
+
+# ---------- línea base ----------
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], time_tolerance: float = TIME_TOLERANCE,
+            rss_tolerance: float = RSS_TOLERANCE) -> List[Dict[str, Any]]:
+    """Cambio por dataset/filas/etapa contra la línea base; `regression` si excede las tolerancias."""
+    before = {(c["dataset"], c["rows"]): c["stages"] for c in baseline.get("cases", [])}
+    # `total` solo es comparable si ambas corridas incluyen (o no) la etapa write
+    same_stages = baseline.get("meta", {}).get("write") == current["meta"]["write"]
+    rows = []
+    for case in current["cases"]:
+        old_stages = before.get((case["dataset"], case["rows"]))
+        if not old_stages:
+            continue
+        for stage, new in case["stages"].items():
+            old = old_stages.get(stage)
+            if not old or not old["seconds"] or (stage == "total" and not same_stages):
+                continue
+            slower = (new["seconds"] > old["seconds"] * (1 + time_tolerance)
+                      and new["seconds"] - old["seconds"] > MIN_DELTA_SECONDS)
+            heavier = (new["peak_rss_mb"] > old["peak_rss_mb"] * (1 + rss_tolerance)
+                       and new["peak_rss_mb"] - old["peak_rss_mb"] > MIN_DELTA_MB)
+            rows.append({
+                "dataset": case["dataset"], "rows": case["rows"], "stage": stage,
+                "seconds_before": old["seconds"], "seconds_after": new["seconds"],
+                "seconds_change_pct": round((new["seconds"] / old["seconds"] - 1) * 100, 1),
+                "peak_rss_mb_before": old["peak_rss_mb"], "peak_rss_mb_after": new["peak_rss_mb"],
+                "regression": slower or heavier,
+            })
+    return rows
+
+
+def _check_mongo(mongo_uri: str) -> None:
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=3000)
+    try:
+        client.admin.command("ping")
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta (parse/normalize/write) contra MongoDB local.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Filas por CSV.")
+    parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=DATASETS)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Carpeta de los CSV generados (se reutilizan).")
+    parser.add_argument("--mongo-uri", default=MONGO_URI, help="MongoDB local (o BENCH_MONGODB_URI).")
+    parser.add_argument("--db", default=BENCH_DB, help="Base de datos de prueba (se borran sus colecciones bench_*).")
+    parser.add_argument("--repeats", type=int, default=1, help="Repeticiones por caso (mediana de segundos).")
+    parser.add_argument("--skip-write", action="store_true", help="Solo parse y normalize (sin MongoDB).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", default=None, help="Guardar el reporte en este archivo.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Línea base con la que comparar.")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar este reporte como línea base.")
+    parser.add_argument("--tolerance", type=float, default=TIME_TOLERANCE,
+                        help="Aumento de tiempo tolerado por etapa (0.2 = 20%%).")
+    parser.add_argument("--rss-tolerance", type=float, default=RSS_TOLERANCE,
+                        help="Aumento de RSS máximo tolerado por etapa.")
+    args = parser.parse_args()
+
+    write = not args.skip_write
+    if write:
+        try:
+            _check_mongo(args.mongo_uri)
+        except Exception as e:
+            raise SystemExit(f"❌ No hay MongoDB en {args.mongo_uri} ({type(e).__name__}). "
+                             f"Levantar uno local o usar --skip-write.")
+
+    print(f"⏱️ Benchmark de ingesta: {args.datasets} × {args.sizes} filas"
+          + ("" if write else " (sin write)"))
+    report = run_benchmark(args.sizes, args.datasets, args.data_dir, args.mongo_uri, args.db,
+                           repeats=args.repeats, write=write, seed=args.seed)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if baseline.get("meta", {}).get("platform") != report["meta"]["platform"]:
+            print(f"⚠️ La línea base es de otra máquina ({baseline.get('meta', {}).get('platform')}).")
+        report["comparison"] = compare(report, baseline, args.tolerance, args.rss_tolerance)
+        print(f"\n📊 Contra la línea base {args.baseline}:")
+        for row in report["comparison"]:
+            log_line(f"{row['dataset']:8s} {row['rows']:>9,d} filas  {row['stage']:9s}", not row["regression"],
+                     f"{row['seconds_before']:.2f} → {row['seconds_after']:.2f} s ({row['seconds_change_pct']:+.1f}%), "
+                     f"RSS {row['peak_rss_mb_before']:.0f} → {row['peak_rss_mb_after']:.0f} MB")
+        regressions = [row for row in report["comparison"] if row["regression"]]
+    elif not args.save_baseline:
+        print(f"\nℹ️ Sin línea base en {args.baseline}; guardar una con --save-baseline.")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Reporte guardado en {args.json}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Línea base guardada en {args.baseline}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} etapa(s) con regresión.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Presupuesto de tiempo de importación de la API.
+
+Ejecuta `python -X importtime -c "import src.app"` (desde api/) varias veces,
+toma el menor tiempo acumulado de `src.app` y falla (exit 1) si supera el
+presupuesto o si la importación arrastra el stack de ML, que debe cargarse
+recién en la primera predicción (o en el warm-up con ML_WARMUP=1).
+
+Uso (desde api/):
+    python tests/check_import_time.py
+    IMPORT_BUDGET_MS=700 python tests/check_import_time.py --runs 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET = "src.app"
+BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "850"))
+FORBIDDEN = [
+    "pandas",
+    "numpy",
+    "joblib",
+    "sklearn",
+    "pyarrow",
+    "src.ml.predict_nuevos_pacientes",
+    "src.ml.model_registry",
+]
+
+
+def log_line(name: str, ok: bool, detail: str = ""):
+    mark = "✅" if ok else "❌"
+    print(f"{mark} {name}" + (f" — {detail}" if detail else ""))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    # El chequeo es sobre la importación perezosa; la precarga explícita es otra cosa
+    env.pop("ML_PRELOAD", None)
+    return env
+
+
+def measure_import_ms() -> tuple[float, list[tuple[float, str]]]:
+    """Tiempo acumulado (ms) de TARGET y los 10 módulos más lentos que arrastra."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        cwd=API_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    total_us = None
+    top = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not cumulative.isdigit():
+            continue  # encabezado
+        top.append((int(cumulative) / 1000, name))
+        if name == TARGET:
+            total_us = int(cumulative)
+    if total_us is None:
+        raise RuntimeError(f"No se encontró {TARGET} en la salida de -X importtime")
+    top = sorted((t for t in top if t[1] != TARGET), reverse=True)[:10]
+    return total_us / 1000, top
+
+
+def loaded_forbidden_modules() -> list[str]:
+    code = (
+        f"import sys, {TARGET}\n"
+        f"print('\\n'.join(m for m in {FORBIDDEN!r} if m in sys.modules))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=API_DIR, env=_env(),
+                          capture_output=True, text=True, check=True)
+    return [m for m in proc.stdout.splitlines() if m]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Falla si importar la API se vuelve más lento.")
+    parser.add_argument("--runs", type=int, default=3, help="Repeticiones; se usa la más rápida.")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    args = parser.parse_args()
+
+    runs = [measure_import_ms() for _ in range(args.runs)]
+    best_ms, top = min(runs, key=lambda r: r[0])
+    print(f"⏱️ import {TARGET}: {best_ms:.0f} ms (mejor de {args.runs}); más lentos:")
+    for ms, name in top:
+        print(f"   {ms:8.1f} ms  {name}")
+
+    ok_budget = best_ms <= args.budget_ms
+    log_line("presupuesto de importación", ok_budget, f"{best_ms:.0f} ms / {args.budget_ms:.0f} ms")
+    forbidden = loaded_forbidden_modules()
+    ok_lazy = not forbidden
+    log_line("stack de ML sin importar", ok_lazy, f"cargados: {forbidden}" if forbidden else "")
+
+    sys.exit(0 if ok_budget and ok_lazy else 1)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Lectura filtrada de las planillas de ejemplo vs. lectura completa.
+
+Los scripts de predicción (`predict_new_patients.py`,
+`predict_nuevos_pacientes_fixed.py`, `predict_nuevos_pacientes_con_historial.py`)
+leen solo `input_columns_for(template)` y después alinean los nombres con
+`align_columns_to_template`. Este chequeo lee cada planilla de ejemplo de
+src/ml completa y filtrada, alinea ambas al template de cada script y falla
+(exit 1) si las columnas del template que quedan no son las mismas: una
+columna descartada por el filtro (p. ej. "IR GRD Código" → `ir_grd_codigo`
+frente a `ir_grd_codigo_`) termina silenciosamente con el valor por defecto.
+
+También corre la CLI `python -m src.ml.batch_scoring` sobre cada par GRD +
+Score de ejemplo (necesita el modelo en src/ml/models) y verifica que termine
+bien y que `codigo_grd` de la salida sea el de la planilla.
+
+Uso (desde api/):
+    python tests/check_ml_inputs.py
+"""
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ML_DIR = os.path.join(API_DIR, "src", "ml")
+SCRIPTS = [
+    "predict_new_patients",
+    "predict_nuevos_pacientes_fixed",
+    "predict_nuevos_pacientes_con_historial",
+]
+SAMPLES = [
+    "nuevos_pacientes/GRD.xlsx",
+    "nuevos_pacientes/Score.xlsx",
+    "nuevos_pacientes_grd.xlsx",
+    "nuevos_pacientes_score.xlsx",
+    "GRD_prueba.xlsx",
+    "Score_prueba.xlsx",
+]
+PAIRS = [
+    ("nuevos_pacientes/GRD.xlsx", "nuevos_pacientes/Score.xlsx"),
+    ("nuevos_pacientes_grd.xlsx", "nuevos_pacientes_score.xlsx"),
+    ("GRD_prueba.xlsx", "Score_prueba.xlsx"),
+]
+
+
+def log_line(name: str, ok: bool, detail: str = ""):
+    mark = "✅" if ok else "❌"
+    print(f"{mark} {name}" + (f" — {detail}" if detail else ""))
+
+
+def check_batch_scoring(read_excel_or_csv) -> int:
+    """Corre la CLI de scoring por bloques sobre cada par de ejemplo; devuelve la cantidad de fallas."""
+    import pandas as pd
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for grd, score in PAIRS:
+            if not (os.path.exists(grd) and os.path.exists(score)):
+                continue
+            output = os.path.join(tmp, "pred.csv")
+            cmd = [sys.executable, "-m", "src.ml.batch_scoring", "--grd", os.path.join(ML_DIR, grd),
+                   "--score", os.path.join(ML_DIR, score), "--output", output, "--workers", "0"]
+            proc = subprocess.run(cmd, cwd=API_DIR, capture_output=True, text=True)
+            if proc.returncode != 0:
+                failures += 1
+                log_line(f"batch_scoring: {grd}", False, (proc.stderr.strip().splitlines() or ["sin salida"])[-1])
+                continue
+            expected = read_excel_or_csv(grd, use_cache=False)["ir_grd_codigo"].astype(str).tolist()
+            got = pd.read_csv(output)["codigo_grd"].astype(str).tolist()
+            ok = got == expected
+            failures += not ok
+            log_line(f"batch_scoring: {grd}", ok, f"{len(got)} filas" if ok else "codigo_grd distinto al de la planilla")
+    return failures
+
+
+def main() -> int:
+    # Los scripts se corren desde src/ml (`from utils import ...`, config.yaml relativo)
+    os.chdir(ML_DIR)
+    sys.path.insert(0, ML_DIR)
+    from utils import align_columns_to_template, input_columns_for, read_excel_or_csv
+
+    samples = [s for s in SAMPLES if os.path.exists(s)]
+    # Sin caché: se compara la lectura misma y no se dejan archivos en src/ml
+    full = {s: read_excel_or_csv(s, use_cache=False) for s in samples}
+    failures = 0
+    for name in SCRIPTS:
+        template = list(importlib.import_module(name).create_complete_template())
+        columns = input_columns_for(template)
+        for sample in samples:
+            expected = set(align_columns_to_template(full[sample], template).columns) & set(template)
+            filtered = read_excel_or_csv(sample, use_cache=False, columns=columns)
+            got = set(align_columns_to_template(filtered, template).columns) & set(template)
+            ok = got == expected
+            failures += not ok
+            detail = f"{len(got)} columnas del template" if ok else f"faltan {sorted(expected - got)}"
+            log_line(f"{name}: {sample}", ok, detail)
+    failures += check_batch_scoring(read_excel_or_csv)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,20 @@
 #!/usr/bin/env python3
-import os, io, csv, json, time, random
+"""
+Pruebas de la API contra un servidor corriendo (BASE_URL).
+
+Sin argumentos corre las suites una por una y verifica las respuestas. Con
+`--load` corre las mismas llamadas en modo carga: `--users` usuarios virtuales
+concurrentes (httpx.AsyncClient) eligen una suite al azar según `--mix`
+durante `--duration` segundos, y se reporta throughput, errores y latencias
+p50/p95/p99 por ruta (plantilla, p. ej. `PUT /gestion/estadias/{episodio}/{registroId}`).
+
+Uso (desde api/; dependencias en tests/requirements.txt):
+    pip install -r tests/requirements.txt
+    python tests/run_api_tests.py
+    python tests/run_api_tests.py --load --users 50 --duration 60 --json carga.json
+    python tests/run_api_tests.py --load --users 20 --mix health=1,prediccion=4,estadias_crud=1
+"""
+import os, io, csv, json, time, random, math, asyncio, argparse
 from datetime import datetime, timezone
 from typing import Tuple, Dict, Any, List, Optional
 import requests
@@ -130,6 +145,27 @@ def suite_episodios_resumen(sess):
     return tests
 
 # /prediccion/nuevos-pacientes (POST persist=false) — 3 payloads
+PRED_PAYLOADS = [
+    {
+        "rut":"API-T1","edad":60,"sexo":"Femenino","servicio_clinico":"Medicina",
+        "prevision":"FONASA","fecha_estimada_de_alta":7,
+        "riesgo_social":"Medio","riesgo_clinico":"Medio","riesgo_administrativo":"Bajo",
+        "codigo_grd":51401
+    },
+    {
+        "rut":"API-T2","edad":78,"sexo":"Masculino","servicio_clinico":"UCI",
+        "prevision":"FONASA","fecha_estimada_de_alta":2,
+        "riesgo_social":"Alto","riesgo_clinico":"Alto","riesgo_administrativo":"Medio",
+        "codigo_grd":81605
+    },
+    {
+        "rut":"API-T3","edad":40,"sexo":"Femenino","servicio_clinico":"Cirugia",
+        "prevision":"ISAPRE","fecha_estimada_de_alta":12,
+        "riesgo_social":0,"riesgo_clinico":1,"riesgo_administrativo":2,
+        "codigo_grd":174121
+    },
+]
+
 def suite_prediccion(sess):
     tests = []
     def check_pred(r):
@@ -145,33 +181,15 @@ def suite_prediccion(sess):
             return False, f"estructura inesperada: {e}", r.status_code
 
     def t1():
-        payload = {
-            "rut":"API-T1","edad":60,"sexo":"Femenino","servicio_clinico":"Medicina",
-            "prevision":"FONASA","fecha_estimada_de_alta":7,
-            "riesgo_social":"Medio","riesgo_clinico":"Medio","riesgo_administrativo":"Bajo",
-            "codigo_grd":51401
-        }
-        r = sess.post(f"{BASE_URL}/prediccion/nuevos-pacientes?persist=false", json=payload, timeout=30)
+        r = sess.post(f"{BASE_URL}/prediccion/nuevos-pacientes?persist=false", json=PRED_PAYLOADS[0], timeout=30)
         return check_pred(r)
 
     def t2():
-        payload = {
-            "rut":"API-T2","edad":78,"sexo":"Masculino","servicio_clinico":"UCI",
-            "prevision":"FONASA","fecha_estimada_de_alta":2,
-            "riesgo_social":"Alto","riesgo_clinico":"Alto","riesgo_administrativo":"Medio",
-            "codigo_grd":81605
-        }
-        r = sess.post(f"{BASE_URL}/prediccion/nuevos-pacientes?persist=false", json=payload, timeout=30)
+        r = sess.post(f"{BASE_URL}/prediccion/nuevos-pacientes?persist=false", json=PRED_PAYLOADS[1], timeout=30)
         return check_pred(r)
 
     def t3():
-        payload = {
-            "rut":"API-T3","edad":40,"sexo":"Femenino","servicio_clinico":"Cirugia",
-            "prevision":"ISAPRE","fecha_estimada_de_alta":12,
-            "riesgo_social":0,"riesgo_clinico":1,"riesgo_administrativo":2,
-            "codigo_grd":174121
-        }
-        r = sess.post(f"{BASE_URL}/prediccion/nuevos-pacientes?persist=false", json=payload, timeout=30)
+        r = sess.post(f"{BASE_URL}/prediccion/nuevos-pacientes?persist=false", json=PRED_PAYLOADS[2], timeout=30)
         return check_pred(r)
 
     tests.extend([
@@ -182,6 +200,21 @@ def suite_prediccion(sess):
     return tests
 
 # /gestion/estadias (CRUD) — 3 rondas con datos distintos
+CRUD_EXTRAS = [
+    {
+        "riesgo_social": None, "riesgo_clinico": None, "riesgo_administrativo": None,
+        "prob_sobre_estadia": None, "grd_code": None
+    },
+    {
+        "riesgo_social": 1, "riesgo_clinico": "Medio", "riesgo_administrativo": "Bajo",
+        "prob_sobre_estadia": 0.25, "grd_code": 51401
+    },
+    {
+        "riesgo_social": "Alto", "riesgo_clinico": 2, "riesgo_administrativo": 0,
+        "prob_sobre_estadia": 0.83, "grd_code": 81605
+    },
+]
+
 def suite_estadias_crud(sess):
     tests = []
 
@@ -211,25 +244,13 @@ def suite_estadias_crud(sess):
         return True, "CRUD ok", 200
 
     def t1():
-        extra = {
-            "riesgo_social": None, "riesgo_clinico": None, "riesgo_administrativo": None,
-            "prob_sobre_estadia": None, "grd_code": None
-        }
-        return round_trip("R1", extra)
+        return round_trip("R1", CRUD_EXTRAS[0])
 
     def t2():
-        extra = {
-            "riesgo_social": 1, "riesgo_clinico": "Medio", "riesgo_administrativo": "Bajo",
-            "prob_sobre_estadia": 0.25, "grd_code": 51401
-        }
-        return round_trip("R2", extra)
+        return round_trip("R2", CRUD_EXTRAS[1])
 
     def t3():
-        extra = {
-            "riesgo_social": "Alto", "riesgo_clinico": 2, "riesgo_administrativo": 0,
-            "prob_sobre_estadia": 0.83, "grd_code": 81605
-        }
-        return round_trip("R3", extra)
+        return round_trip("R3", CRUD_EXTRAS[2])
 
     tests.extend([
         ("CRUD /gestion/estadias #1", t1),
@@ -277,17 +298,17 @@ def suite_tareas(sess):
     return tests
 
 # /gestion/ingest/csv (POST) — 1 prueba (NO se multiplica)
+def _mini_csv() -> str:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Episodio", "Marco Temporal", "cama"])
+    writer.writerow([_episode_auto("CSV"), _iso_now(), "C-TEST"])
+    return output.getvalue()
+
 def single_ingest_csv(sess):
     tests = []
     def t1():
-        ep = _episode_auto("CSV")
-        mt = _iso_now()
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Episodio", "Marco Temporal", "cama"])
-        writer.writerow([ep, mt, "C-TEST"])
-        output.seek(0)
-        files = {"file": ("mini.csv", output.getvalue(), "text/csv")}
+        files = {"file": ("mini.csv", _mini_csv(), "text/csv")}
         r = sess.post(f"{BASE_URL}/gestion/ingest/csv", files=files, timeout=60)
         if r.status_code != 200: return False, f"status != 200: {r.text}", r.status_code
         ok, data, msg = _as_json(r)
@@ -310,6 +331,231 @@ SUITES = [
     ("ingest_csv_single", single_ingest_csv),  # no se multiplica
 ]
 
+# ------------------ MODO CARGA ------------------
+# Un escenario por suite: una iteración hace las mismas llamadas que un test de
+# la suite (variante al azar), con httpx.AsyncClient. Pesos por defecto de --mix:
+LOAD_MIX = {
+    "health": 4,
+    "personas_resumen": 3,
+    "episodios_resumen": 3,
+    "prediccion": 3,
+    "estadias_crud": 1,
+    "tareas_gestoras": 2,
+    "tareas": 2,
+    "ingest_csv_single": 1,
+}
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil por rango más cercano (sin interpolar) de una lista ordenada."""
+    if not sorted_values: return float("nan")
+    k = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[min(k, len(sorted_values) - 1)]
+
+class LoadStats:
+    """Latencias (ms) y códigos HTTP por plantilla de ruta."""
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+        self.failed: Dict[str, int] = {}
+        self.iterations: Dict[str, int] = {}
+        self.scenario_errors: Dict[str, int] = {}
+
+    async def call(self, client, route: str, method: str, url: str, expected=(200,), **kwargs):
+        """Hace la llamada y la registra en `route`. Devuelve la respuesta, o None si no es la esperada."""
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, url, **kwargs)
+            status = r.status_code
+        except Exception:  # timeout / conexión rechazada: cuenta como falla con status -1
+            r, status = None, -1
+        self.latencies.setdefault(route, []).append((time.perf_counter() - t0) * 1000.0)
+        counts = self.statuses.setdefault(route, {})
+        counts[status] = counts.get(status, 0) + 1
+        if status not in expected:
+            self.failed[route] = self.failed.get(route, 0) + 1
+            return None
+        return r
+
+    def summary(self, elapsed: float) -> List[Dict[str, Any]]:
+        rows = []
+        for route in sorted(self.latencies):
+            lat = sorted(self.latencies[route])
+            failed = self.failed.get(route, 0)
+            rows.append({
+                "route": route,
+                "requests": len(lat),
+                "failed": failed,
+                "error_pct": round(100.0 * failed / len(lat), 2),
+                "rps": round(len(lat) / elapsed, 2),
+                "p50_ms": round(_percentile(lat, 50), 2),
+                "p95_ms": round(_percentile(lat, 95), 2),
+                "p99_ms": round(_percentile(lat, 99), 2),
+                "max_ms": round(lat[-1], 2),
+                "mean_ms": round(sum(lat) / len(lat), 2),
+                "statuses": {str(k): v for k, v in sorted(self.statuses[route].items())},
+            })
+        return rows
+
+async def load_health(client, stats: LoadStats, ctx):
+    url, headers = random.choice([
+        ("/health", {"Accept": "application/json"}),
+        (f"/health?ts={int(time.time())}", {"Accept": "*/*"}),
+        ("/health", {}),
+    ])
+    await stats.call(client, "GET /health", "GET", url, headers=headers)
+
+async def load_personas_resumen(client, stats: LoadStats, ctx):
+    limit, skip = random.choice([(3, 0), (10, 5), (100, 0)])
+    await stats.call(client, "GET /gestion/personas/resumen", "GET", "/gestion/personas/resumen",
+                     params={"limit": limit, "skip": skip})
+
+async def load_episodios_resumen(client, stats: LoadStats, ctx):
+    epi = ctx.get("episodio")
+    params = random.choice([{"limit": 1}, {"episodio": epi} if epi else {"limit": 2}, {"limit": 2, "skip": 1}])
+    await stats.call(client, "GET /gestion/episodios/resumen", "GET", "/gestion/episodios/resumen", params=params)
+
+async def load_prediccion(client, stats: LoadStats, ctx):
+    await stats.call(client, "POST /prediccion/nuevos-pacientes", "POST", "/prediccion/nuevos-pacientes",
+                     params={"persist": "false"}, json=random.choice(PRED_PAYLOADS))
+
+async def load_estadias_crud(client, stats: LoadStats, ctx):
+    episodio = _episode_auto("LOAD")
+    payload = {"episodio": episodio, "marca_temporal": _iso_now()} | random.choice(CRUD_EXTRAS)
+    r = await stats.call(client, "POST /gestion/estadias", "POST", "/gestion/estadias", expected=(201,), json=payload)
+    if r is None: return
+    item = f"/gestion/estadias/{episodio}/{r.json()['inserted_id']}"
+    await stats.call(client, "PUT /gestion/estadias/{episodio}/{registroId}", "PUT", item, json={"estado": "ok-load"})
+    await stats.call(client, "GET /gestion/episodios/{episodio}/cama-actual", "GET",
+                     f"/gestion/episodios/{episodio}/cama-actual", expected=(200, 404))
+    await stats.call(client, "DELETE /gestion/estadias/{episodio}/{registroId}", "DELETE", item, expected=(204,))
+
+async def load_tareas_gestoras(client, stats: LoadStats, ctx):
+    await stats.call(client, "GET /tareas/gestoras", "GET", "/tareas/gestoras")
+
+async def load_tareas(client, stats: LoadStats, ctx):
+    params = random.choice([{}, {"gestor": "Pedro Del Río"}, {"gestor": "NoExisteXYZ"}])
+    await stats.call(client, "GET /tareas", "GET", "/tareas", params=params)
+
+async def load_ingest_csv(client, stats: LoadStats, ctx):
+    await stats.call(client, "POST /gestion/ingest/csv", "POST", "/gestion/ingest/csv",
+                     files={"file": ("mini.csv", _mini_csv(), "text/csv")})
+
+LOAD_SCENARIOS = {
+    "health": load_health,
+    "personas_resumen": load_personas_resumen,
+    "episodios_resumen": load_episodios_resumen,
+    "prediccion": load_prediccion,
+    "estadias_crud": load_estadias_crud,
+    "tareas_gestoras": load_tareas_gestoras,
+    "tareas": load_tareas,
+    "ingest_csv_single": load_ingest_csv,
+}
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    """'health=1,prediccion=4' → pesos; las suites que no aparecen no se ejecutan."""
+    if not text: return dict(LOAD_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in LOAD_SCENARIOS:
+            raise ValueError(f"suite desconocida en --mix: {name!r} (opciones: {', '.join(LOAD_SCENARIOS)})")
+        mix[name] = float(weight) if weight else 1.0
+    if not any(w > 0 for w in mix.values()):
+        raise ValueError("--mix necesita al menos un peso > 0")
+    return mix
+
+async def _virtual_user(client, stats: LoadStats, ctx, mix: Dict[str, float], deadline: float,
+                        start_delay: float, think_time: float):
+    await asyncio.sleep(start_delay)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = random.choices(names, weights)[0]
+        try:
+            await LOAD_SCENARIOS[name](client, stats, ctx)
+        except Exception:  # respuesta con forma inesperada: se cuenta y se sigue
+            stats.scenario_errors[name] = stats.scenario_errors.get(name, 0) + 1
+        stats.iterations[name] = stats.iterations.get(name, 0) + 1
+        if think_time: await asyncio.sleep(think_time)
+
+async def run_load(users: int, duration: float, mix: Dict[str, float], ramp_up: float = 0.0,
+                   think_time: float = 0.0, timeout: float = 30.0) -> Dict[str, Any]:
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("❌ --load necesita httpx: pip install -r tests/requirements.txt")
+
+    stats = LoadStats()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=timeout, limits=limits) as client:
+        ctx: Dict[str, Any] = {"episodio": None}
+        try:
+            r = await client.get("/gestion/episodios/resumen", params={"limit": 1})
+            ctx["episodio"] = ((r.json().get("results") or [{}])[0]).get("episodio") if r.status_code == 200 else None
+        except Exception:
+            pass
+        cpu0, started = time.process_time(), time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            _virtual_user(client, stats, ctx, mix, deadline, ramp_up * i / users, think_time)
+            for i in range(users)
+        ))
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu0
+
+    routes = stats.summary(elapsed)
+    total = sum(row["requests"] for row in routes)
+    failed = sum(row["failed"] for row in routes)
+    all_lat = sorted(x for lat in stats.latencies.values() for x in lat)
+    return {
+        "base_url": BASE_URL,
+        "timestamp": _iso_now(),
+        "users": users,
+        "duration_s": duration,
+        "ramp_up_s": ramp_up,
+        "think_time_s": think_time,
+        "mix": mix,
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "failed": failed,
+        "error_pct": round(100.0 * failed / total, 2) if total else 0.0,
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(all_lat, 50), 2),
+        "p95_ms": round(_percentile(all_lat, 95), 2),
+        "p99_ms": round(_percentile(all_lat, 99), 2),
+        # Si se acerca a 100%, el cliente (un solo proceso) es el cuello de botella, no la API
+        "client_cpu_pct": round(100.0 * cpu / elapsed, 1) if elapsed else 0.0,
+        "iterations": stats.iterations,
+        "scenario_errors": stats.scenario_errors,
+        "routes": routes,
+    }
+
+def main_load(args):
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"🚦 Carga contra {BASE_URL}: {args.users} usuarios, {args.duration:g} s, mix {mix}")
+    report = asyncio.run(run_load(args.users, args.duration, mix, ramp_up=args.ramp_up,
+                                  think_time=args.think_time, timeout=args.timeout))
+
+    print(f"\n{'ruta':55s} {'req':>7s} {'req/s':>8s} {'err%':>6s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  (ms)")
+    for row in report["routes"]:
+        mark = "✅" if row["failed"] == 0 else "❌"
+        print(f"{mark} {row['route']:53s} {row['requests']:>7d} {row['rps']:>8.1f} {row['error_pct']:>6.2f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+    print(f"\n📊 Total: {report['requests']} requests en {report['elapsed_s']} s → {report['rps']} req/s, "
+          f"errores {report['error_pct']}%, p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms, "
+          f"p99 {report['p99_ms']} ms (CPU del cliente {report['client_cpu_pct']}%)")
+    if report["scenario_errors"]:
+        print(f"⚠️ Iteraciones con respuesta inesperada: {report['scenario_errors']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+        print(f"💾 Reporte guardado en {args.json}")
+    if report["error_pct"] > args.max_error_pct:
+        raise SystemExit(1)
+
 def main():
     print(f"🔎 Probando API en: {BASE_URL}")
     overall_results: List[Dict[str, Any]] = []
@@ -358,4 +604,20 @@ def main():
         raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pruebas de la API (correctitud o carga).")
+    parser.add_argument("--load", action="store_true", help="Modo carga: usuarios virtuales concurrentes.")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios virtuales (modo carga).")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de carga.")
+    parser.add_argument("--mix", default=None,
+                        help="Pesos por suite, p. ej. 'health=1,prediccion=4'. Por defecto LOAD_MIX.")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Segundos para arrancar todos los usuarios.")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pausa (s) entre iteraciones de cada usuario.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por request (s).")
+    parser.add_argument("--max-error-pct", type=float, default=1.0,
+                        help="Sale con código 1 si el porcentaje de errores lo supera.")
+    parser.add_argument("--json", default=None, help="Guardar el reporte de carga en este archivo.")
+    args = parser.parse_args()
+    if args.load:
+        main_load(args)
+    else:
+        main()